@@ -6,4 +6,40 @@ CLIENT_SECRET = '39ae797395c24a9f9751d75842b06b43'
 
 
 # Database Configuration
-DATABASE_NAME = '../data/artist_data.db'
\ No newline at end of file
+DATABASE_NAME = '../data/artist_data.db'
+
+# 'sql' answers each analysis with an indexed query, 'pandas' loads the whole table into memory
+ANALYZER_MODE = 'sql'
+
+
+# Refresh Configuration
+# artists fetched more recently than this are skipped by a normal (non --full) refresh
+REFRESH_MAX_AGE_DAYS = 7
+
+
+# Response Cache Configuration (populate_db.py --cache)
+RESPONSE_CACHE_PATH = '../data/spotify_cache.db'
+RESPONSE_CACHE_TTL_HOURS = 24
+RESPONSE_CACHE_MAX_ENTRIES = 200000
+
+
+# Image Cache Configuration (artist spotlight)
+IMAGE_CACHE_DIR = '../data/image_cache'
+IMAGE_MEMORY_CACHE_ITEMS = 64
+
+
+# Logging / Metrics Configuration
+LOG_LEVEL = 'INFO'
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+# where the gui writes its metrics snapshot on exit (.prom/.txt = Prometheus text, anything else = JSON).
+# None keeps metrics off. ARTISTNEXUS_METRICS=1 also turns them on
+METRICS_EXPORT_PATH = None
+
+
+# HTTP Service Configuration (src/serve.py)
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8080
+# one loaded dataset shared by every request, so 'pandas' is usually the faster choice here
+SERVICE_ANALYZER_MODE = 'pandas'
+SERVICE_RENDER_WORKERS = 2
+SERVICE_CACHE_ITEMS = 512
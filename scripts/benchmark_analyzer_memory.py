@@ -0,0 +1,87 @@
+# scripts/benchmark_analyzer_memory.py
+# DataAnalyzer memory: the whole table as read_sql_query returns it vs the compact frame
+
+import sys
+import os
+import argparse
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# weird path stuff
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src.core.artist_frame import load_artist_frame, frame_nbytes
+from src.core.country_index import CountryIndex
+from src.core.db_manager import DatabaseManager
+
+GENRES = ["pop", "rock", "indie pop", "k-pop", "hip hop", "rap", "jazz", "metal", "folk", "edm",
+          "latin", "reggaeton", "country", "soul", "r&b", "blues", "techno", "house", "punk", "classical"]
+
+
+def synthetic_artists(count, countries, seed=0):
+    rng = np.random.default_rng(seed)
+    genre_strings = [", ".join(rng.choice(GENRES, size=k, replace=False)) for k in rng.integers(0, 4, size=5000)]
+    country_names = [f"Country {c:03d}" for c in range(countries)]
+    country_of = rng.integers(0, countries, size=count)
+    popularity = rng.integers(0, 101, size=count)
+    followers = (rng.pareto(1.2, size=count) * 100).astype('int64')
+    genre_of = rng.integers(0, len(genre_strings), size=count)
+    now = datetime.now().isoformat()
+    for i in range(count):
+        yield {
+            'artist_id': f"{i:022d}",
+            'artist_name': f"Synthetic Artist {i}",
+            'country': country_names[country_of[i]],
+            'spotify_popularity': int(popularity[i]),
+            'spotify_followers': int(followers[i]),
+            'spotify_genres': genre_strings[genre_of[i]],
+            'image_url': f"https://i.scdn.co/image/ab6761610000e5eb{i:024x}",
+            'last_checked': now,
+        }
+
+
+def measure(label, load):
+    start = time.perf_counter()
+    nbytes = load()
+    seconds = time.perf_counter() - start
+    print(f"{label:<34} {nbytes / 2**20:9.1f} MB   load {seconds:6.2f}s")
+    return nbytes
+
+
+def load_full_table(db_path):
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql_query("SELECT * FROM artists", conn)
+    conn.close()
+    return int(df.memory_usage(deep=True).sum())
+
+
+def load_compact(db_path):
+    df, genre_codes = load_artist_frame(db_path)
+    index = CountryIndex(df, genre_codes)
+    index_nbytes = sum(value.nbytes for value in vars(index).values() if isinstance(value, np.ndarray))
+    return frame_nbytes(df, genre_codes) + index_nbytes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare DataAnalyzer memory before and after the compact frame.")
+    parser.add_argument('--artists', type=int, default=1_000_000)
+    parser.add_argument('--countries', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'artists.db')
+        print(f"Writing {args.artists} synthetic artists...")
+        db_manager = DatabaseManager(db_file=db_path)
+        db_manager.add_artists(synthetic_artists(args.artists, args.countries), batch_size=10_000)
+        db_manager.conn.close()
+
+        print(f"\n--- {args.artists} artists, {args.countries} countries (deep memory_usage) ---")
+        before = measure("SELECT * into object columns", lambda: load_full_table(db_path))
+        after = measure("compact frame + CountryIndex", lambda: load_compact(db_path))
+        print(f"{before / after:.1f}x less memory")
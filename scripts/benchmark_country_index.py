@@ -0,0 +1,108 @@
+# scripts/benchmark_country_index.py
+# per-country analyses: full-frame boolean masks (the old DataAnalyzer code) vs CountryIndex slices
+
+import sys
+import os
+import argparse
+import time
+import sqlite3
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# weird path stuff
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src.core.artist_frame import load_artist_frame
+from src.core.country_index import CountryIndex
+
+GENRES = ["pop", "rock", "indie pop", "k-pop", "hip hop", "rap", "jazz", "metal", "folk", "edm",
+          "latin", "reggaeton", "country", "soul", "r&b", "blues", "techno", "house", "punk", "classical"]
+
+
+def compact_frame(df):
+    """
+    the same artists as DataAnalyzer loads them: through sqlite into the compact frame
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'artists.db')
+        conn = sqlite3.connect(db_path)
+        df.to_sql('artists', conn, index=False)
+        conn.close()
+        return load_artist_frame(db_path)
+
+
+def synthetic_frame(count, countries, seed=0):
+    rng = np.random.default_rng(seed)
+    genre_strings = np.array([", ".join(rng.choice(GENRES, size=k, replace=False)) for k in rng.integers(0, 4, size=5000)],
+                             dtype=object)
+    return pd.DataFrame({
+        'artist_id': [f"{i:022d}" for i in range(count)],
+        'artist_name': [f"Synthetic Artist {i}" for i in range(count)],
+        'country': np.array([f"Country {c:03d}" for c in range(countries)], dtype=object)[rng.integers(0, countries, size=count)],
+        'spotify_popularity': rng.integers(0, 101, size=count).astype('float64'),
+        'spotify_followers': (rng.pareto(1.2, size=count) * 100).astype('int64').astype('float64'),
+        'spotify_genres': genre_strings[rng.integers(0, len(genre_strings), size=count)],
+    })
+
+
+# the per-country analyses as DataAnalyzer used to do them
+def old_genre_distribution(df, country, n=10):
+    analysis_df = df.dropna(subset=['country', 'spotify_genres'])
+    if country not in analysis_df['country'].values: return None
+    country_df = analysis_df[analysis_df['country'] == country]
+    return country_df['spotify_genres'].str.split(', ').explode().value_counts().head(n)
+
+
+def old_popularity_vs_followers(df, country):
+    analysis_df = df.dropna(subset=['country', 'spotify_followers', 'spotify_popularity'])
+    if country not in analysis_df['country'].values: return None, None
+    country_df = analysis_df[analysis_df['country'] == country]
+    return country_df['spotify_followers'], country_df['spotify_popularity']
+
+
+def old_most_popular(df, country):
+    analysis_df = df.dropna(subset=['country', 'spotify_popularity'])
+    if country not in analysis_df['country'].values: return None
+    country_df = analysis_df[analysis_df['country'] == country]
+    return df.loc[country_df['spotify_popularity'].idxmax()].to_dict()
+
+
+def timed(func, countries):
+    start = time.perf_counter()
+    for country in countries:
+        func(country)
+    return (time.perf_counter() - start) / len(countries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-country lookups with and without CountryIndex.")
+    parser.add_argument('--artists', type=int, default=1_000_000)
+    parser.add_argument('--countries', type=int, default=200)
+    parser.add_argument('--sample', type=int, default=20, help="countries timed with the old code (it's slow)")
+    args = parser.parse_args()
+
+    print(f"Generating {args.artists} artists across {args.countries} countries...")
+    df = synthetic_frame(args.artists, args.countries)
+    countries = sorted(df['country'].unique())
+    sample = countries[::max(1, len(countries) // args.sample)][:args.sample]
+
+    compact, genre_codes = compact_frame(df)
+    start = time.perf_counter()
+    index = CountryIndex(compact, genre_codes)
+    build_seconds = time.perf_counter() - start
+
+    rows = [
+        ("genre distribution", lambda c: old_genre_distribution(df, c), lambda c: index.genre_counts(c).head(10)),
+        ("popularity vs followers", lambda c: old_popularity_vs_followers(df, c), lambda c: index.scatter_rows(c)),
+        ("most popular artist", lambda c: old_most_popular(df, c), lambda c: compact.iloc[index.top_row(c)].to_dict()),
+    ]
+
+    print(f"\n--- {args.artists} artists, {args.countries} countries ---")
+    print(f"index build: {build_seconds:.2f}s (once per load)")
+    for name, old, new in rows:
+        old_ms = timed(old, sample) * 1000
+        new_ms = timed(new, countries) * 1000
+        print(f"{name:<24} masks {old_ms:9.2f} ms/country   index {new_ms:7.3f} ms/country   {old_ms / new_ms:7.0f}x")
@@ -0,0 +1,102 @@
+# scripts/benchmark_db_writes.py
+# old per-row insert+commit path vs DatabaseManager.add_artists, on synthetic rows, plus a second
+# pass over the same rows (a refresh where spotify returned nothing new)
+
+import sys
+import os
+import argparse
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+# weird path stuff
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src.core.db_manager import DatabaseManager
+
+# what add_artist used to run
+OLD_UPSERT_SQL = ''' INSERT OR REPLACE INTO artists(artist_id, artist_name, country, spotify_popularity, spotify_followers, spotify_genres, image_url, last_updated)
+                  VALUES(:artist_id, :artist_name, :country, :spotify_popularity, :spotify_followers, :spotify_genres, :image_url, :last_checked) '''
+
+
+def synthetic_artists(count):
+    now = datetime.now().isoformat()
+    for i in range(count):
+        yield {
+            'artist_id': f"{i:022d}",
+            'artist_name': f"Synthetic Artist {i}",
+            'country': f"Country {i % 200}",
+            'spotify_popularity': i % 101,
+            'spotify_followers': (i * 7919) % 10_000_000,
+            'spotify_genres': "pop, indie pop",
+            'image_url': f"https://i.scdn.co/image/{i:040x}",
+            'last_checked': now,
+        }
+
+
+def old_path(db_file, count):
+    """what add_artist used to do: default journal, one execute + commit per row"""
+    conn = sqlite3.connect(db_file)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS artists (
+            artist_id TEXT PRIMARY KEY, artist_name TEXT NOT NULL, country TEXT,
+            spotify_popularity INTEGER, spotify_followers INTEGER, spotify_genres TEXT,
+            image_url TEXT, last_updated TEXT NOT NULL
+        );""")
+    conn.commit()
+    start = time.perf_counter()
+    for artist in synthetic_artists(count):
+        cursor = conn.cursor()
+        cursor.execute(OLD_UPSERT_SQL, artist)
+        conn.commit()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed
+
+
+def wal_size(db_file):
+    try:
+        return os.path.getsize(db_file + '-wal')
+    except OSError:
+        return 0
+
+
+def new_path(db_file, count, batch_size):
+    """
+    (seconds for the first write, seconds for rewriting the same rows, WriteCounts of the
+    rewrite, bytes the rewrite added to the WAL)
+    """
+    db_manager = DatabaseManager(db_file=db_file)
+    start = time.perf_counter()
+    db_manager.add_artists(synthetic_artists(count), batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    db_manager.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    start = time.perf_counter()
+    counts = db_manager.add_artists(synthetic_artists(count), batch_size=batch_size)
+    refresh_elapsed = time.perf_counter() - start
+    refresh_wal = wal_size(db_file)
+    db_manager.conn.close()
+    return elapsed, refresh_elapsed, counts, refresh_wal
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-row vs batched artist inserts.")
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        old_seconds = old_path(os.path.join(tmp, 'old.db'), args.rows)
+        new_seconds, refresh_seconds, refresh_counts, refresh_wal = new_path(os.path.join(tmp, 'new.db'),
+                                                                             args.rows, args.batch_size)
+
+    print(f"\n--- {args.rows} rows ---")
+    print(f"old (execute + commit per row): {old_seconds:8.2f}s  {args.rows / old_seconds:10.0f} rows/sec")
+    print(f"new (add_artists, batch {args.batch_size}): {new_seconds:8.2f}s  {args.rows / new_seconds:10.0f} rows/sec")
+    print(f"speedup: {old_seconds / new_seconds:.1f}x")
+    print(f"same rows again: {refresh_seconds:8.2f}s  {args.rows / refresh_seconds:10.0f} rows/sec, "
+          f"{refresh_counts.changed} changed, {refresh_counts.unchanged} unchanged, "
+          f"{refresh_wal / 2**20:.1f} MB of WAL")
@@ -0,0 +1,120 @@
+# scripts/benchmark_history.py
+# simulates daily refreshes of a synthetic database and reports how big the popularity/follower
+# history gets (vs keeping a full artists row per artist per day) and how fast it is to query
+
+import sys
+import os
+import argparse
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# weird path stuff
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src.core.data_analyzer import DataAnalyzer
+from src.core.db_manager import DatabaseManager
+from src.core.history_store import HistoryQueries, to_day
+from generate_synthetic_data import ensure_dataset, parse_scale
+
+
+def table_bytes(db_path):
+    """bytes per table/index, needs sqlite built with dbstat (python's usually is)"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"))
+    finally:
+        conn.close()
+
+
+def simulate(db_path, days, change_rate, seed=0):
+    """
+    one refresh per day for `days` days, ending today. every day each artist's followers
+    change with probability change_rate, its popularity with a fifth of that
+    """
+    db_manager = DatabaseManager(db_file=db_path)
+    cursor = db_manager.conn.execute("SELECT * FROM artists")
+    columns = [column[0] for column in cursor.description]
+    artists = [dict(zip(columns, row)) for row in cursor]
+    rng = random.Random(seed)
+    start = datetime.now() - timedelta(days=days)
+    counts = None
+    seconds = 0.0
+    for day in range(days):
+        now = start + timedelta(days=day)
+        for artist in artists:
+            if artist['spotify_followers'] is not None and rng.random() < change_rate:
+                artist['spotify_followers'] = max(0, artist['spotify_followers'] + int(rng.gauss(20, 200)))
+            if rng.random() < change_rate / 5:
+                popularity = (artist['spotify_popularity'] or 30) + rng.randint(-3, 3)
+                artist['spotify_popularity'] = min(100, max(0, popularity))
+            artist['last_checked'] = now.isoformat()
+        started = time.perf_counter()
+        counts = db_manager.add_artists(artists, batch_size=5000, now=now)
+        seconds += time.perf_counter() - started
+    db_manager.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    db_manager.conn.close()
+    return len(artists), seconds, counts
+
+
+def time_query(label, query, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = query()
+        timings.append(time.perf_counter() - started)
+    print(f"{label:<48} {min(timings) * 1000:9.2f} ms  ({len(result)} rows)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate daily refreshes and benchmark the history store.")
+    parser.add_argument('--artists', default='10k', help="10k, 100k, 1m or a number of artists")
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--change-rate', type=float, default=0.05, help="share of artists changing per day")
+    parser.add_argument('--query-artists', type=int, default=100)
+    parser.add_argument('--query-countries', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--data-dir', default=os.path.join(project_root, 'data', 'synthetic'))
+    args = parser.parse_args()
+
+    _, source_db = ensure_dataset(args.data_dir, parse_scale(args.artists))
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'history.db')
+        shutil.copy(source_db, db_path)
+        print(f"Simulating {args.days} daily refreshes...")
+        artist_count, write_seconds, counts = simulate(db_path, args.days, args.change_rate)
+
+        sizes = table_bytes(db_path)
+        history_rows = sqlite3.connect(db_path).execute("SELECT COUNT(*) FROM artist_history").fetchone()[0]
+        history_bytes = sizes.get('artist_history', 0) + sizes.get('country_history', 0)
+        # what a full artists row (with its primary key entry) per artist per day would take
+        full_bytes = (sizes['artists'] + sizes.get('sqlite_autoindex_artists_1', 0)) * args.days
+
+        print(f"\n--- {artist_count} artists, {args.days} days, {args.change_rate:.0%} changing per day ---")
+        print(f"refresh writes: {write_seconds / args.days * 1000:.1f} ms per day, last day {counts}")
+        print(f"artist_history: {history_rows} rows, {sizes.get('artist_history', 0) / 2**20:.1f} MB")
+        print(f"country_history: {sizes.get('country_history', 0) / 2**20:.2f} MB")
+        print(f"full row per artist per day would be ~{full_bytes / 2**20:.0f} MB "
+              f"({full_bytes / max(history_bytes, 1):.0f}x more)")
+
+        analyzer = DataAnalyzer(db_path, mode='sql')
+        artist_ids = [artist_id for (artist_id,) in sqlite3.connect(db_path).execute(
+            "SELECT artist_id FROM artists ORDER BY artist_id LIMIT ?", (args.query_artists,))]
+        countries = analyzer.get_available_countries()[:args.query_countries]
+        # straight to HistoryQueries: the analyzer would answer repeats from its memo
+        history = HistoryQueries(db_path)
+        today = to_day(datetime.now())
+        print()
+        for period in ('day', 'week'):
+            time_query(f"{len(artist_ids)} artists, {args.days} days, by {period}",
+                       lambda: history.artist_series(artist_ids, None, today, period), args.repeat)
+            time_query(f"{len(countries)} countries, {args.days} days, by {period}",
+                       lambda: history.country_series(countries, None, today, period), args.repeat)
+        time_query(f"{len(countries)} countries, last 30 days, by day",
+                   lambda: history.country_series(countries, today - 29, today, 'day'), args.repeat)
+        history.close()
@@ -0,0 +1,69 @@
+# scripts/benchmark_lod.py
+# popularity vs followers for one big country: every point as a marker vs the density plot
+
+import sys
+import os
+import argparse
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import numpy as np
+import pandas as pd
+
+# weird path stuff
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src.core.plotter import Plotter
+
+
+def density(followers, popularity, follower_bins=60, popularity_bins=50):
+    """same binning as DataAnalyzer.get_popularity_vs_followers_density"""
+    shown = followers > 0
+    log_followers = np.log10(followers[shown])
+    top = max(np.ceil(log_followers.max()), 1.0)
+    counts, log_edges, popularity_edges = np.histogram2d(log_followers, popularity[shown],
+                                                         bins=(follower_bins, popularity_bins),
+                                                         range=((0.0, top), (0.0, 100.0)))
+    return counts.astype('int64'), 10.0 ** log_edges, popularity_edges
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark scatter vs density rendering of large countries.")
+    parser.add_argument('--points', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'points':>10} {'scatter':>12} {'bins':>10} {'density':>12}")
+    for points in args.points:
+        followers = (rng.pareto(1.2, size=points) * 1000).astype('int64')
+        popularity = rng.integers(0, 101, size=points)
+        x_data, y_data = pd.Series(followers), pd.Series(popularity)
+
+        plotter = Plotter()
+        canvas = FigureCanvasAgg(plotter.figure)
+
+        def draw_scatter():
+            # a different chart in between, so every draw builds the scatter from scratch
+            plotter.pie_chart(None, "")
+            plotter.scatter_plot(x_data, y_data, "", "Followers (log scale)", "Popularity Score")
+            canvas.draw()
+
+        def draw_density():
+            plotter.density_plot(*density(followers, popularity), "", "Followers (log scale)", "Popularity Score")
+            canvas.draw()
+
+        scatter_ms = timed(draw_scatter, args.repeat)
+        bins_ms = timed(lambda: density(followers, popularity), args.repeat)
+        density_ms = timed(draw_density, args.repeat)
+        print(f"{points:>10} {scatter_ms:>9.0f} ms {bins_ms:>7.1f} ms {density_ms:>9.0f} ms")
@@ -0,0 +1,136 @@
+# scripts/benchmark_plotter.py
+# a new pyplot figure per plot (the old gui code) vs one persistent Plotter figure
+
+import sys
+import os
+import argparse
+import time
+import tracemalloc
+import warnings
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import numpy as np
+import pandas as pd
+
+# weird path stuff
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src.core.plotter import Plotter
+
+
+def synthetic_charts(repeat, seed=0):
+    """
+    the gui's five analyses, as (kind, args) with fresh data on every call. each one
+    comes `repeat` times in a row, like clicking through countries
+    """
+    rng = np.random.default_rng(seed)
+    countries = [f"Country {c:03d}" for c in range(200)]
+    genres = [f"genre {g}" for g in range(40)]
+    popularity = pd.Series(rng.integers(0, 101, size=50_000), name='spotify_popularity')
+    while True:
+        for _ in range(repeat):
+            top = rng.choice(countries, size=15, replace=False)
+            yield 'bar', (pd.Series(np.sort(rng.integers(10**5, 10**9, size=15))[::-1], index=top), "", "Country",
+                          "Total Followers (Log Scale)", True)
+        for _ in range(repeat):
+            top = rng.choice(countries, size=15, replace=False)
+            yield 'bar', (pd.Series(np.sort(rng.uniform(20, 80, size=15))[::-1], index=top), "", "Country",
+                          "Average Popularity Score", False)
+        for _ in range(repeat):
+            yield 'pie', (pd.Series(np.sort(rng.integers(1, 500, size=10))[::-1],
+                                    index=rng.choice(genres, size=10, replace=False)), "")
+        for _ in range(repeat):
+            size = int(rng.integers(200, 5000))
+            yield 'scatter', (pd.Series(rng.pareto(1.2, size=size) * 1000 + 1),
+                              pd.Series(rng.integers(0, 101, size=size)), "", "Followers (log scale)", "Popularity Score")
+        for _ in range(repeat):
+            yield 'hist', (popularity, "", "Popularity Score")
+
+
+def old_plot(kind, args):
+    """what _on_analyze_button_click used to do, minus the tk widget: a new pyplot figure, never closed"""
+    plt.style.use('fivethirtyeight')
+    fig, ax = plt.subplots(figsize=(10, 6), dpi=100)
+    fig.subplots_adjust(bottom=0.2)
+    if kind == 'bar':
+        series, title, xlabel, ylabel, log = args
+        Plotter.plot_bar_chart(ax, series, title, xlabel, ylabel)
+        if log: ax.set_yscale('log')
+    elif kind == 'pie':
+        Plotter.plot_pie_chart(ax, *args)
+    elif kind == 'scatter':
+        Plotter.plot_scatter_plot(ax, *args)
+    else:
+        Plotter.plot_histogram(ax, *args)
+    fig.tight_layout()
+    fig.canvas.draw()
+
+
+def new_plotter():
+    plotter = Plotter()
+    canvas = FigureCanvasAgg(plotter.figure)
+    methods = {'bar': plotter.bar_chart, 'pie': plotter.pie_chart,
+               'scatter': plotter.scatter_plot, 'hist': plotter.histogram}
+
+    def plot(kind, args):
+        if kind == 'bar':
+            *rest, log = args
+            methods[kind](*rest, log=log)
+        elif kind == 'hist':
+            data, title, xlabel = args
+            plotter.histogram(*np.histogram(data, bins=30), title, xlabel)
+        else:
+            methods[kind](*args)
+        canvas.draw()
+
+    return plot
+
+
+def timed(plot, count, repeat):
+    """
+    mean ms per plot
+    """
+    charts = synthetic_charts(repeat)
+    start = time.perf_counter()
+    for _ in range(count):
+        plot(*next(charts))
+    return (time.perf_counter() - start) / count * 1000
+
+
+def traced(plot, count, repeat, sample_every):
+    """
+    [(plots done, MB allocated since the start)], under tracemalloc
+    """
+    charts = synthetic_charts(repeat)
+    tracemalloc.start()
+    samples = []
+    for i in range(1, count + 1):
+        plot(*next(charts))
+        if i == 1 or i % sample_every == 0:
+            samples.append((i, tracemalloc.get_traced_memory()[0] / 2**20))
+    tracemalloc.stop()
+    return samples
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark memory and redraw time of consecutive plots.")
+    parser.add_argument('--plots', type=int, default=1000)
+    parser.add_argument('--sample-every', type=int, default=250)
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="consecutive plots of the same analysis before switching (default: 5)")
+    args = parser.parse_args()
+    # the old path opens a figure per plot, that's the point
+    warnings.filterwarnings('ignore', message='More than 20 figures')
+
+    for name, make_plot in (("new pyplot figure per plot", lambda: old_plot), ("persistent Plotter figure", new_plotter)):
+        mean_ms = timed(make_plot(), args.plots, args.repeat)
+        plt.close('all')
+        samples = traced(make_plot(), args.plots, args.repeat, args.sample_every)
+        plt.close('all')
+        print(f"\n--- {name}: {mean_ms:.1f} ms/plot ---")
+        for done, megabytes in samples:
+            print(f"  after {done:>5} plots: {megabytes:8.1f} MB")
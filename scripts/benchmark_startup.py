@@ -0,0 +1,107 @@
+# scripts/benchmark_startup.py
+# gui startup: what `import ui.main_window` costs (-X importtime) and the time to the first window
+
+import sys
+import os
+import argparse
+import statistics
+import subprocess
+import time
+
+# weird path stuff
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+src_dir = os.path.join(project_root, 'src')
+sys.path.append(project_root)
+
+import config
+
+HEAVY_MODULES = ('matplotlib', 'pandas', 'numpy', 'PIL', 'requests')
+
+# run in a fresh interpreter: seconds since the parent's launch to the window being mapped,
+# and to the data being ready (the analyzer set by the background load)
+FIRST_WINDOW_SNIPPET = """
+import sys, time
+start = float(sys.argv[1])
+from ui.main_window import AppGUI
+app = AppGUI(db_path=sys.argv[2], analyzer_mode=sys.argv[3])
+times = {}
+
+def on_map(event):
+    if event.widget is app and 'window' not in times:
+        times['window'] = time.time() - start
+
+def wait_for_data():
+    if app.analyzer is None and app._load_future is not None and not app._load_future.done():
+        app.after(10, wait_for_data)
+        return
+    times['data'] = time.time() - start
+    # let _check_loaded build the widgets before leaving
+    app.after(100, app.destroy)
+
+app.bind('<Map>', on_map)
+app.after(10, wait_for_data)
+app.mainloop()
+print(times.get('window', float('nan')), times['data'])
+"""
+
+
+def import_times(runs):
+    """
+    (median ms to import ui.main_window, median ms for all top-level imports including
+    the interpreter's own, [(cumulative ms, top-level module)] and every module imported,
+    both from the last run)
+    """
+    own, totals = [], []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ui.main_window'],
+                                cwd=src_dir, capture_output=True, text=True, check=True)
+        modules, imported = [], set()
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            imported.add(name.strip())
+            # nested imports are indented, keep the ones main_window pulls in directly
+            if not name.startswith('  '):
+                modules.append((int(cumulative) / 1000, name.strip()))
+        own.append(sum(ms for ms, name in modules if name == 'ui.main_window' or name == 'ui'))
+        totals.append(sum(ms for ms, _ in modules))
+    return statistics.median(own), statistics.median(totals), sorted(modules, reverse=True), imported
+
+
+def first_window_times(runs, db_path, mode):
+    window, data = [], []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', FIRST_WINDOW_SNIPPET, repr(time.time()), db_path, mode],
+                                cwd=src_dir, capture_output=True, text=True, check=True)
+        window_seconds, data_seconds = map(float, result.stdout.strip().splitlines()[-1].split())
+        window.append(window_seconds)
+        data.append(data_seconds)
+    return statistics.median(window), statistics.median(data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark gui startup time.")
+    parser.add_argument('--db', default=os.path.join(src_dir, config.DATABASE_NAME),
+                        help="artists database (default: config.DATABASE_NAME)")
+    parser.add_argument('--mode', default=config.ANALYZER_MODE, choices=('pandas', 'sql'))
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help="heaviest imports to list")
+    args = parser.parse_args()
+
+    own_ms, total_ms, modules, imported = import_times(args.runs)
+    print(f"--- import ui.main_window: {own_ms:.1f} ms, {total_ms:.1f} ms with interpreter startup "
+          f"(median of {args.runs}, -X importtime) ---")
+    for ms, name in modules[:args.top]:
+        print(f"  {ms:8.1f} ms  {name}")
+    loaded = {name.split('.')[0] for name in imported}
+    eager = [name for name in HEAVY_MODULES if name in loaded]
+    print(f"heavy modules imported at startup: {', '.join(eager) if eager else 'none'}")
+
+    if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+        print("\nNo $DISPLAY, skipping the time-to-first-window measurement.")
+        sys.exit(0)
+    window_seconds, data_seconds = first_window_times(args.runs, os.path.abspath(args.db), args.mode)
+    print(f"\n--- {args.mode} mode, median of {args.runs} ---")
+    print(f"time to first window: {window_seconds * 1000:7.0f} ms")
+    print(f"time to data ready:   {data_seconds * 1000:7.0f} ms")
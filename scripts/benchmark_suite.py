@@ -0,0 +1,382 @@
+# scripts/benchmark_suite.py
+# end-to-end benchmarks on synthetic data, fully offline: ingest against the fake spotify server,
+# analyzer query latency, gui-free plot rendering and peak memory. results go to a JSON file so
+# two commits can be compared with --compare
+
+import sys
+import os
+import argparse
+import json
+import logging
+import platform
+import resource
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# weird path stuff
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src.core.api_handler import APIHandler
+from src.core.artist_frame import frame_nbytes
+from src.core.columnar_snapshot import snapshot_dir, write_snapshot
+from src.core.data_analyzer import DataAnalyzer
+from src.core.data_processor import DataProcessor
+from src.core.db_manager import DatabaseManager
+from src.core.plotter import Plotter
+from src.core.rate_limiter import RateLimiter
+from src.core.report_builder import chart_data, chart_specs, ANALYSES
+from generate_synthetic_data import ensure_dataset, parse_scale, scale_name
+from fake_spotify_server import FakeSpotifyServer, make_client
+
+BENCHMARKS = ('ingest', 'analyzer', 'plot', 'memory')
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 3)
+
+
+def megabytes(size):
+    return round(size / 2**20, 2)
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=project_root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=project_root,
+                               capture_output=True, text=True, check=True).stdout.strip() != ''
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def biggest_countries(db_path, count):
+    """the countries with the most artists, the slowest per-country analyses"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return [row[0] for row in conn.execute("SELECT country FROM artists WHERE country IS NOT NULL "
+                                               "GROUP BY country ORDER BY COUNT(*) DESC LIMIT ?", (count,))]
+    finally:
+        conn.close()
+
+
+# --- ingest ---
+
+def bench_ingest(csv_path, args):
+    """
+    the whole populate_db pipeline (csv -> fetch workers -> writer) against the fake server,
+    into a fresh database
+    """
+    server = FakeSpotifyServer(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                               rate_429=args.rate_429, retry_after=args.retry_after,
+                               error_rate=args.error_rate, missing_rate=args.missing_rate, seed=args.seed).start()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'ingest.db')
+        db_manager = DatabaseManager(db_file=db_path)
+        rate_limiter = RateLimiter(rate=args.api_rate, burst=args.workers * 2, max_rate=args.api_rate,
+                                   backoff_base=0.05, backoff_max=1.0)
+        api_handler = APIHandler(client_id=None, client_secret=None, client=make_client(server.url),
+                                 rate_limiter=rate_limiter)
+        processor = DataProcessor(api_handler, db_manager, workers=args.workers, progress_interval=3600)
+        start = time.perf_counter()
+        progress = processor.process_and_store_artists(csv_path)
+        seconds = time.perf_counter() - start
+        db_manager.conn.close()
+    server.stop()
+
+    return {
+        'workers': args.workers,
+        'seconds': round(seconds, 3),
+        'artists_per_second': round(progress.processed / seconds, 1),
+        'processed': progress.processed,
+        'stored': progress.stored,
+        'inserted': progress.inserted,
+        'changed': progress.changed,
+        'unchanged': progress.unchanged,
+        'missing': progress.missing,
+        'errors': progress.errors,
+        'api': api_handler.stats,
+        'server': dict(server.counts),
+        'fake_server': {'latency_ms': args.latency_ms, 'jitter_ms': args.jitter_ms, 'rate_429': args.rate_429,
+                        'retry_after': args.retry_after, 'error_rate': args.error_rate,
+                        'missing_rate': args.missing_rate, 'api_rate': args.api_rate},
+    }
+
+
+# --- analyzer ---
+
+def analyzer_queries(analyzer, countries):
+    """(label, zero-argument call) for every analysis the gui can run"""
+    queries = [
+        ('countries', analyzer.get_available_countries),
+        ('top_followers', lambda: analyzer.get_top_n_countries_by_followers(15)),
+        ('top_popularity', lambda: analyzer.get_top_n_countries_by_avg_popularity(15)),
+        ('popularity_histogram', analyzer.get_popularity_histogram),
+    ]
+    for rank, country in enumerate(countries):
+        queries += [
+            (f'genres[{rank}]', lambda country=country: analyzer.get_genre_distribution_for_country(country, 10)),
+            (f'pop_vs_followers[{rank}]', lambda country=country: analyzer.get_popularity_vs_followers(country)),
+            (f'density[{rank}]', lambda country=country: analyzer.get_popularity_vs_followers_density(country)),
+            (f'most_popular[{rank}]', lambda country=country: analyzer.get_most_popular_artist_in_country(country)),
+        ]
+    return queries
+
+
+# name -> DataAnalyzer arguments
+ANALYZER_SETUPS = {
+    'pandas': {'mode': 'pandas', 'use_columnar_snapshot': False},
+    'pandas_snapshot': {'mode': 'pandas', 'use_columnar_snapshot': True},
+    'sql': {'mode': 'sql'},
+}
+
+
+def bench_analyzer(db_path, args):
+    """
+    per setup: load time, then every query's first call, its median with the memo cleared
+    (rollups stay warm) and a memo hit
+    """
+    # from scratch, write_snapshot() skips the work when the current one is up to date
+    shutil.rmtree(snapshot_dir(db_path), ignore_errors=True)
+    start = time.perf_counter()
+    write_snapshot(db_path)
+    results = {'snapshot_write_ms': milliseconds(time.perf_counter() - start)}
+    for setup, kwargs in ANALYZER_SETUPS.items():
+        start = time.perf_counter()
+        analyzer = DataAnalyzer(db_path, change_check_interval=float('inf'), **kwargs)
+        load_seconds = time.perf_counter() - start
+        countries = biggest_countries(db_path, args.countries)
+        queries = {}
+        for label, query in analyzer_queries(analyzer, countries):
+            start = time.perf_counter()
+            query()
+            first = time.perf_counter() - start
+            repeats = []
+            for _ in range(args.repeat):
+                analyzer._memo.clear()
+                start = time.perf_counter()
+                query()
+                repeats.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            query()
+            cached = time.perf_counter() - start
+            queries[label] = {'first_ms': milliseconds(first), 'median_ms': milliseconds(statistics.median(repeats)),
+                              'cached_ms': milliseconds(cached)}
+        results[setup] = {'load_ms': milliseconds(load_seconds), 'records': analyzer.record_count,
+                         'countries': countries, 'queries': queries}
+    return results
+
+
+# --- plot ---
+
+def bench_plot(db_path, args):
+    """
+    every report chart for the biggest countries, drawn into one Plotter and rendered with Agg,
+    like the gui does minus tk
+    """
+    analyzer = DataAnalyzer(db_path, mode='pandas', change_check_interval=float('inf'), use_columnar_snapshot=False)
+    countries = biggest_countries(db_path, args.countries)
+    plotter = Plotter()
+    canvas = FigureCanvasAgg(plotter.figure)
+    results = {}
+    for spec in chart_specs(countries, ANALYSES, (10,)):
+        chart = chart_data(analyzer, spec)
+        if chart is None:
+            continue
+        method, chart_args = chart
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            getattr(plotter, method)(*chart_args)
+            canvas.draw()
+            times.append(time.perf_counter() - start)
+            # a different chart in between, so the next round draws from scratch
+            plotter.pie_chart(None, "")
+        label = spec.analysis if spec.country is None else f"{spec.analysis}[{countries.index(spec.country)}]"
+        results[label] = {'chart': method, 'median_ms': milliseconds(statistics.median(times)),
+                          'max_ms': milliseconds(max(times))}
+    return results
+
+
+# --- memory ---
+
+def peak_allocated(func):
+    """(result, peak bytes python + numpy allocated while func ran)"""
+    tracemalloc.start()
+    try:
+        result = func()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_memory(db_path, args):
+    """
+    peak allocations while loading each analyzer mode and rendering the biggest country's
+    charts, plus what the pandas-mode data keeps resident
+    """
+    results = {}
+    write_snapshot(db_path)
+    for setup, kwargs in ANALYZER_SETUPS.items():
+        analyzer, peak = peak_allocated(lambda kwargs=kwargs: DataAnalyzer(db_path, change_check_interval=float('inf'),
+                                                                           **kwargs))
+        results[f'{setup}_load_peak_mb'] = megabytes(peak)
+        if setup == 'pandas':
+            results['pandas_resident_mb'] = megabytes(frame_nbytes(analyzer.df, analyzer.genre_codes))
+            country = biggest_countries(db_path, 1)[0]
+
+            def render_country():
+                plotter = Plotter()
+                canvas = FigureCanvasAgg(plotter.figure)
+                for spec in chart_specs([country], ANALYSES, (10,)):
+                    chart = chart_data(analyzer, spec)
+                    if chart is not None:
+                        getattr(plotter, chart[0])(*chart[1])
+                        canvas.draw()
+
+            # once before measuring, so matplotlib's one-off font/style caches don't count
+            render_country()
+            results['plot_peak_mb'] = megabytes(peak_allocated(render_country)[1])
+    return results
+
+
+# --- driver ---
+
+def flatten(value, prefix=''):
+    """{'a': {'b': 1}} -> {'a.b': 1}, numbers only"""
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+    return {}
+
+
+def compare(baseline, current, threshold, min_ms=1.0):
+    """
+    prints every timing/memory number that moved by more than threshold (a fraction),
+    leaving out timings under min_ms. returns the number of regressions
+    """
+    old, new = flatten(baseline.get('results', {})), flatten(current.get('results', {}))
+    watched = ('_ms', '_mb', 'seconds', 'per_second')
+    rows = []
+    for key in sorted(old.keys() & new.keys()):
+        if not key.endswith(watched) or not old[key]:
+            continue
+        if key.endswith('_ms') and max(old[key], new[key]) < min_ms:
+            continue  # timer noise
+        change = (new[key] - old[key]) / old[key]
+        if abs(change) >= threshold:
+            # throughput going down is the regression, everything else going up is
+            worse = change < 0 if key.endswith('per_second') else change > 0
+            rows.append((key, old[key], new[key], change, worse))
+    print(f"\n--- vs {baseline.get('commit') or 'baseline'} ({len(rows)} changed by >= {threshold:.0%}) ---")
+    for key, before, after, change, worse in rows:
+        print(f"  {'REGRESSION' if worse else 'improved  '} {key}: {before} -> {after} ({change:+.1%})")
+    return sum(worse for *_, worse in rows)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite on synthetic data.")
+    parser.add_argument('--scale', nargs='+', default=['10k'],
+                        help="artists per dataset: 10k, 100k, 1m or a number (default: 10k)")
+    parser.add_argument('--benchmarks', nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument('--data-dir', default=os.path.join(project_root, 'data', 'synthetic'),
+                        help="where the generated csv/db files are kept between runs")
+    parser.add_argument('--output', default=None,
+                        help="results file (default: benchmarks/<timestamp>_<commit>.json)")
+    parser.add_argument('--compare', metavar='BASELINE', default=None,
+                        help="an earlier results file, prints what got faster/slower")
+    parser.add_argument('--threshold', type=float, default=0.10, help="--compare ignores changes below this")
+    parser.add_argument('--min-ms', type=float, default=1.0, help="--compare ignores timings below this")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--countries', type=int, default=3, help="biggest countries to run the per-country analyses on")
+    parser.add_argument('--seed', type=int, default=0)
+    ingest = parser.add_argument_group('ingest / fake spotify server')
+    ingest.add_argument('--workers', type=int, default=4)
+    ingest.add_argument('--api-rate', type=float, default=500.0, help="rate limiter requests/sec")
+    ingest.add_argument('--latency-ms', type=float, default=20.0)
+    ingest.add_argument('--jitter-ms', type=float, default=10.0)
+    ingest.add_argument('--rate-429', type=float, default=0.005)
+    ingest.add_argument('--retry-after', type=float, default=0.2)
+    ingest.add_argument('--error-rate', type=float, default=0.005)
+    ingest.add_argument('--missing-rate', type=float, default=0.01)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    # the app logs every missing image and every retry, far too much for a benchmark run
+    logging.basicConfig(level=logging.ERROR)
+    logging.getLogger('spotipy').setLevel(logging.CRITICAL)
+
+    commit, dirty = git_revision()
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'generated_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'repeat': args.repeat,
+        'results': {},
+    }
+    benchmarks = {'ingest': lambda csv_path, db_path: bench_ingest(csv_path, args),
+                  'analyzer': lambda csv_path, db_path: bench_analyzer(db_path, args),
+                  'plot': lambda csv_path, db_path: bench_plot(db_path, args),
+                  'memory': lambda csv_path, db_path: bench_memory(db_path, args)}
+
+    for scale in args.scale:
+        count = parse_scale(scale)
+        name = scale_name(count)
+        csv_path, db_path = ensure_dataset(args.data_dir, count, args.seed)
+        report['results'][name] = {}
+        for benchmark in args.benchmarks:
+            print(f"[{name}] {benchmark}... ", end='', flush=True)
+            start = time.perf_counter()
+            report['results'][name][benchmark] = benchmarks[benchmark](csv_path, db_path)
+            print(f"{time.perf_counter() - start:.1f}s")
+
+    # kilobytes on linux, bytes on macos
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    report['max_rss_mb'] = megabytes(max_rss if sys.platform == 'darwin' else max_rss * 1024)
+
+    output = args.output or os.path.join(project_root, 'benchmarks',
+                                         f"{datetime.now():%Y%m%d_%H%M%S}_{(commit or 'nogit')[:8]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults: {output}")
+
+    for name, results in report['results'].items():
+        if 'ingest' in results:
+            print(f"[{name}] ingest: {results['ingest']['artists_per_second']} artists/sec")
+        for mode, mode_results in results.get('analyzer', {}).items():
+            if not isinstance(mode_results, dict):
+                continue
+            median = statistics.median(query['median_ms'] for query in mode_results['queries'].values())
+            print(f"[{name}] analyzer {mode}: load {mode_results['load_ms']:.0f} ms, median query {median:.2f} ms")
+        if 'plot' in results:
+            median = statistics.median(chart['median_ms'] for chart in results['plot'].values())
+            print(f"[{name}] plot: median chart {median:.0f} ms")
+        if 'memory' in results:
+            print(f"[{name}] memory: {results['memory']}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(json.load(f), report, args.threshold, args.min_ms)
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,47 @@
+# scripts/check_metrics_export.py
+# exports a metrics registry whose labels mix value types (status=200 next to status='timeout',
+# like APIHandler records them) in both formats. exits non-zero if either export breaks
+
+import sys
+import os
+import json
+import tempfile
+
+# weird path stuff
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src.core.metrics import Metrics
+
+
+def check():
+    registry = Metrics(enabled=True)
+    registry.inc('api_requests_total', endpoint='artists', status=200)
+    registry.inc('api_requests_total', endpoint='artists', status='timeout')
+    registry.inc('api_requests_total', endpoint='artists', status='200')
+    registry.inc('api_retries_total', endpoint='artists', reason=429)
+    registry.inc('api_retries_total', endpoint='artists', reason='connection_error')
+    registry.set_gauge('db_write_rows_per_second', 10.0, batch=1)
+    registry.set_gauge('db_write_rows_per_second', 20.0, batch='last')
+    registry.observe('api_request_seconds', 0.1, endpoint='artists', status=200)
+    registry.observe('api_request_seconds', 0.2, endpoint='artists', status='timeout')
+
+    snapshot = json.loads(registry.to_json())
+    requests = {counter['labels']['status']: counter['value'] for counter in snapshot['counters']
+                if counter['name'] == 'api_requests_total'}
+    # the int and the str spelling of a status are the same series
+    assert requests == {'200': 2, 'timeout': 1}, requests
+    assert len(snapshot['histograms']) == 2, snapshot['histograms']
+
+    text = registry.to_prometheus()
+    assert 'artistnexus_api_requests_total{endpoint="artists",status="timeout"} 1' in text, text
+    assert 'artistnexus_api_requests_total{endpoint="artists",status="200"} 2' in text, text
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ('metrics.json', 'metrics.prom'):
+            registry.write(os.path.join(tmp, name))
+
+
+if __name__ == "__main__":
+    check()
+    print("Metrics export OK.")
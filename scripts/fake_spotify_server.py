@@ -0,0 +1,188 @@
+# scripts/fake_spotify_server.py
+# a local stand-in for the spotify web api's artist endpoints, so ingestion can run offline.
+# latency, 429s (with Retry-After), 5xx errors and unknown ids are all configurable
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+import spotipy
+
+GENRES = ('pop', 'rock', 'indie pop', 'hip hop', 'jazz', 'metal', 'folk', 'house', 'soul', 'k-pop', 'latin', 'edm')
+ARTISTS_BATCH_LIMIT = 50
+
+
+def fake_artist(artist_id):
+    """
+    a spotify artist object, always the same one for the same id
+    """
+    rng = random.Random(zlib.crc32(artist_id.encode('utf-8')))
+    images = [{'url': f"https://i.scdn.co/image/{artist_id}-{size}", 'height': size, 'width': size}
+              for size in (640, 320, 160)[:rng.choice((0, 1, 3, 3))]]
+    return {
+        'id': artist_id,
+        'name': f"Fake Artist {artist_id[-6:]}",
+        'popularity': min(100, max(0, int(rng.gauss(35, 18)))),
+        'followers': {'href': None, 'total': int((rng.paretovariate(1.1) - 1) * 1000)},
+        'genres': rng.sample(GENRES, rng.choice((0, 1, 2, 3))),
+        'images': images,
+        'external_urls': {'spotify': f"https://open.spotify.com/artist/{artist_id}"},
+        'type': 'artist',
+    }
+
+
+class FakeSpotifyServer(ThreadingHTTPServer):
+    """
+    answers GET /v1/artists?ids=... and GET /v1/artists/<id>
+
+    args:
+        latency (float): seconds every request takes, plus up to `jitter` more
+        rate_429 (float): share of requests answered 429 with a Retry-After of `retry_after` seconds
+        error_rate (float): share of requests answered with a 500/502/503
+        missing_rate (float): share of ids spotify "doesn't know" (null in a batch, 404 alone)
+    """
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, rate_429=0.0, retry_after=1.0,
+                 error_rate=0.0, missing_rate=0.0, seed=0):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.missing_rate = missing_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.counts = {'requests': 0, 'ok': 0, 'throttled': 0, 'errors': 0, 'artists': 0, 'missing': 0}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self.counts[name] += amount
+
+    def roll(self):
+        """
+        the fate of one request: (delay seconds, 429?, error status or None)
+        """
+        with self._lock:
+            delay = self.latency + self._rng.random() * self.jitter
+            draw = self._rng.random()
+        if draw < self.rate_429:
+            return delay, True, None
+        if draw < self.rate_429 + self.error_rate:
+            return delay, False, (500, 502, 503)[int(draw * 1000) % 3]
+        return delay, False, None
+
+    def is_missing(self, artist_id):
+        # by id rather than at random, so a retry gets the same answer
+        return (zlib.crc32(artist_id.encode('utf-8')) % 10_000) / 10_000 < self.missing_rate
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-spotify", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status, message, headers=None):
+        self._send(status, {'error': {'status': status, 'message': message}}, headers)
+
+    def do_GET(self):
+        server = self.server
+        server.count(requests=1)
+        delay, throttled, error_status = server.roll()
+        if delay > 0:
+            time.sleep(delay)
+        if throttled:
+            server.count(throttled=1)
+            return self._error(429, "API rate limit exceeded", {'Retry-After': f"{server.retry_after:g}"})
+        if error_status is not None:
+            server.count(errors=1)
+            return self._error(error_status, "Server error")
+
+        url = urlparse(self.path)
+        path = url.path.rstrip('/')
+        if path == '/v1/artists':
+            ids = [artist_id for artist_id in ','.join(parse_qs(url.query).get('ids', [])).split(',') if artist_id]
+            if not ids or len(ids) > ARTISTS_BATCH_LIMIT:
+                return self._error(400, "Invalid ids")
+            artists = [None if server.is_missing(artist_id) else fake_artist(artist_id) for artist_id in ids]
+            missing = sum(artist is None for artist in artists)
+            server.count(ok=1, artists=len(ids) - missing, missing=missing)
+            return self._send(200, {'artists': artists})
+        if path.startswith('/v1/artists/'):
+            artist_id = path[len('/v1/artists/'):]
+            if server.is_missing(artist_id):
+                server.count(ok=1, missing=1)
+                return self._error(404, "Resource not found")
+            server.count(ok=1, artists=1)
+            return self._send(200, fake_artist(artist_id))
+        return self._error(404, "Unknown endpoint")
+
+
+def make_client(base_url, timeout=10):
+    """
+    a spotipy client talking to the fake server instead of api.spotify.com, to pass to
+    APIHandler(client=...). plain session, so the rate limiter does all the retrying
+    """
+    client = spotipy.Spotify(auth='fake-token', requests_session=requests.Session(), requests_timeout=timeout)
+    client.prefix = base_url.rstrip('/') + '/v1/'
+    return client
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake spotify artists api.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--rate-429', type=float, default=0.01, help="share of requests answered 429")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="seconds in the 429s' Retry-After")
+    parser.add_argument('--error-rate', type=float, default=0.01, help="share of requests answered 5xx")
+    parser.add_argument('--missing-rate', type=float, default=0.01, help="share of unknown artist ids")
+    args = parser.parse_args()
+
+    server = FakeSpotifyServer(port=args.port, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                               rate_429=args.rate_429, retry_after=args.retry_after,
+                               error_rate=args.error_rate, missing_rate=args.missing_rate)
+    print(f"Fake spotify api on {server.url}/v1/ (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served: {server.counts}")
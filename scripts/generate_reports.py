@@ -0,0 +1,61 @@
+# scripts/generate_reports.py
+# headless report pack: every analysis for every country, rendered with Agg across a process pool
+
+import sys
+import os
+import argparse
+import logging
+
+import matplotlib
+matplotlib.use('Agg')
+
+# weird path stuff
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src.core.metrics import metrics
+from src.core.report_builder import build_reports, ANALYSES, MANIFEST_NAME
+import config
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Render every analysis chart to PNG, without the gui.")
+    parser.add_argument('--db', default=config.DATABASE_NAME, help="artists database (default: config.DATABASE_NAME)")
+    parser.add_argument('--output', default=os.path.join(project_root, 'reports', 'nightly'),
+                        help="directory for the pngs and the manifest")
+    parser.add_argument('--analyses', nargs='+', choices=ANALYSES, default=list(ANALYSES),
+                        help="analyses to render (default: all of them)")
+    parser.add_argument('--countries', nargs='+', default=None,
+                        help="countries for the per-country analyses (default: every country in the database)")
+    parser.add_argument('--n', type=int, nargs='+', default=[10], dest='n_values',
+                        help="N values for the top-N analyses (default: 10)")
+    parser.add_argument('--workers', type=int, default=None, help="render processes (default: one per cpu)")
+    parser.add_argument('--dpi', type=int, default=150)
+    parser.add_argument('--metrics', metavar='PATH', default=None,
+                        help="write load/render timings here (.prom/.txt = Prometheus text format, anything else = JSON)")
+    parser.add_argument('--force', action='store_true', help="re-render charts whose data hasn't changed too")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=config.LOG_LEVEL, format=config.LOG_FORMAT)
+    if args.metrics:
+        metrics.enable()
+    if not os.path.exists(args.db):
+        sys.exit(f"FATAL: The database {args.db} was not found.")
+
+    manifest = build_reports(args.db, args.output, analyses=args.analyses, countries=args.countries,
+                             n_values=args.n_values, workers=args.workers, force=args.force, dpi=args.dpi)
+
+    counts = ", ".join(f"{count} {status}" for status, count in sorted(manifest['counts'].items()))
+    print(f"\n--- {len(manifest['charts'])} charts in {manifest['seconds']:.1f}s: {counts} ---")
+    print(f"Manifest: {os.path.join(args.output, MANIFEST_NAME)}")
+    if args.metrics:
+        metrics.write(args.metrics)
+        print(f"Metrics: {args.metrics}")
+    failed = [entry for entry in manifest['charts'] if entry['status'] == 'failed']
+    for entry in failed[:10]:
+        print(f"  failed: {entry['analysis']} {entry['country'] or ''} {entry['n'] or ''}: {entry['error']}")
+    if failed:
+        sys.exit(1)
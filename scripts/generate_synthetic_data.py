@@ -0,0 +1,157 @@
+# scripts/generate_synthetic_data.py
+# synthetic artist_data.csv seed files and ready-made artists databases, for benchmarking offline
+
+import sys
+import os
+import argparse
+import csv
+import random
+import time
+from datetime import datetime, timedelta
+
+# weird path stuff
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src.core.db_manager import DatabaseManager
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+COUNTRY_COUNT = 200
+GENRES = [f"{prefix} {base}" for base in ('pop', 'rock', 'hip hop', 'jazz', 'metal', 'folk', 'house', 'soul')
+          for prefix in ('indie', 'dark', 'latin', 'k', 'alt', 'neo', 'bedroom', 'classic', 'uk', 'deep')]
+GENRES += ['pop', 'rock', 'hip hop', 'jazz', 'metal', 'folk', 'house', 'soul', 'edm', 'reggaeton']
+
+# share of rows with the column missing, like the real data
+NULL_RATE = 0.02
+NO_IMAGE_RATE = 0.3
+
+
+def parse_scale(text):
+    """'10k' / '100k' / '1m' or a plain number of artists"""
+    text = str(text).lower().replace('_', '')
+    if text in SCALES:
+        return SCALES[text]
+    if text.endswith('k'):
+        return int(float(text[:-1]) * 1_000)
+    if text.endswith('m'):
+        return int(float(text[:-1]) * 1_000_000)
+    return int(text)
+
+
+def scale_name(count):
+    for name, size in SCALES.items():
+        if size == count:
+            return name
+    return str(count)
+
+
+def artist_id(i):
+    """22 characters, so ArtistSeedReader takes it for a spotify id"""
+    return f"{i:022d}"
+
+
+def country_name(i):
+    return f"Country {i:03d}"
+
+
+def synthetic_artists(count, seed=0):
+    """
+    one artists-table row per artist (plus the csv's artist_genre), reproducible for a seed.
+    countries are zipf-ish so the biggest ones are large enough to hit the density plot
+    """
+    rng = random.Random(seed)
+    country_weights = [1 / (rank + 1) for rank in range(COUNTRY_COUNT)]
+    countries = rng.choices(range(COUNTRY_COUNT), weights=country_weights, k=count)
+    now = datetime.now()
+
+    for i in range(count):
+        genres = rng.sample(GENRES, rng.choice((0, 1, 1, 2, 2, 3, 4)))
+        missing = [rng.random() < NULL_RATE for _ in range(4)]
+        yield {
+            'artist_id': artist_id(i),
+            'artist_name': f"Synthetic Artist {i}",
+            'country': None if missing[0] else country_name(countries[i]),
+            'spotify_popularity': None if missing[1] else min(100, max(0, int(rng.gauss(35, 18)))),
+            'spotify_followers': None if missing[2] else int((rng.paretovariate(1.1) - 1) * 1000),
+            'spotify_genres': None if missing[3] else ', '.join(genres),
+            'image_url': None if rng.random() < NO_IMAGE_RATE else f"https://i.scdn.co/image/{i:040x}",
+            'last_checked': (now - timedelta(days=rng.uniform(0, 30))).isoformat(),
+            'artist_genre': genres[0] if genres else rng.choice(GENRES),
+        }
+
+
+def write_csv(path, count, seed=0):
+    """
+    the seed csv populate_db.py reads. returns seconds taken
+    """
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['artist_id', 'artist_name', 'country', 'artist_genre'])
+        for artist in synthetic_artists(count, seed):
+            # the seed csv always has a country, spotify just doesn't always agree
+            writer.writerow([artist['artist_id'], artist['artist_name'],
+                             artist['country'] or country_name(0), artist['artist_genre']])
+    return time.perf_counter() - start
+
+
+def remove_db(path):
+    for suffix in ('', '-wal', '-shm'):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def write_db(path, count, seed=0, batch_size=5000):
+    """
+    a fully populated, fully migrated artists database, as if populate_db.py had run.
+    replaces whatever is at path. returns seconds taken
+    """
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    remove_db(path)
+    db_manager = DatabaseManager(db_file=path)
+    if not db_manager.is_connected():
+        raise RuntimeError(f"Could not create {path}")
+    rows = ({key: value for key, value in artist.items() if key != 'artist_genre'}
+            for artist in synthetic_artists(count, seed))
+    db_manager.add_artists(rows, batch_size=batch_size)
+    db_manager.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    db_manager.conn.close()
+    return time.perf_counter() - start
+
+
+def dataset_paths(data_dir, count, seed=0):
+    name = f"artists_{scale_name(count)}_seed{seed}"
+    return os.path.join(data_dir, name + '.csv'), os.path.join(data_dir, name + '.db')
+
+
+def ensure_dataset(data_dir, count, seed=0, force=False):
+    """
+    (csv path, db path) for the scale, generated unless they are already there
+    """
+    csv_path, db_path = dataset_paths(data_dir, count, seed)
+    if force or not os.path.exists(csv_path):
+        print(f"Writing {csv_path}... ", end='', flush=True)
+        print(f"{write_csv(csv_path, count, seed):.1f}s")
+    if force or not os.path.exists(db_path):
+        print(f"Writing {db_path}... ", end='', flush=True)
+        print(f"{write_db(db_path, count, seed):.1f}s")
+    return csv_path, db_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic seed csvs and artists databases.")
+    parser.add_argument('--artists', nargs='+', default=['10k'],
+                        help="scales to generate: 10k, 100k, 1m or a number of artists (default: 10k)")
+    parser.add_argument('--output-dir', default=os.path.join(project_root, 'data', 'synthetic'))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--force', action='store_true', help="regenerate files that already exist")
+    args = parser.parse_args()
+
+    for scale in args.artists:
+        csv_path, db_path = ensure_dataset(args.output_dir, parse_scale(scale), args.seed, args.force)
+        print(f"{scale}: {csv_path}, {db_path}")
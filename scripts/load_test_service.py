@@ -0,0 +1,226 @@
+# scripts/load_test_service.py
+# drives the http service (src/serve.py) with keep-alive clients for a while and reports throughput,
+# latency percentiles per endpoint and status counts. either against a running service (--url)
+# or one it starts itself on a database (--db)
+
+import sys
+import os
+import argparse
+import asyncio
+import json
+import random
+import socket
+import statistics
+import subprocess
+import time
+import urllib.request
+from collections import defaultdict
+from urllib.parse import quote, urlsplit
+
+# weird path stuff
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+# (label, path template, weight). {country} is filled in per request
+ENDPOINTS = [
+    ('top_followers', '/api/top-countries/followers?n={n}', 10),
+    ('top_popularity', '/api/top-countries/popularity?n={n}', 10),
+    ('histogram', '/api/popularity-histogram', 5),
+    ('genres', '/api/countries/{country}/genres', 20),
+    ('pop_vs_followers', '/api/countries/{country}/popularity-vs-followers', 10),
+    ('density', '/api/countries/{country}/density', 10),
+    ('spotlight', '/api/countries/{country}/spotlight', 20),
+    ('chart_top', '/charts/followers_by_country.png?n={n}', 3),
+    ('chart_genres', '/charts/genre_distribution.png?country={country}', 2),
+]
+
+
+def percentile(values, share):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def get_json(url, timeout=5):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.load(response)
+
+
+def start_service(db_path, mode, render_workers, timeout=120):
+    """
+    starts src/serve.py on a free port and waits until it answers. returns (process, base url)
+    """
+    port = free_port()
+    process = subprocess.Popen([sys.executable, os.path.join(project_root, 'src', 'serve.py'), '--db', db_path,
+                                '--port', str(port), '--mode', mode, '--render-workers', str(render_workers)])
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The service exited with {process.returncode}")
+        try:
+            get_json(url + '/api/health', timeout=1)
+            return process, url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"The service did not come up within {timeout}s")
+
+
+class LoadTest:
+    """
+    `concurrency` clients, each on its own keep-alive connection, sending a weighted mix of
+    requests for `duration` seconds. a `revalidate` share of repeat requests carries the
+    ETag from last time in If-None-Match, like a browser with a warm cache
+    """
+
+    def __init__(self, url, countries, concurrency=16, duration=10.0, revalidate=0.3, top_n=(5, 10, 15), seed=0):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.countries = countries
+        self.concurrency = concurrency
+        self.duration = duration
+        self.revalidate = revalidate
+        self.top_n = top_n
+        self.rng = random.Random(seed)
+        self.etags = {}
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.bytes = 0
+        self.errors = 0
+
+    def pick(self):
+        label, template, _ = self.rng.choices(ENDPOINTS, weights=[weight for *_, weight in ENDPOINTS])[0]
+        return label, template.format(country=quote(self.rng.choice(self.countries)), n=self.rng.choice(self.top_n))
+
+    async def request(self, reader, writer, path):
+        headers = [f"GET {path} HTTP/1.1", f"Host: {self.host}"]
+        etag = self.etags.get(path)
+        if etag and self.rng.random() < self.revalidate:
+            headers.append(f"If-None-Match: {etag}")
+        writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+        head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+        status = int(head[0].split(' ')[1])
+        response_headers = {}
+        for line in head[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                response_headers[name.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(response_headers.get('content-length', 0)))
+        if 'etag' in response_headers:
+            self.etags[path] = response_headers['etag']
+        return status, len(body), response_headers.get('connection', '').lower() == 'close'
+
+    async def client(self, deadline):
+        reader = writer = None
+        while time.perf_counter() < deadline:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            label, path = self.pick()
+            start = time.perf_counter()
+            try:
+                status, size, closed = await self.request(reader, writer, path)
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+                self.errors += 1
+                writer.close()
+                writer = None
+                continue
+            self.latencies[label].append(time.perf_counter() - start)
+            self.statuses[label][status] += 1
+            self.bytes += size
+            if closed:
+                writer.close()
+                writer = None
+        if writer is not None:
+            writer.close()
+
+    async def run(self):
+        started = time.perf_counter()
+        await asyncio.gather(*(self.client(started + self.duration) for _ in range(self.concurrency)))
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed):
+        def summary(values):
+            return {
+                'requests': len(values),
+                'mean_ms': round(statistics.fmean(values) * 1000, 3) if values else None,
+                'p50_ms': round(percentile(values, 0.50) * 1000, 3) if values else None,
+                'p95_ms': round(percentile(values, 0.95) * 1000, 3) if values else None,
+                'p99_ms': round(percentile(values, 0.99) * 1000, 3) if values else None,
+            }
+
+        every = [value for values in self.latencies.values() for value in values]
+        statuses = defaultdict(int)
+        for counts in self.statuses.values():
+            for status, count in counts.items():
+                statuses[status] += count
+        return {
+            'concurrency': self.concurrency,
+            'seconds': round(elapsed, 2),
+            'requests_per_second': round(len(every) / elapsed, 1),
+            'megabytes': round(self.bytes / 2**20, 2),
+            'connection_errors': self.errors,
+            'statuses': {str(status): count for status, count in sorted(statuses.items())},
+            'overall': summary(every),
+            'endpoints': {label: dict(summary(values), statuses={str(status): count for status, count in
+                                                                  sorted(self.statuses[label].items())})
+                          for label, values in sorted(self.latencies.items())},
+        }
+
+
+def print_report(report):
+    print(f"\n{report['requests_per_second']} req/s over {report['seconds']}s with {report['concurrency']} clients, "
+          f"{report['megabytes']} MB, statuses {report['statuses']}, {report['connection_errors']} connection errors")
+    print(f"{'endpoint':<18}{'requests':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for label, row in list(report['endpoints'].items()) + [('overall', report['overall'])]:
+        print(f"{label:<18}{row['requests']:>10}{row['mean_ms']:>10}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+              f"{row['p99_ms']:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the artist analysis HTTP service.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help="a running service, e.g. http://127.0.0.1:8080")
+    target.add_argument('--db', help="start a service on this database for the duration of the test")
+    parser.add_argument('--mode', choices=('pandas', 'sql'), default='pandas', help="analyzer mode for --db")
+    parser.add_argument('--render-workers', type=int, default=2, help="render processes for --db")
+    parser.add_argument('--concurrency', type=int, default=16, help="simultaneous keep-alive clients")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds to run")
+    parser.add_argument('--revalidate', type=float, default=0.3,
+                        help="share of repeat requests sent with If-None-Match")
+    parser.add_argument('--countries', type=int, default=20, help="the per-country endpoints pick from this many")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="also write the report here as JSON")
+    args = parser.parse_args()
+
+    process = None
+    url = args.url
+    if args.db:
+        process, url = start_service(args.db, args.mode, args.render_workers)
+    try:
+        countries = get_json(url.rstrip('/') + '/api/countries')[:args.countries]
+        if not countries:
+            sys.exit("The service has no countries to query.")
+        test = LoadTest(url, countries, concurrency=args.concurrency, duration=args.duration,
+                        revalidate=args.revalidate, seed=args.seed)
+        report = asyncio.run(test.run())
+        report['service'] = get_json(url.rstrip('/') + '/api/health')
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
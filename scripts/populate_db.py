@@ -1,80 +1,97 @@
-# scripts/populate_database.py (The Final "Safe Mode" Version)
+# scripts/populate_database.py (Concurrent Version)
 
 import sys
 import os
-import pandas as pd
-from datetime import datetime
-import time
+import argparse
+import logging
+from datetime import timedelta
 
 # weird path stuff
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.append(project_root)
 
 from src.core.api_handler import APIHandler
+from src.core.columnar_snapshot import write_snapshot
 from src.core.db_manager import DatabaseManager
+from src.core.data_processor import DataProcessor
+from src.core.refresh_planner import RefreshPlanner
+from src.core.response_cache import ResponseCache
+from src.core.ingest_journal import IngestJournal, PENDING, FAILED
+from src.core.metrics import metrics
 import config
 
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fetch artist details from Spotify into the artists database.")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="number of fetch threads. they all share one rate limit (default: 4)")
+    parser.add_argument('--csv', default=os.path.join(project_root, 'data', 'artist_data.csv'),
+                        help="seed csv with artist_id, artist_name, country, artist_genre columns")
+    parser.add_argument('--max-age-days', type=float, default=config.REFRESH_MAX_AGE_DAYS,
+                        help="only re-fetch artists older than this (default: config.REFRESH_MAX_AGE_DAYS)")
+    parser.add_argument('--full', action='store_true',
+                        help="re-fetch every artist in the csv, ignoring last_checked")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--resume', action='store_true',
+                      help="continue the last unfinished run, only its still-pending artists")
+    mode.add_argument('--retry-failed', action='store_true',
+                      help="retry only the artists that failed in the last run")
+    parser.add_argument('--cache', action='store_true',
+                        help="keep raw api responses in config.RESPONSE_CACHE_PATH and reuse them until they expire")
+    parser.add_argument('--progress-interval', type=float, default=5.0,
+                        help="seconds between progress reports (default: 5)")
+    parser.add_argument('--no-snapshot', action='store_true',
+                        help="don't refresh the columnar snapshot the analyzer memory-maps at startup")
+    parser.add_argument('--metrics', metavar='PATH', default=None,
+                        help="write api/db timings and counters here at the end "
+                             "(.prom/.txt = Prometheus text format, anything else = JSON)")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    print("--- Starting SAFE MODE Database Population Script ---")
-    print("This script runs in a single thread to guarantee we do not hit API rate limits.")
+    args = parse_args()
+    logging.basicConfig(level=config.LOG_LEVEL, format=config.LOG_FORMAT)
+    if args.metrics:
+        metrics.enable()
+    print("--- Starting Database Population Script ---")
+    # threads are fine now, every request goes through the api handler's rate limiter
+    print(f"Running {args.workers} fetch worker(s) behind one shared rate limiter.")
 
     # 1. Initialize Handlers
-    api_handler = APIHandler(client_id=config.CLIENT_ID, client_secret=config.CLIENT_SECRET)
+    cache = None
+    if args.cache:
+        cache = ResponseCache(config.RESPONSE_CACHE_PATH, ttl=config.RESPONSE_CACHE_TTL_HOURS * 3600,
+                              max_entries=config.RESPONSE_CACHE_MAX_ENTRIES)
+    api_handler = APIHandler(client_id=config.CLIENT_ID, client_secret=config.CLIENT_SECRET, cache=cache)
     db_manager = DatabaseManager(db_file=config.DATABASE_NAME)
 
     if not db_manager.is_connected() or not api_handler.is_authenticated:
         sys.exit("Halting: Database or API failed to initialize.")
 
-    # load data
-    try:
-        csv_file_path = os.path.join(project_root, 'data', 'artist_data.csv')
-        df = pd.read_csv(csv_file_path).dropna(subset=['artist_id', 'artist_name', 'country', 'artist_genre'])
-        artists_to_process = [row for index, row in df.iterrows()]
-        total_artists = len(artists_to_process)
-        print(f"Loaded {total_artists} valid artists to process.")
-    except FileNotFoundError:
-        sys.exit(f"FATAL: The file {csv_file_path} was not found.")
-
-    # no threading or i get banned from spotify api  ):
-    for i, artist_row in enumerate(artists_to_process):
-        try:
-            # print progress
-            if (i + 1) % 50 == 0:
-                print(f"Progress: {i + 1}/{total_artists} artists processed...")
-
-            # limit or i get banned :[
-            time.sleep(0.5)
-
-            artist_id = artist_row['artist_id']
-            artist_name = artist_row['artist_name']
-
-            details = api_handler.get_artist_details(artist_id)
-            if not details:
-                print(f"Warning: API error for {artist_name}. Skipping.")
-                continue
-
-            if not details['spotify_genres']: details['spotify_genres'] = artist_row['artist_genre']
-
-            image_url = None
-            if details.get('images'):
-                if len(details['images']) > 0:
-                    # index 1 images = medium size
-                    image_index = 1 if len(details['images']) > 1 else 0
-                    image_url = details['images'][image_index]['url']
-
-            details.update({
-                'artist_id': artist_id, 'country': artist_row['country'],
-                'last_updated': datetime.now().isoformat(),
-                'image_url': image_url,
-                'spotify_url': details['external_urls']['spotify'] if details.get('external_urls') else None
-            })
-            details.pop('images', None)
-            details.pop('external_urls', None)
-
-            # save to db
-            db_manager.add_artist(details)
-
-        except Exception as e:
-            print(f"An unexpected error occurred for artist {artist_row.get('artist_name', 'N/A')}: {e}")
-
-    print(f"\n--- Population Script Finished! All {total_artists} artists have been processed. ---")
\ No newline at end of file
+    processor = DataProcessor(api_handler, db_manager, workers=args.workers,
+                              progress_interval=args.progress_interval)
+    journal = IngestJournal(db_manager)
+    run_id = only_ids = planner = None
+    if args.resume or args.retry_failed:
+        last_run = journal.latest_run(unfinished_only=args.resume)
+        if last_run is None:
+            sys.exit("Nothing to resume." if args.resume else "No previous run to retry.")
+        run_id = last_run[0]
+        only_ids = journal.ids_with_status(run_id, PENDING if args.resume else FAILED)
+        print(f"{'Resuming' if args.resume else 'Retrying failures of'} run {run_id}: {len(only_ids)} artists.")
+    elif not args.full:
+        planner = RefreshPlanner(db_manager, max_age=timedelta(days=args.max_age_days))
+
+    progress = processor.process_and_store_artists(args.csv, planner=planner, journal=journal,
+                                                   run_id=run_id, only_ids=only_ids)
+    if progress is not None and not args.no_snapshot:
+        # the gui and the report builder map this instead of re-reading the table
+        print(f"Columnar snapshot: {write_snapshot(config.DATABASE_NAME)}")
+    if args.metrics:
+        metrics.write(args.metrics)
+        print(f"Metrics written to {args.metrics}")
+    if progress is None:
+        sys.exit(f"FATAL: The file {args.csv} was not found.")
+
+    print(f"\n--- Population Script Finished! All {progress.processed} artists have been processed. ---")
+    print(f"{progress.inserted} new, {progress.changed} changed, {progress.unchanged} unchanged.")
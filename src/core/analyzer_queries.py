@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+from .connection_pool import ReadOnlyConnectionPool
+
+
+class AnalyzerQueries:
+    """
+    the DataAnalyzer analyses as targeted sql queries
+
+    every method returns exactly what the matching pandas-mode DataAnalyzer method
+    returns, but only the rows the answer needs ever leave sqlite. relies on the
+    indexes and the artist_genres table from schema version 3.
+    """
+
+    # oldest schema version the queries work against
+    MIN_SCHEMA_VERSION = 3
+
+    def __init__(self, db_path, pool_size=4):
+        self.pool = ReadOnlyConnectionPool(db_path, max_size=pool_size)
+
+    def schema_version(self):
+        return self.pool.execute("PRAGMA user_version")[0][0]
+
+    def count_artists(self):
+        return self.pool.execute("SELECT COUNT(*) FROM artists")[0][0]
+
+    def available_countries(self):
+        rows = self.pool.execute("SELECT DISTINCT country FROM artists WHERE country IS NOT NULL")
+        return sorted(country for (country,) in rows)
+
+    def top_n_countries_by_followers(self, n):
+        rows = self.pool.execute("""
+            SELECT country, SUM(spotify_followers) AS total
+            FROM artists
+            WHERE country IS NOT NULL AND spotify_followers IS NOT NULL
+            GROUP BY country
+            ORDER BY total DESC, country
+            LIMIT ?""", (n,))
+        return pd.Series([total for _, total in rows], dtype='int64', name='spotify_followers',
+                         index=pd.Index([country for country, _ in rows], name='country'))
+
+    def top_n_countries_by_avg_popularity(self, n):
+        # SUM/COUNT instead of AVG: integer sums are exact, so the division rounds the
+        # same way pandas' mean does and ties sort the same
+        rows = self.pool.execute("""
+            SELECT country, CAST(SUM(spotify_popularity) AS REAL) / COUNT(spotify_popularity) AS mean
+            FROM artists
+            WHERE country IS NOT NULL AND spotify_popularity IS NOT NULL
+            GROUP BY country
+            ORDER BY mean DESC, country
+            LIMIT ?""", (n,))
+        return pd.Series([mean for _, mean in rows], dtype='float64', name='spotify_popularity',
+                         index=pd.Index([country for country, _ in rows], name='country'))
+
+    def _has_country(self, country, *columns):
+        not_null = ''.join(f" AND {column} IS NOT NULL" for column in columns)
+        return bool(self.pool.execute(f"SELECT 1 FROM artists WHERE country = ?{not_null} LIMIT 1", (country,)))
+
+    def genre_distribution_for_country(self, country, n):
+        if not self._has_country(country, 'spotify_genres'):
+            return None
+        rows = self.pool.execute("""
+            SELECT g.genre, COUNT(*) AS artists
+            FROM artists a JOIN artist_genres g ON g.artist_id = a.artist_id
+            WHERE a.country = ? AND a.spotify_genres IS NOT NULL
+            GROUP BY g.genre
+            ORDER BY artists DESC, g.genre
+            LIMIT ?""", (country, n))
+        return pd.Series([count for _, count in rows], dtype='int64', name='count',
+                         index=pd.Index([genre for genre, _ in rows], name='genre', dtype=object))
+
+    def popularity_vs_followers(self, country):
+        rows = self.pool.execute("""
+            SELECT spotify_followers, spotify_popularity
+            FROM artists
+            WHERE country = ? AND spotify_followers IS NOT NULL AND spotify_popularity IS NOT NULL
+            ORDER BY rowid""", (country,))
+        if not rows:
+            return None, None
+        return (pd.Series([followers for followers, _ in rows], dtype='int64', name='spotify_followers'),
+                pd.Series([popularity for _, popularity in rows], dtype='int64', name='spotify_popularity'))
+
+    def popularity_distribution(self):
+        rows = self.pool.execute("SELECT spotify_popularity FROM artists WHERE spotify_popularity IS NOT NULL ORDER BY rowid")
+        return pd.Series([popularity for (popularity,) in rows], dtype='int64', name='spotify_popularity')
+
+    def popularity_counts(self):
+        """
+        (values, counts): every distinct popularity and how many artists have it, off the popularity index
+        """
+        rows = self.pool.execute("""
+            SELECT spotify_popularity, COUNT(*) FROM artists
+            WHERE spotify_popularity IS NOT NULL
+            GROUP BY spotify_popularity""")
+        return (np.array([value for value, _ in rows], dtype='int64'),
+                np.array([count for _, count in rows], dtype='int64'))
+
+    def most_popular_artist_in_country(self, country):
+        with self.pool.connection() as conn:
+            cursor = conn.execute("""
+                SELECT * FROM artists
+                WHERE country = ? AND spotify_popularity IS NOT NULL
+                ORDER BY spotify_popularity DESC, rowid
+                LIMIT 1""", (country,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip([column[0] for column in cursor.description], row))
+
+    def artist_by_rowid(self, rowid):
+        """
+        the full artists row, for the display columns pandas mode doesn't keep in memory
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.execute("SELECT * FROM artists WHERE rowid = ?", (int(rowid),))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip([column[0] for column in cursor.description], row))
+
+    def close(self):
+        self.pool.close()
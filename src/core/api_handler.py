@@ -1,54 +1,264 @@
+import logging
+
+import requests
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
 
+from .metrics import metrics
+from .rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# spotify's "get several artists" endpoint takes at most 50 ids per request
+ARTISTS_BATCH_LIMIT = 50
+
+# statuses worth trying again, everything else is the request's fault
+RETRYABLE_STATUSES = (500, 502, 503, 504)
+NOT_FOUND_STATUSES = (400, 404)
+
 
 class APIHandler:
     """
     communication with spotify Web API
     """
 
-    def __init__(self, client_id, client_secret):
+    def __init__(self, client_id, client_secret, client=None, rate_limiter=None, max_retries=5, cache=None):
+        """
+        args:
+            client_id (str)
+            client_secret (str)
+            client: optional ready-made spotify client (e.g. a fake one for offline runs),
+                    skips authentication when given
+            rate_limiter (RateLimiter): shared limiter, a default one is made if not given
+            max_retries (int): retries per request on 429/5xx/connection errors
+            cache (ResponseCache): optional persistent cache of raw artist responses
+        """
         self.sp = None
         self.is_authenticated = False
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.max_retries = max_retries
+        self.cache = cache
+        if client is not None:
+            self.sp = client
+            self.is_authenticated = True
+            return
+
         try:
             auth_manager = SpotifyClientCredentials(client_id=client_id, client_secret=client_secret)
-            self.sp = spotipy.Spotify(auth_manager=auth_manager)
+            # plain session: spotipy's built-in urllib3 retries would swallow the
+            # Retry-After header, the rate limiter does the retrying instead
+            self.sp = spotipy.Spotify(auth_manager=auth_manager, requests_session=requests.Session())
             self.is_authenticated = True
-            print("API Handler authenticated successfully with Spotify.")
+            logger.info("API Handler authenticated successfully with Spotify.")
         except Exception as e:
-            print(f"Error authenticating with Spotify: {e}")
+            logger.error("Error authenticating with Spotify: %s", e)
             self.is_authenticated = False
 
+    @property
+    def stats(self):
+        """
+        request/throttle/retry counters from the rate limiter, plus cache counters if there is a cache
+        """
+        stats = self.rate_limiter.stats()
+        if self.cache:
+            stats['cache'] = self.cache.stats()
+        return stats
+
+    @staticmethod
+    def _cache_key(artist_id):
+        return f"artist:{artist_id}"
+
+    @staticmethod
+    def _retry_after(exc):
+        """
+        seconds from a 429's Retry-After header, None if missing or unreadable
+        """
+        value = (getattr(exc, 'headers', None) or {}).get('Retry-After')
+        try:
+            return float(value) if value is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    def _call(self, func, *args):
+        """
+        runs one spotify request through the rate limiter.
+        429s wait out Retry-After (or back off), 5xx and connection errors back off
+        with jitter, anything else is raised straight away
+        """
+        endpoint = getattr(func, '__name__', 'request')
+        for attempt in range(self.max_retries + 1):
+            with metrics.span('api_rate_limit_wait_seconds', endpoint=endpoint):
+                self.rate_limiter.acquire()
+            try:
+                with metrics.span('api_request_seconds', endpoint=endpoint):
+                    result = func(*args)
+            except spotipy.exceptions.SpotifyException as e:
+                metrics.inc('api_requests_total', endpoint=endpoint, status=e.http_status)
+                if attempt == self.max_retries:
+                    raise
+                if e.http_status in (429,) + RETRYABLE_STATUSES:
+                    metrics.inc('api_retries_total', endpoint=endpoint, reason=e.http_status)
+                if e.http_status == 429:
+                    retry_after = self._retry_after(e)
+                    self.rate_limiter.on_throttle(retry_after)
+                    if retry_after is None:
+                        self.rate_limiter.backoff(attempt)
+                    else:
+                        # the limiter makes the next acquire() wait it out
+                        self.rate_limiter.record_retry()
+                elif e.http_status in RETRYABLE_STATUSES:
+                    self.rate_limiter.backoff(attempt)
+                else:
+                    raise
+                continue
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                reason = 'timeout' if isinstance(e, requests.exceptions.Timeout) else 'connection_error'
+                metrics.inc('api_requests_total', endpoint=endpoint, status=reason)
+                if attempt == self.max_retries:
+                    raise
+                metrics.inc('api_retries_total', endpoint=endpoint, reason=reason)
+                self.rate_limiter.backoff(attempt)
+                continue
+
+            metrics.inc('api_requests_total', endpoint=endpoint, status=200)
+            self.rate_limiter.on_success()
+            return result
+
+    @staticmethod
+    def _normalize_artist(artist_data):
+        """
+        turns a raw spotify artist object into the dict the rest of the app uses
+        """
+        artist_id = artist_data.get('id')
+        details = {
+            'artist_name': artist_data['name'],
+            'spotify_popularity': artist_data['popularity'],
+            'spotify_followers': artist_data['followers']['total'],
+            'spotify_genres': ', '.join(artist_data['genres']),
+            'images': artist_data['images'],
+            'external_urls': artist_data['external_urls']
+        }
+
+        if not artist_data.get('images'):
+            logger.warning("No images found for artist: %s (ID: %s)", artist_data['name'], artist_id)
+        elif len(artist_data['images']) < 2:
+            logger.debug("Only %d image(s) found for artist: %s (ID: %s)", len(artist_data['images']), artist_data['name'], artist_id)
+
+        return details
+
     def get_artist_details(self, artist_id):
         """
         detailed info about a single artist
         """
         if not self.is_authenticated:
-            print("Cannot fetch artist details: API Handler is not authenticated.")
+            logger.error("Cannot fetch artist details: API Handler is not authenticated.")
             return None
 
         try:
-            artist_data = self.sp.artist(artist_id)
-
-            details = {
-                'artist_name': artist_data['name'],
-                'spotify_popularity': artist_data['popularity'],
-                'spotify_followers': artist_data['followers']['total'],
-                'spotify_genres': ', '.join(artist_data['genres']),
-                'images': artist_data['images'],
-                'external_urls': artist_data['external_urls']
-            }
-
-            if not artist_data.get('images'):
-                print(f"Warning: No images found for artist: {artist_data['name']} (ID: {artist_id})")
-            elif len(artist_data['images']) < 2:
-                print(f"Note: Only {len(artist_data['images'])} image(s) found for artist: {artist_data['name']} (ID: {artist_id})")
-
+            artist_data = self.cache.get(self._cache_key(artist_id)) if self.cache else None
+            if artist_data is not None:
+                try:
+                    return self._normalize_artist(artist_data)
+                except (KeyError, TypeError) as e:
+                    logger.warning("Dropping malformed cached response for artist ID '%s': %s", artist_id, e)
+                    self.cache.delete_many([self._cache_key(artist_id)])
+            artist_data = self._call(self.sp.artist, artist_id)
+            details = self._normalize_artist(artist_data)
+            # only payloads that normalized get cached, a bad one would fail every run until it expires
+            if self.cache and artist_data:
+                self.cache.put(self._cache_key(artist_id), artist_data)
             return details
 
         except spotipy.exceptions.SpotifyException as e:
-            print(f"Error: Artist with ID '{artist_id}' not found on Spotify. Details: {e}")
+            if e.http_status in NOT_FOUND_STATUSES:
+                logger.warning("Artist with ID '%s' not found on Spotify. Details: %s", artist_id, e)
+            else:
+                logger.error("Spotify request for artist ID '%s' failed after retries. Details: %s", artist_id, e)
             return None
         except Exception as e:
-            print(f"An unexpected error occurred when fetching data for artist ID '{artist_id}': {e}")
-            return None
\ No newline at end of file
+            logger.exception("An unexpected error occurred when fetching data for artist ID '%s': %s", artist_id, e)
+            return None
+
+    def get_artists_details(self, artist_ids):
+        """
+        detailed info about many artists, fetched 50 at a time
+
+        args:
+            artist_ids (iterable of str)
+
+        returns:
+            (details_by_id, missing_ids): dict of artist_id -> normalized details (same shape
+            as get_artist_details) and a list of the ids spotify returned nothing for
+        """
+        # dedupe but keep the order
+        artist_ids = list(dict.fromkeys(artist_ids))
+        if not self.is_authenticated:
+            logger.error("Cannot fetch artist details: API Handler is not authenticated.")
+            return {}, artist_ids
+
+        details_by_id = {}
+        missing_ids = []
+        if self.cache:
+            # cached artists never reach the network
+            cached = self.cache.get_many(self._cache_key(artist_id) for artist_id in artist_ids)
+            uncached_ids = []
+            malformed_keys = []
+            for artist_id in artist_ids:
+                artist_data = cached.get(self._cache_key(artist_id))
+                if artist_data is None:
+                    uncached_ids.append(artist_id)
+                    continue
+                try:
+                    details_by_id[artist_id] = self._normalize_artist(artist_data)
+                except (KeyError, TypeError) as e:
+                    # treat it as a miss: drop the entry and fetch the artist again
+                    logger.warning("Dropping malformed cached response for artist ID '%s': %s", artist_id, e)
+                    malformed_keys.append(self._cache_key(artist_id))
+                    uncached_ids.append(artist_id)
+            self.cache.delete_many(malformed_keys)
+            artist_ids = uncached_ids
+
+        for start in range(0, len(artist_ids), ARTISTS_BATCH_LIMIT):
+            chunk = artist_ids[start:start + ARTISTS_BATCH_LIMIT]
+            try:
+                response = self._call(self.sp.artists, chunk)
+            except spotipy.exceptions.SpotifyException as e:
+                if e.http_status == 400 and len(chunk) > 1:
+                    # one malformed id fails the whole batch, so look them up one by one instead
+                    logger.warning("Batch lookup rejected (%s). Falling back to single lookups for %d artists.", e, len(chunk))
+                    for artist_id in chunk:
+                        details = self.get_artist_details(artist_id)
+                        if details:
+                            details_by_id[artist_id] = details
+                        else:
+                            missing_ids.append(artist_id)
+                    continue
+                logger.error("Batch lookup of %d artists failed. Details: %s", len(chunk), e)
+                missing_ids.extend(chunk)
+                continue
+            except Exception as e:
+                logger.exception("An unexpected error occurred when fetching a batch of %d artists: %s", len(chunk), e)
+                missing_ids.extend(chunk)
+                continue
+
+            # spotify answers in request order with null for unknown ids
+            artists = (response or {}).get('artists') or []
+            # only payloads that normalized get cached, a bad one would fail every run until it expires
+            to_cache = {}
+            for artist_id, artist_data in zip(chunk, artists):
+                if not artist_data:
+                    missing_ids.append(artist_id)
+                    continue
+                try:
+                    details_by_id[artist_id] = self._normalize_artist(artist_data)
+                except (KeyError, TypeError) as e:
+                    logger.error("Malformed response for artist ID '%s': %s", artist_id, e)
+                    missing_ids.append(artist_id)
+                    continue
+                to_cache[self._cache_key(artist_id)] = artist_data
+            if self.cache:
+                self.cache.put_many(to_cache)
+            # a short response means the tail ids got nothing back
+            missing_ids.extend(chunk[len(artists):])
+
+        return details_by_id, missing_ids
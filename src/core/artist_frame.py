@@ -0,0 +1,142 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from .connection_pool import read_only_uri
+from .db_manager import split_genres
+
+# only what the analyses read. names, urls and timestamps stay in sqlite and are
+# looked up by rowid when something actually displays them
+ANALYSIS_COLUMNS_SQL = ("SELECT rowid, country, spotify_popularity, spotify_followers, spotify_genres "
+                        "FROM artists ORDER BY rowid")
+
+# changes whenever an artist is added (new rowid) or its data changes (new last_changed),
+# but not for refreshes that found nothing new or writes to the other tables. two subqueries
+# because sqlite only answers a lone MIN/MAX from the index, together they scan the whole table
+DATA_STAMP_SQL = "SELECT (SELECT MAX(rowid) FROM artists), (SELECT MAX(last_changed) FROM artists)"
+
+
+class GenreCodes:
+    """
+    genres as an integer-coded multi-label column
+
+    artist row i has genre codes codes[offsets[i]:offsets[i + 1]], each an index into
+    `vocab` (sorted). has_genres[i] is False where spotify_genres was NULL, which is not
+    the same as an empty genres string (no codes, but not missing).
+    """
+
+    def __init__(self, vocab, offsets, codes, has_genres):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.codes = codes
+        self.has_genres = has_genres
+
+    @property
+    def nbytes(self):
+        return (self.offsets.nbytes + self.codes.nbytes + self.has_genres.nbytes
+                + sum(len(genre) + 49 for genre in self.vocab))
+
+
+def _nullable_uint(values, missing):
+    """
+    smallest nullable unsigned dtype that fits (UInt8 for popularity, UInt32 for followers)
+    """
+    top = int(values.max(initial=0))
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if top <= np.iinfo(dtype).max:
+            return pd.arrays.IntegerArray(np.where(missing, 0, values).astype(dtype), missing)
+
+
+def load_artist_frame(db_path, chunk_size=100_000):
+    """
+    reads the analysis columns chunk by chunk into a compact frame
+
+    returns:
+        (df, genre_codes): df has rowid (int64), country (category), spotify_popularity and
+        spotify_followers (smallest nullable unsigned ints); genre_codes is a GenreCodes
+    """
+    conn = sqlite3.connect(read_only_uri(db_path), uri=True)
+    try:
+        cursor = conn.execute(ANALYSIS_COLUMNS_SQL)
+        country_code = {}
+        genre_code = {}
+        split_cache = {}
+        rowid_chunks, country_chunks, popularity_chunks, followers_chunks = [], [], [], []
+        length_chunks, has_genres_chunks, genre_chunks = [], [], []
+
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            rowids, countries, popularity, followers, genres = zip(*rows)
+            count = len(rows)
+            rowid_chunks.append(np.fromiter(rowids, dtype=np.int64, count=count))
+            country_chunks.append(np.fromiter(
+                (-1 if c is None else country_code.setdefault(c, len(country_code)) for c in countries),
+                dtype=np.int32, count=count))
+            # -1 marks NULL, spotify never sends negative counts
+            popularity_chunks.append(np.fromiter((-1 if p is None else int(p) for p in popularity),
+                                                 dtype=np.int64, count=count))
+            followers_chunks.append(np.fromiter((-1 if f is None else int(f) for f in followers),
+                                                dtype=np.int64, count=count))
+
+            lengths = np.zeros(count, dtype=np.int64)
+            codes = []
+            for i, value in enumerate(genres):
+                if value is None:
+                    continue
+                row_codes = split_cache.get(value)
+                if row_codes is None:
+                    row_codes = split_cache[value] = [genre_code.setdefault(g, len(genre_code))
+                                                      for g in split_genres(value)]
+                lengths[i] = len(row_codes)
+                codes.extend(row_codes)
+            length_chunks.append(lengths)
+            has_genres_chunks.append(np.fromiter((g is not None for g in genres), dtype=bool, count=count))
+            genre_chunks.append(np.array(codes, dtype=np.int32))
+    finally:
+        conn.close()
+
+    def joined(chunks, dtype):
+        return np.concatenate(chunks) if chunks else np.array([], dtype=dtype)
+
+    # codes were handed out in order of appearance, renumber them so the categories are sorted
+    country_names = sorted(country_code)
+    country_remap = np.empty(len(country_code) + 1, dtype=np.int32)
+    country_remap[-1] = -1
+    for new_code, name in enumerate(country_names):
+        country_remap[country_code[name]] = new_code
+    countries = country_remap[joined(country_chunks, np.int32)]
+
+    vocab = sorted(genre_code)
+    genre_remap = np.empty(len(genre_code), dtype=np.int32)
+    for new_code, name in enumerate(vocab):
+        genre_remap[genre_code[name]] = new_code
+    genre_lengths = joined(length_chunks, np.int64)
+    genre_codes = GenreCodes(
+        vocab=np.array(vocab, dtype=object),
+        offsets=np.concatenate(([0], np.cumsum(genre_lengths))).astype(np.int64),
+        codes=genre_remap[joined(genre_chunks, np.int32)],
+        has_genres=joined(has_genres_chunks, bool),
+    )
+
+    popularity = joined(popularity_chunks, np.int64)
+    followers = joined(followers_chunks, np.int64)
+    df = pd.DataFrame({
+        'rowid': joined(rowid_chunks, np.int64),
+        'country': pd.Categorical.from_codes(countries, categories=country_names),
+        'spotify_popularity': _nullable_uint(popularity, popularity < 0),
+        'spotify_followers': _nullable_uint(followers, followers < 0),
+    })
+    return df, genre_codes
+
+
+def frame_nbytes(df, genre_codes=None):
+    """
+    deep memory footprint of a frame (plus its genre codes), in bytes
+    """
+    total = int(df.memory_usage(deep=True).sum())
+    if genre_codes is not None:
+        total += genre_codes.nbytes
+    return total
@@ -0,0 +1,74 @@
+import csv
+import re
+from typing import NamedTuple
+
+# spotify ids are 22 base62 characters
+ARTIST_ID_PATTERN = re.compile(r'^[0-9A-Za-z]{22}$')
+
+# csv columns an artist needs to be worth looking up
+REQUIRED_CSV_COLUMNS = ('artist_id', 'artist_name', 'country', 'artist_genre')
+
+
+class ArtistSeed(NamedTuple):
+    """one usable row of the seed csv"""
+    artist_id: str
+    artist_name: str
+    country: str
+    artist_genre: str
+
+
+class ArtistSeedReader:
+    """
+    streams the seed csv one row at a time
+
+    rows missing any of the required columns, rows with a malformed artist_id and repeats
+    of an id already seen are skipped on the fly (and counted), so nothing but the set of
+    seen ids is kept in memory. iterating again re-reads the file.
+    """
+
+    def __init__(self, csv_filepath, validate_ids=True):
+        """
+        args:
+            csv_filepath (str)
+            validate_ids (bool): drop ids that don't look like spotify ids
+        """
+        self.csv_filepath = csv_filepath
+        self.validate_ids = validate_ids
+        self.rows = 0
+        self.invalid = 0
+        self.duplicates = 0
+
+    def _check_columns(self, reader):
+        missing_columns = [col for col in REQUIRED_CSV_COLUMNS if col not in (reader.fieldnames or [])]
+        if missing_columns:
+            raise ValueError(f"{self.csv_filepath} is missing column(s): {', '.join(missing_columns)}")
+
+    def check(self):
+        """
+        raises ValueError if the csv header lacks a required column, without reading any rows
+        """
+        with open(self.csv_filepath, newline='', encoding='utf-8-sig') as f:
+            self._check_columns(csv.DictReader(f))
+
+    def __iter__(self):
+        self.rows = self.invalid = self.duplicates = 0
+        seen = set()
+        with open(self.csv_filepath, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            self._check_columns(reader)
+
+            for row in reader:
+                self.rows += 1
+                values = [(row.get(col) or '').strip() for col in REQUIRED_CSV_COLUMNS]
+                if not all(values) or (self.validate_ids and not ARTIST_ID_PATTERN.match(values[0])):
+                    self.invalid += 1
+                    continue
+                if values[0] in seen:
+                    self.duplicates += 1
+                    continue
+                seen.add(values[0])
+                yield ArtistSeed(*values)
+
+    def summary(self):
+        return (f"Read {self.rows} csv rows: {self.rows - self.invalid - self.duplicates} usable, "
+                f"{self.invalid} invalid, {self.duplicates} duplicate ids skipped.")
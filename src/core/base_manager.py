@@ -1,3 +1,8 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
 class BaseManager:
     """
     base class
@@ -10,4 +15,4 @@ class BaseManager:
             db_path (str): path to SQLite db file.
         """
         self.db_path = db_path
-        print(f"{self.__class__.__name__} initialized with DB path: {db_path}")
\ No newline at end of file
+        logger.debug("%s initialized with DB path: %s", self.__class__.__name__, db_path)
\ No newline at end of file
@@ -0,0 +1,198 @@
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from .artist_frame import GenreCodes, load_artist_frame, DATA_STAMP_SQL
+from .connection_pool import read_only_uri
+from .country_index import CountryIndex
+
+logger = logging.getLogger(__name__)
+
+# bump when the files change shape, older snapshots are then ignored
+SNAPSHOT_FORMAT = 1
+# names the current version's subdirectory, replaced atomically
+CURRENT_FILE = 'CURRENT'
+META_FILE = 'meta.json'
+# versions kept around, so a reader that is mid-load when a new one lands can still finish
+KEEP_VERSIONS = 2
+
+
+def snapshot_dir(db_path):
+    """
+    where the snapshot of db_path lives: a directory next to it
+    """
+    return os.path.abspath(db_path) + '.snapshot'
+
+
+def read_data_stamp(db_path):
+    """
+    (MAX(rowid), MAX(last_changed)) of the artists table, same as DataAnalyzer's change stamp
+    """
+    conn = sqlite3.connect(read_only_uri(db_path), uri=True)
+    try:
+        return tuple(conn.execute(DATA_STAMP_SQL).fetchone())
+    finally:
+        conn.close()
+
+
+def _current_version(directory):
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _read_meta(version_dir):
+    with open(os.path.join(version_dir, META_FILE), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _frame_arrays(df, genre_codes, country_index):
+    """
+    every array that makes up a loaded frame, by file name
+    """
+    arrays = {
+        'rowid': df['rowid'].to_numpy(),
+        'country': df['country'].cat.codes.to_numpy(),
+        'genre_offsets': genre_codes.offsets,
+        'genre_codes': genre_codes.codes,
+        'has_genres': genre_codes.has_genres,
+    }
+    for column in ('spotify_popularity', 'spotify_followers'):
+        values = df[column].array
+        arrays[column] = values.to_numpy(dtype=values.dtype.numpy_dtype, na_value=0)
+        arrays[f'{column}_mask'] = values.isna()
+    for name, array in country_index.arrays().items():
+        arrays[f'index_{name}'] = array
+    return arrays
+
+
+def write_snapshot(db_path, directory=None):
+    """
+    writes the analysis columns of db_path, the genre codes and the CountryIndex as .npy files
+    DataAnalyzer can memory-map, stamped with the table's data stamp. does nothing if the
+    current snapshot already has that stamp
+
+    a new version goes into its own subdirectory and CURRENT is switched over to it in one
+    rename, so readers never see half a snapshot
+
+    returns:
+        the version's directory
+    """
+    directory = directory or snapshot_dir(db_path)
+    # read before the data: if a write sneaks in between, the stamp is older than the
+    # data and the snapshot just looks stale, never the other way around
+    stamp = read_data_stamp(db_path)
+    current = _current_version(directory)
+    if current is not None:
+        try:
+            meta = _read_meta(os.path.join(directory, current))
+            if meta.get('format') == SNAPSHOT_FORMAT and tuple(meta.get('stamp', ())) == stamp:
+                return os.path.join(directory, current)
+        except (OSError, ValueError):
+            pass
+
+    started = time.perf_counter()
+    df, genre_codes = load_artist_frame(db_path)
+    country_index = CountryIndex(df, genre_codes)
+
+    os.makedirs(directory, exist_ok=True)
+    version = f"v{time.time_ns()}"
+    version_dir = os.path.join(directory, version)
+    os.makedirs(version_dir)
+    arrays = _frame_arrays(df, genre_codes, country_index)
+    for name, array in arrays.items():
+        np.save(os.path.join(version_dir, f"{name}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+    meta = {
+        'format': SNAPSHOT_FORMAT,
+        'stamp': list(stamp),
+        'records': len(df),
+        'created_at': time.time(),
+        'countries': [str(name) for name in df['country'].cat.categories],
+        'genres': [str(genre) for genre in genre_codes.vocab],
+        'arrays': sorted(arrays),
+    }
+    with open(os.path.join(version_dir, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+    tmp_path = os.path.join(directory, f"{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(directory, CURRENT_FILE))
+    _prune(directory, version)
+    logger.info("Wrote columnar snapshot of %d records to %s in %.2fs.",
+                len(df), version_dir, time.perf_counter() - started)
+    return version_dir
+
+
+def _prune(directory, current):
+    versions = sorted(name for name in os.listdir(directory)
+                      if name.startswith('v') and os.path.isdir(os.path.join(directory, name)))
+    for name in versions[:-KEEP_VERSIONS]:
+        if name != current:
+            # processes that mapped it keep their pages, the files just lose their names
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def load_snapshot(db_path, stamp, directory=None):
+    """
+    memory-maps the current snapshot if it was taken at `stamp`
+
+    args:
+        stamp: the table's data stamp right now (see read_data_stamp)
+
+    returns:
+        (df, genre_codes, country_index) backed by read-only memory maps, or None if there
+        is no snapshot, it is stale or it can't be read
+    """
+    if stamp is None:
+        return None
+    directory = directory or snapshot_dir(db_path)
+    version = _current_version(directory)
+    if version is None:
+        return None
+    version_dir = os.path.join(directory, version)
+    try:
+        meta = _read_meta(version_dir)
+        if meta.get('format') != SNAPSHOT_FORMAT:
+            return None
+        if tuple(meta['stamp']) != tuple(stamp):
+            logger.info("Columnar snapshot %s is stale, reading the database instead.", version)
+            return None
+
+        def mapped(name):
+            # a plain ndarray view of the map, so nothing computed from it comes out as an np.memmap
+            return np.asarray(np.load(os.path.join(version_dir, f"{name}.npy"), mmap_mode='r', allow_pickle=False))
+
+        countries = meta['countries']
+        df = pd.DataFrame({
+            'rowid': mapped('rowid'),
+            # codes were range-checked when the snapshot was written
+            'country': pd.Categorical.from_codes(mapped('country'), categories=countries, validate=False),
+            'spotify_popularity': pd.arrays.IntegerArray(mapped('spotify_popularity'),
+                                                         mapped('spotify_popularity_mask')),
+            'spotify_followers': pd.arrays.IntegerArray(mapped('spotify_followers'),
+                                                        mapped('spotify_followers_mask')),
+        }, copy=False)
+        genre_codes = GenreCodes(
+            vocab=np.array(meta['genres'], dtype=object),
+            offsets=mapped('genre_offsets'),
+            codes=mapped('genre_codes'),
+            has_genres=mapped('has_genres'),
+        )
+        country_index = CountryIndex.from_arrays(
+            countries, genre_codes.vocab, {name: mapped(f'index_{name}') for name in CountryIndex.ARRAYS})
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning("Could not read columnar snapshot %s, reading the database instead: %s", version_dir, e)
+        return None
+    if len(df) != meta['records']:
+        logger.warning("Columnar snapshot %s is incomplete, reading the database instead.", version_dir)
+        return None
+    return df, genre_codes, country_index
@@ -0,0 +1,87 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+
+# ids per "IN (?, ...)" query, stays under sqlite's bound parameter limit on old builds (999)
+ID_CHUNK = 500
+
+
+def id_chunks(items):
+    """
+    slices of a list of at most ID_CHUNK items, to bind one IN (...) query each
+    """
+    for start in range(0, len(items), ID_CHUNK):
+        yield items[start:start + ID_CHUNK]
+
+
+def read_only_uri(db_path):
+    """
+    sqlite uri that opens db_path read-only (and won't create the file if it's missing)
+    """
+    return Path(os.path.abspath(db_path)).as_uri() + "?mode=ro"
+
+
+class ReadOnlyConnectionPool:
+    """
+    a small pool of read-only sqlite connections
+
+    connections are opened lazily (at most `max_size`) and handed back after use, so
+    readers on different threads never share a connection and never pay the open cost twice.
+    """
+
+    def __init__(self, db_path, max_size=4):
+        """
+        args:
+            db_path (str): path to SQLite db file.
+            max_size (int): most connections open at the same time
+        """
+        self.db_path = db_path
+        self.uri = read_only_uri(db_path)
+        self.max_size = max_size
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._all = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """
+        with pool.connection() as conn: ...
+        """
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def execute(self, sql, params=()):
+        """
+        runs one query on a pooled connection and returns all rows
+        """
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all = []
+        self._idle = queue.LifoQueue()
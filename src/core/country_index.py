@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+
+
+class CountryIndex:
+    """
+    per-country partition of the artists frame, built once per load
+
+    every row that has a country gets a slot in `row_order`, grouped by country and,
+    inside a country, sorted by popularity (highest first, ties in row order, missing
+    popularity last). `offsets[code]:offsets[code + 1]` is that country's slice, so the
+    per-country analyses never scan or mask the whole frame. the genre codes are
+    regrouped by country the same way.
+    """
+
+    # everything the index is made of besides the country and genre names, see arrays()
+    ARRAYS = ('country_codes', 'has_popularity', 'has_followers', 'row_order', 'offsets',
+              'has_genre_rows', 'genre_codes', 'genre_offsets')
+
+    def __init__(self, df, genre_codes):
+        """
+        args:
+            df: compact artists frame from load_artist_frame (country is categorical)
+            genre_codes (GenreCodes): the frame's genres
+        """
+        country = df['country'].cat
+        codes = country.codes.to_numpy().astype(np.int32)
+        # categories are sorted, which is the order get_available_countries wants
+        self.countries = [str(name) for name in country.categories]
+        self.code_of = {name: code for code, name in enumerate(self.countries)}
+        self.country_codes = codes
+        country_count = len(self.countries)
+
+        self.has_popularity = df['spotify_popularity'].notna().to_numpy()
+        self.has_followers = df['spotify_followers'].notna().to_numpy()
+
+        rows = np.flatnonzero(codes >= 0)
+        popularity_key = -df['spotify_popularity'].to_numpy(dtype='float64', na_value=-np.inf)[rows]
+        # last key is the primary one: country, then popularity desc, then row order
+        self.row_order = rows[np.lexsort((rows, popularity_key, codes[rows]))]
+        self.offsets = np.searchsorted(codes[self.row_order], np.arange(country_count + 1))
+
+        # the genre codes of every artist with a country, regrouped by country
+        genre_rows = np.flatnonzero((codes >= 0) & genre_codes.has_genres)
+        self.has_genre_rows = np.bincount(codes[genre_rows], minlength=country_count) > 0
+        self.genres = genre_codes.vocab
+        lengths = (genre_codes.offsets[1:] - genre_codes.offsets[:-1])[genre_rows]
+        row_ends = np.cumsum(lengths)
+        within = np.arange(row_ends[-1] if len(row_ends) else 0) - np.repeat(row_ends - lengths, lengths)
+        flat_codes = genre_codes.codes[np.repeat(genre_codes.offsets[genre_rows], lengths) + within]
+
+        genre_country = np.repeat(codes[genre_rows], lengths)
+        by_country = np.argsort(genre_country, kind='stable')
+        self.genre_codes = flat_codes[by_country]
+        self.genre_offsets = np.searchsorted(genre_country[by_country], np.arange(country_count + 1))
+
+    def arrays(self):
+        """
+        the index's numpy arrays by name (ARRAYS), for saving and from_arrays() later
+        """
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    @classmethod
+    def from_arrays(cls, countries, genres, arrays):
+        """
+        an index from arrays() saved earlier, without recomputing anything. the arrays
+        are used as they are, so they can be read-only (e.g. memory-mapped)
+
+        args:
+            countries (list of str): the frame's country categories, in order
+            genres: the frame's genre vocab (GenreCodes.vocab)
+            arrays (dict): name -> array for every name in ARRAYS
+        """
+        index = cls.__new__(cls)
+        index.countries = list(countries)
+        index.code_of = {name: code for code, name in enumerate(index.countries)}
+        index.genres = genres
+        for name in cls.ARRAYS:
+            setattr(index, name, arrays[name])
+        return index
+
+    def _per_country(self, values, valid):
+        """
+        (sums, counts) of values per country code, over rows with a country where valid
+        """
+        rows = valid & (self.country_codes >= 0)
+        country_count = len(self.countries)
+        # float64 sums are exact up to 2**53, far above any follower total
+        sums = np.bincount(self.country_codes[rows], weights=values[rows], minlength=country_count)
+        counts = np.bincount(self.country_codes[rows], minlength=country_count)
+        return sums, counts
+
+    def _ranked(self, values, counts, name, dtype):
+        present = np.flatnonzero(counts)
+        # countries are in name order already, so a stable sort breaks ties by name
+        present = present[np.argsort(-values[present], kind='stable')]
+        return pd.Series(values[present].astype(dtype), name=name,
+                         index=pd.Index([self.countries[code] for code in present], name='country'))
+
+    def followers_by_country(self, followers):
+        """
+        total followers per country, highest first
+        """
+        sums, counts = self._per_country(followers.to_numpy(dtype='float64', na_value=0), self.has_followers)
+        return self._ranked(sums, counts, 'spotify_followers', 'int64')
+
+    def popularity_by_country(self, popularity):
+        """
+        mean popularity per country, highest first
+        """
+        sums, counts = self._per_country(popularity.to_numpy(dtype='float64', na_value=0), self.has_popularity)
+        means = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+        return self._ranked(means, counts, 'spotify_popularity', 'float64')
+
+    def __contains__(self, country):
+        return country in self.code_of
+
+    def _slice(self, country):
+        code = self.code_of.get(country)
+        if code is None:
+            return None
+        return self.row_order[self.offsets[code]:self.offsets[code + 1]]
+
+    def top_row(self, country):
+        """
+        row position of the country's most popular artist, None if it has none with a popularity
+        """
+        rows = self._slice(country)
+        if rows is None or len(rows) == 0 or not self.has_popularity[rows[0]]:
+            return None
+        return int(rows[0])
+
+    def scatter_rows(self, country):
+        """
+        row positions (in table order) with both followers and popularity, None if there are none
+        """
+        rows = self._slice(country)
+        if rows is None:
+            return None
+        rows = rows[self.has_popularity[rows] & self.has_followers[rows]]
+        return np.sort(rows) if len(rows) else None
+
+    def genre_counts(self, country):
+        """
+        genre -> number of artists, most common first (ties by genre name).
+        None if the country has no artist with a genres value at all
+        """
+        code = self.code_of.get(country)
+        if code is None or not self.has_genre_rows[code]:
+            return None
+        counts = np.bincount(self.genre_codes[self.genre_offsets[code]:self.genre_offsets[code + 1]],
+                             minlength=len(self.genres))
+        present = np.flatnonzero(counts)
+        # genres are in name order already, so a stable sort on the count breaks ties by name
+        present = present[np.argsort(-counts[present], kind='stable')]
+        return pd.Series(counts[present].astype('int64'), name='count',
+                         index=pd.Index(self.genres[present], name='genre', dtype=object))
@@ -1,84 +1,459 @@
+import functools
+import hashlib
+import inspect
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
 import pandas as pd
 import sqlite3
 from .base_manager import BaseManager
+from .metrics import metrics
+from .analyzer_queries import AnalyzerQueries
+from .artist_frame import load_artist_frame, frame_nbytes, DATA_STAMP_SQL
+from .columnar_snapshot import load_snapshot
+from .connection_pool import read_only_uri
+from .country_index import CountryIndex
+from .history_store import HistoryQueries, to_day
+
+logger = logging.getLogger(__name__)
+
+# 'pandas': load the analysis columns once and analyse in memory (the fallback)
+# 'sql': answer every analysis with its own indexed query, nothing loaded up front
+ANALYZER_MODES = ('pandas', 'sql')
+
+
+class _Memo:
+    """
+    LRU of analysis results, bounded by entry count: the arguments can come from outside
+    (e.g. the http service), so a plain dict would grow with every distinct request
+    """
+
+    def __init__(self, max_items):
+        self.max_items = max_items
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            result = self._entries[key]
+            self._entries.move_to_end(key)
+            return result
+
+    def __setitem__(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _memoized(method):
+    """
+    caches a DataAnalyzer method's result by (method, arguments) in the analyzer's LRU until
+    the data changes. callers get the cached object itself, so they must not modify it
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self.check_for_changes()
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        key = (method.__name__,) + tuple(bound.arguments.values())[1:]
+        # grab the dict now: if a reload swaps it mid-call, the stale result goes with the old one
+        memo = self._memo
+        try:
+            result = memo[key]
+            metrics.inc('analyzer_cache_hits_total', method=method.__name__)
+            return result
+        except KeyError:
+            pass
+        with metrics.span('analyzer_query_seconds', method=method.__name__, mode=self.mode):
+            result = method(self, *args, **kwargs)
+        memo[key] = result
+        return result
+
+    return wrapper
 
 
 class DataAnalyzer(BaseManager):
-    def __init__(self, db_path):
+    """
+    the analyses behind the gui
+
+    results are memoized (LRU) per (method, country, n). pandas mode only keeps the columns
+    the analyses read, in compact dtypes (see artist_frame), and a CountryIndex is
+    built at load time, so per-country analyses are slices instead of full-frame masks,
+    and the per-country rollups (follower totals, popularity means) are built once per
+    load, the first time something needs them. all of it is thrown away when the
+    database changes: PRAGMA data_version tells us some connection committed, and
+    MAX(rowid)/MAX(last_changed) tells us whether the artists actually changed (rather
+    than e.g. the ingest journal). if the ingest left an up-to-date columnar snapshot
+    next to the database, pandas mode memory-maps that instead of reading the table.
+    """
+
+    def __init__(self, db_path, mode='pandas', change_check_interval=1.0, snapshot=None,
+                 use_columnar_snapshot=True, memo_items=1024):
+        """
+        args:
+            db_path (str)
+            mode (str): 'pandas' or 'sql'
+            change_check_interval (float): seconds between checks for new data
+            snapshot: pandas mode only, another analyzer's snapshot() to start from instead
+                of reading the table (it's still reloaded from the database if that changes)
+            use_columnar_snapshot (bool): pandas mode only, memory-map the columnar snapshot the
+                ingest writes next to the database (see columnar_snapshot) when it's up to date,
+                instead of reading the table
+            memo_items (int): LRU bound on memoized results
+        """
         super().__init__(db_path)
+        if mode not in ANALYZER_MODES:
+            raise ValueError(f"Unknown analyzer mode '{mode}', expected one of {ANALYZER_MODES}")
+        self.mode = mode
         self.df = None
+        self.genre_codes = None
+        self.country_index = None
+        self.queries = None
+        # pandas mode: looks up the display columns it doesn't keep in memory
+        self._row_queries = None
+        # either mode: the popularity/follower history, opened the first time it's asked for
+        self._history_queries = None
+        self.record_count = 0
+        self.change_check_interval = change_check_interval
+
+        self.memo_items = memo_items
+        self._memo = _Memo(memo_items)
+        self._rollups = {}
+        self._lock = threading.RLock()
+        self._watch_conn = None
+        self._data_version = None
+        self._data_stamp = None
+        self._last_check = 0.0
+        self._snapshot = snapshot
+        self.use_columnar_snapshot = use_columnar_snapshot
         self.load_data()
 
     def load_data(self):
         """
-        loads data from the 'artists' table
+        pandas mode: loads data from the 'artists' table
+        sql mode: only checks the database is usable, falls back to pandas mode if it isn't
         """
+        with self._lock:
+            self._memo = _Memo(self.memo_items)
+            self._rollups = {}
+            self._remember_data_stamp()
+            with metrics.span('analyzer_load_seconds', mode=self.mode):
+                self._load()
+
+    def _load(self):
+        if self.mode == 'sql':
+            try:
+                if self.queries is None:
+                    self.queries = AnalyzerQueries(self.db_path)
+                version = self.queries.schema_version()
+                if version < AnalyzerQueries.MIN_SCHEMA_VERSION:
+                    raise sqlite3.DatabaseError(f"schema version {version} is too old for sql mode "
+                                                f"(run populate_db.py once to migrate)")
+                self.record_count = self.queries.count_artists()
+                logger.info("DataAnalyzer (sql mode) found %d records in the database.", self.record_count)
+                return
+            except Exception as e:
+                logger.warning("Cannot use sql mode, falling back to pandas: %s", e)
+                if self.queries is not None:
+                    self.queries.close()
+                self.queries = None
+                self.mode = 'pandas'
+
         try:
-            conn = sqlite3.connect(self.db_path)
-            self.df = pd.read_sql_query("SELECT * FROM artists", conn)
-            conn.close()
-            print(f"DataAnalyzer loaded {len(self.df)} records from the database.")
+            source = 'the database'
+            mapped = None
+            if self._snapshot is None and self.use_columnar_snapshot:
+                mapped = load_snapshot(self.db_path, self._data_stamp)
+            if self._snapshot is not None:
+                self.df, self.genre_codes, self.country_index = self._snapshot
+                self._snapshot = None
+            elif mapped is not None:
+                # pages are shared with every other process mapping the same snapshot
+                self.df, self.genre_codes, self.country_index = mapped
+                source = 'the columnar snapshot'
+            else:
+                self.df, self.genre_codes = load_artist_frame(self.db_path)
+                self.country_index = CountryIndex(self.df, self.genre_codes)
+            if self._row_queries is None:
+                self._row_queries = AnalyzerQueries(self.db_path, pool_size=1)
+            self.record_count = len(self.df)
+            megabytes = frame_nbytes(self.df, self.genre_codes) / 2**20
+            logger.info("DataAnalyzer loaded %d records from %s (%.1f MB in memory).", len(self.df), source, megabytes)
         except Exception as e:
-            print(f"Error loading data from database: {e}")
+            logger.error("Error loading data from database: %s", e)
             self.df = pd.DataFrame()
+            self.genre_codes = None
+            self.country_index = None
+            self.record_count = 0
+
+    def snapshot(self):
+        """
+        the loaded pandas-mode data, to hand to DataAnalyzer(..., snapshot=...) in another
+        process (inherited as is when the process is forked). None in sql mode
+        """
+        if self.mode != 'pandas' or self.country_index is None:
+            return None
+        return self.df, self.genre_codes, self.country_index
+
+    # --- change detection ---
+
+    def _read_data_stamp(self):
+        """
+        (data_version, (MAX(rowid), MAX(last_changed))) from the watch connection.
+        data_version only changes when *another* connection commits, so the watch
+        connection stays open for the analyzer's lifetime
+        """
+        if self._watch_conn is None:
+            self._watch_conn = sqlite3.connect(read_only_uri(self.db_path), uri=True, check_same_thread=False)
+        data_version = self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+        stamp = self._watch_conn.execute(DATA_STAMP_SQL).fetchone()
+        return data_version, stamp
+
+    def _remember_data_stamp(self):
+        try:
+            self._data_version, self._data_stamp = self._read_data_stamp()
+        except sqlite3.Error:
+            self._data_version = self._data_stamp = None
+        self._last_check = time.monotonic()
+
+    def check_for_changes(self):
+        """
+        drops cached results (and reloads in pandas mode) if the artists table changed.
+        cheap enough to call before every query: at most one PRAGMA per change_check_interval
+        """
+        now = time.monotonic()
+        if now - self._last_check < self.change_check_interval:
+            return
+        with self._lock:
+            self._last_check = now
+            try:
+                if self._watch_conn is None:
+                    self._read_data_stamp()
+                data_version = self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+                if data_version == self._data_version:
+                    return
+                data_version, stamp = self._read_data_stamp()
+            except sqlite3.Error:
+                return
+            self._data_version = data_version
+            if stamp == self._data_stamp:
+                return  # something else in the db changed, the artists didn't
+            logger.info("Artist data changed, reloading analyses.")
+            self.load_data()
+
+    @property
+    def data_version(self):
+        """
+        short token for the data the analyses currently see, changes whenever the artists do.
+        the same data gives the same token across restarts, so it works as a cache key / ETag
+        """
+        self.check_for_changes()
+        return hashlib.sha1(repr(self._data_stamp).encode('utf-8')).hexdigest()[:16]
 
+    def invalidate(self):
+        """
+        forget every cached result and reload
+        """
+        self.load_data()
+
+    # --- pandas mode rollups ---
+
+    def _rollup(self, name):
+        """
+        builds a per-country rollup the first time it's needed after a load
+        """
+        try:
+            return self._rollups[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._rollups:
+                self._rollups[name] = getattr(self, f"_build_{name}")()
+            return self._rollups[name]
+
+    def _build_followers_by_country(self):
+        return self.country_index.followers_by_country(self.df['spotify_followers'])
+
+    def _build_popularity_by_country(self):
+        return self.country_index.popularity_by_country(self.df['spotify_popularity'])
+
+    # --- analyses ---
+
+    def has_data(self):
+        return self.record_count > 0
+
+    @_memoized
     def get_available_countries(self):
-        if self.df.empty: return []
-        # drop missing values just for this calculation
-        return sorted(self.df['country'].dropna().unique())
+        if not self.has_data(): return []
+        if self.queries: return self.queries.available_countries()
+        return list(self.country_index.countries)
 
+    @_memoized
     def get_top_n_countries_by_followers(self, n=15):
-        if self.df.empty: return None
-        # filtering specific to this analysis
-        analysis_df = self.df.dropna(subset=['country', 'spotify_followers'])
-        return analysis_df.groupby('country')['spotify_followers'].sum().sort_values(ascending=False).head(n)
+        if not self.has_data(): return None
+        if self.queries: return self.queries.top_n_countries_by_followers(n)
+        return self._rollup('followers_by_country').head(n)
 
+    @_memoized
     def get_top_n_countries_by_avg_popularity(self, n=15):
-        if self.df.empty: return None
-        analysis_df = self.df.dropna(subset=['country', 'spotify_popularity'])
-        return analysis_df.groupby('country')['spotify_popularity'].mean().sort_values(ascending=False).head(n)
+        if not self.has_data(): return None
+        if self.queries: return self.queries.top_n_countries_by_avg_popularity(n)
+        return self._rollup('popularity_by_country').head(n)
 
+    @_memoized
     def get_genre_distribution_for_country(self, country: str, n=10):
-        if self.df.empty: return None
-        analysis_df = self.df.dropna(subset=['country', 'spotify_genres'])
-        if country not in analysis_df['country'].values: return None
-
-        country_df = analysis_df[analysis_df['country'] == country]
-        genres = country_df['spotify_genres'].str.split(', ').explode()
-        return genres.value_counts().head(n)
+        if not self.has_data(): return None
+        if self.queries: return self.queries.genre_distribution_for_country(country, n)
+        counts = self.country_index.genre_counts(country)
+        return None if counts is None else counts.head(n)
 
+    @_memoized
     def get_popularity_vs_followers(self, country: str):
-        if self.df.empty: return None, None
-        analysis_df = self.df.dropna(subset=['country', 'spotify_followers', 'spotify_popularity'])
-        if country not in analysis_df['country'].values: return None, None
-
-        country_df = analysis_df[analysis_df['country'] == country]
-        return country_df['spotify_followers'], country_df['spotify_popularity']
+        if not self.has_data(): return None, None
+        if self.queries: return self.queries.popularity_vs_followers(country)
+        rows = self.country_index.scatter_rows(country)
+        if rows is None: return None, None
+        return (pd.Series(self.df['spotify_followers'].array[rows].to_numpy(dtype='int64'), name='spotify_followers'),
+                pd.Series(self.df['spotify_popularity'].array[rows].to_numpy(dtype='int64'), name='spotify_popularity'))
 
+    @_memoized
     def get_popularity_distribution(self):
-        if self.df.empty: return None
-        return self.df['spotify_popularity'].dropna()
+        if not self.has_data(): return None
+        if self.queries: return self.queries.popularity_distribution()
+        return self.df['spotify_popularity'].dropna().astype('int64').reset_index(drop=True)
 
-    def get_most_popular_artist_in_country(self, country: str):
-        if self.df.empty:
-            return None
+    @_memoized
+    def get_popularity_histogram(self, bins=30):
+        """
+        (counts, edges) exactly as np.histogram(get_popularity_distribution(), bins) gives them,
+        but from the ~100 distinct popularity values weighted by their counts
+        """
+        if not self.has_data(): return None
+        if self.queries:
+            values, counts = self.queries.popularity_counts()
+        else:
+            counts = np.bincount(self.df['spotify_popularity'].dropna().to_numpy(dtype='int64'))
+            values = np.flatnonzero(counts)
+            counts = counts[values]
+        counts, edges = np.histogram(values, bins=bins, weights=counts)
+        return counts.astype('int64'), edges
 
-        # country and spotify_popularity mustn ot be null
-        required_columns = ['country', 'spotify_popularity']
+    @_memoized
+    def get_popularity_vs_followers_density(self, country: str, follower_bins=60, popularity_bins=50):
+        """
+        the popularity vs followers scatter as a 2D histogram, for countries too big to draw point by point
 
-        # check if they exist
-        if not all(col in self.df.columns for col in required_columns):
-            return None
+        returns:
+            (counts, follower_edges, popularity_edges) with counts[follower_bin, popularity_bin] and
+            log-spaced follower edges, or None. artists with 0 followers are left out, same as on
+            the scatter's log axis
+        """
+        followers, popularity = self.get_popularity_vs_followers(country)
+        if followers is None: return None
+        followers = followers.to_numpy()
+        shown = followers > 0
+        log_followers = np.log10(followers[shown])
+        top = max(np.ceil(log_followers.max()), 1.0) if len(log_followers) else 1.0
+        counts, log_edges, popularity_edges = np.histogram2d(log_followers, popularity.to_numpy()[shown],
+                                                             bins=(follower_bins, popularity_bins),
+                                                             range=((0.0, top), (0.0, 100.0)))
+        return counts.astype('int64'), 10.0 ** log_edges, popularity_edges
 
-        # filter by non-null country and popularity
-        analysis_df = self.df.dropna(subset=required_columns)
-        if country not in analysis_df['country'].values:
+    @_memoized
+    def get_most_popular_artist_in_country(self, country: str):
+        if not self.has_data():
             return None
+        if self.queries:
+            return self.queries.most_popular_artist_in_country(country)
 
-        country_df = analysis_df[analysis_df['country'] == country]
-        if country_df.empty:
+        most_popular_row = self.country_index.top_row(country)
+        if most_popular_row is None:
             return None
+        return self._row_queries.artist_by_rowid(self.df['rowid'].iat[most_popular_row])
+
+    # --- history ---
+
+    def _history(self):
+        """
+        the HistoryQueries, None if the database predates the history tables
+        """
+        with self._lock:
+            if self._history_queries is None:
+                queries = HistoryQueries(self.db_path)
+                try:
+                    version = queries.schema_version()
+                except sqlite3.Error as e:
+                    logger.error("Error reading the history: %s", e)
+                    queries.close()
+                    return None
+                if version < HistoryQueries.MIN_SCHEMA_VERSION:
+                    logger.warning("No history in schema version %d (run populate_db.py once to migrate).", version)
+                    queries.close()
+                    return None
+                self._history_queries = queries
+            return self._history_queries
+
+    def get_artist_history(self, artist_ids, start=None, end=None, period='day'):
+        """
+        popularity and follower series of one or more artists, in one query
+
+        args:
+            artist_ids (str or iterable of str)
+            start, end (date, datetime or iso string): inclusive. no start = from each
+                artist's first observation, no end = up to today
+            period (str): 'day' or 'week', one point per period with the values as they
+                stood at its end
+
+        returns:
+            DataFrame of artist_id, date, popularity, followers (see
+            HistoryQueries.artist_series), or None without history
+        """
+        if isinstance(artist_ids, str):
+            artist_ids = (artist_ids,)
+        return self._artist_history(tuple(sorted(set(artist_ids))), to_day(start),
+                                    to_day(end or datetime.now()), period)
+
+    @_memoized
+    def _artist_history(self, artist_ids, start_day, end_day, period):
+        history = self._history()
+        if history is None: return None
+        return history.artist_series(artist_ids, start_day, end_day, period)
 
-        most_popular_idx = country_df['spotify_popularity'].idxmax()
-        return self.df.loc[most_popular_idx].to_dict()
+    def get_country_history(self, countries, start=None, end=None, period='day'):
+        """
+        per-country artist count, average popularity and total followers over time, from
+        the daily / weekly rollups
+
+        args:
+            countries (str or iterable of str)
+            start, end, period: same as get_artist_history
+
+        returns:
+            DataFrame of country, date, artists, avg_popularity, total_followers (see
+            HistoryQueries.country_series), or None without history
+        """
+        if isinstance(countries, str):
+            countries = (countries,)
+        return self._country_history(tuple(sorted(set(countries))), to_day(start),
+                                     to_day(end or datetime.now()), period)
 
+    @_memoized
+    def _country_history(self, countries, start_day, end_day, period):
+        history = self._history()
+        if history is None: return None
+        return history.country_series(countries, start_day, end_day, period)
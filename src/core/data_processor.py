@@ -1,9 +1,70 @@
-import pandas as pd
+import logging
+import os
+import queue
+import threading
 import time
 from datetime import datetime
+from itertools import islice
 
-from .api_handler import APIHandler
-from .db_manager import DatabaseManager
+from .api_handler import APIHandler, ARTISTS_BATCH_LIMIT
+from .artist_source import ArtistSeedReader
+from .db_manager import DatabaseManager, WriteCounts
+from .ingest_journal import OK, FAILED, FINISHED, INTERRUPTED
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# tells a worker / the writer that there is nothing more coming
+_DONE = object()
+
+
+class IngestProgress:
+    """
+    thread-safe counters for one ingestion run
+    """
+
+    def __init__(self, total=None):
+        """
+        args:
+            total (int): number of artists, None when streaming and it isn't known up front
+        """
+        self.total = total
+        self.processed = 0
+        self.stored = 0
+        self.inserted = 0
+        self.changed = 0
+        self.unchanged = 0
+        self.missing = 0
+        self.errors = 0
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, processed=0, missing=0, errors=0, written=WriteCounts()):
+        """
+        args:
+            written (WriteCounts): what the database did with the stored artists
+        """
+        with self._lock:
+            self.processed += processed
+            self.stored += written.stored
+            self.inserted += written.inserted
+            self.changed += written.changed
+            self.unchanged += written.unchanged
+            self.missing += missing
+            self.errors += errors
+
+    def rate(self):
+        """artists per second since the start"""
+        elapsed = time.monotonic() - self.started_at
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        with self._lock:
+            done = f"{self.processed}/{self.total}" if self.total is not None else f"{self.processed}"
+            return (f"Progress: {done} artists processed | "
+                    f"{self.rate():.1f} artists/sec | stored {self.stored} (new {self.inserted}, "
+                    f"changed {self.changed}, unchanged {self.unchanged}), "
+                    f"missing {self.missing}, errors {self.errors}")
 
 
 class DataProcessor:
@@ -14,72 +75,245 @@ class DataProcessor:
     with live data from Spotify, and then uses the DatabaseManager to store
     the results in a SQLite database.
 
+    fetching runs on a pool of worker threads that all go through the api handler's
+    rate limiter. results go through a bounded queue to one writer thread, which is
+    the only thing that touches the database.
+
     attributes:
         api_handler (APIHandler)
         db_manager (DatabaseManager)
+        workers (int): number of fetch threads
+        queue_size (int): max finished batches waiting for the writer
+        progress_interval (float): seconds between progress reports
     """
 
-    def __init__(self, api_handler: APIHandler, db_manager: DatabaseManager):
+    def __init__(self, api_handler: APIHandler, db_manager: DatabaseManager,
+                 workers=4, queue_size=16, progress_interval=5.0):
         """
         attributes:
             api_handler (APIHandler)
             db_manager (DatabaseManager)
+            workers (int)
+            queue_size (int)
+            progress_interval (float)
         """
         self.api_handler = api_handler
         self.db_manager = db_manager
+        self.workers = workers
+        self.queue_size = queue_size
+        self.progress_interval = progress_interval
 
-    def process_and_store_artists(self, csv_filepath):
+    @staticmethod
+    def build_record(row, details):
         """
-        main method for data processing
+        merges a csv seed (ArtistSeed) with the api details into a row for the artists table
+        """
+        # copy, the same id can be in the csv twice
+        record = dict(details)
 
-        reads the CVS file row by row, fetches data from the API, and stores it in the database.
+        # if spotify doesnt have the genre use the cvs one
+        if not record['spotify_genres']:
+            record['spotify_genres'] = row.artist_genre
 
-        this should be run by a thread
+        image_url = None
+        if record.get('images'):
+            # index 1 images = medium size (about 300x300)
+            image_index = 1 if len(record['images']) > 1 else 0
+            image_url = record['images'][image_index]['url']
 
-        args:
-            csv_filepath (str)
+        record.update({
+            'artist_id': row.artist_id,
+            'country': row.country,
+            'last_checked': datetime.now().isoformat(),
+            'image_url': image_url,
+            'spotify_url': record['external_urls'].get('spotify') if record.get('external_urls') else None
+        })
+        record.pop('images', None)
+        record.pop('external_urls', None)
+        return record
+
+    def _fetch_batch(self, batch):
         """
-        print("Starting the data processing pipeline...")
-        try:
-            # read the artist data from the CSV file (pandas)
-            df = pd.read_csv(csv_filepath)
-            print(f"Successfully loaded {len(df)} artists from {csv_filepath}.")
-        except FileNotFoundError:
-            print(f"Error: The file {csv_filepath} was not found.")
-            return  # stop if the file doesn't exist
+        one api round trip for up to 50 csv rows. returns (records, missing_rows)
+        """
+        details_by_id, _ = self.api_handler.get_artists_details(row.artist_id for row in batch)
+        records = []
+        missing_rows = []
+        for row in batch:
+            details = details_by_id.get(row.artist_id)
+            if details:
+                records.append(self.build_record(row, details))
+            else:
+                missing_rows.append(row)
+        return records, missing_rows
 
-        # loop through rows
-        for index, row in df.iterrows():
-            artist_id = row['artist_id']
-            artist_name_from_csv = row['artist_name']
-            country = row['country']
-            # if spotify doesnt have the genre use the cvs one
-            genre_from_csv = row['artist_genre']
+    def _fetch_worker(self, work_queue, results_queue):
+        while True:
+            batch = work_queue.get()
+            if batch is _DONE:
+                return
+            try:
+                records, missing_rows = self._fetch_batch(batch)
+                results_queue.put((batch, records, missing_rows, None))
+            except Exception as e:
+                results_queue.put((batch, [], [], e))
 
-            print(f"\nProcessing artist {index + 1}/{len(df)}: {artist_name_from_csv} ({artist_id})")
+    def _writer(self, results_queue, progress, journal=None, run_id=None):
+        """
+        the single database writer (artists and journal). stops on _DONE
+        """
+        while True:
+            item = results_queue.get()
+            if item is _DONE:
+                return
+            batch, records, missing_rows, error = item
 
-            details = self.api_handler.get_artist_details(artist_id)
+            if error is not None:
+                logger.error("An unexpected error occurred for a batch of %d artists: %s", len(batch), error)
+                progress.add(processed=len(batch), errors=len(batch))
+                metrics.inc('ingest_batches_total', status='failed')
+                metrics.inc('ingest_artists_total', len(batch), status='error')
+                self._journal(journal, run_id, [row.artist_id for row in batch], FAILED, str(error))
+                continue
 
-            if details:
+            for row in missing_rows:
+                logger.warning("Skipping database entry for %s due to API error.", row.artist_name)
+            self._journal(journal, run_id, [row.artist_id for row in missing_rows], FAILED, "not found on spotify")
 
-                details['artist_id'] = artist_id
-                details['country'] = country
-                details['last_updated'] = datetime.now().isoformat()
+            # one transaction for the whole batch
+            written = self.db_manager.add_artists(records)
+            rejected = set(written.rejected)
+            self._journal(journal, run_id, [record['artist_id'] for record in records
+                                            if record['artist_id'] not in rejected], OK)
+            self._journal(journal, run_id, written.rejected, FAILED, "database write failed")
+            stored = written.stored
+            progress.add(processed=len(batch), missing=len(missing_rows), errors=len(records) - stored,
+                         written=written)
+            metrics.inc('ingest_batches_total', status='ok')
+            metrics.inc('ingest_artists_total', stored, status='stored')
+            metrics.inc('ingest_artists_total', len(missing_rows), status='missing')
+            metrics.inc('ingest_artists_total', len(records) - stored, status='error')
 
-                # spotify returns a list of images. take index one (about 300x300)
-                # first, check if the list is empty
-                if details.get('images') and len(details['images']) > 1:
-                    details['image_url'] = details['images'][1]['url']
-                else:
-                    details['image_url'] = None # no image available
+    @staticmethod
+    def _journal(journal, run_id, artist_ids, status, reason=None):
+        if journal is None:
+            return
+        for artist_id in artist_ids:
+            journal.record(run_id, artist_id, status, reason)
 
-                details.pop('images', None)
+    def _reporter(self, progress, stop_event):
+        while not stop_event.wait(self.progress_interval):
+            logger.info(progress.summary())
+            metrics.set_gauge('ingest_artists_per_second', progress.rate())
+
+    def process_and_store_artists(self, csv_filepath, workers=None, planner=None,
+                                  journal=None, run_id=None, only_ids=None):
+        """
+        main method for data processing
+
+        streams the CVS file, fetches data from the API in batches of 50 on `workers` threads,
+        and stores it in the database from a single writer thread.
+
+        args:
+            csv_filepath (str)
+            workers (int): overrides self.workers for this run
+            planner (RefreshPlanner): if given, only the new/stale artists it picks are fetched
+            journal (IngestJournal): if given, every artist's outcome is recorded in the run journal
+            run_id (int): continue this journal run instead of starting a new one
+            only_ids (set): restrict the run to these artist ids (resume / retry), skips the planner
 
+        returns:
+            IngestProgress with the final counts, None if the csv couldn't be read
+        """
+        workers = max(1, workers or self.workers)
+        logger.info("Starting the data processing pipeline...")
+        if not os.path.exists(csv_filepath):
+            logger.error("The file %s was not found.", csv_filepath)
+            return None  # stop if the file doesn't exist
 
-                self.db_manager.add_artist(details)
+        # rows are read lazily, the fetch stage pulls them as fast as it can use them
+        reader = ArtistSeedReader(csv_filepath)
+        try:
+            reader.check()
+        except ValueError as e:
+            logger.error("%s", e)
+            return None
+        seeds = iter(reader)
+        total = None
+        if only_ids is not None:
+            wanted = set(only_ids)
+            seeds = (seed for seed in seeds if seed.artist_id in wanted)
+            logger.info("Restricted to the %d artists of run %s.", len(wanted), run_id)
+        elif planner is not None:
+            # the planner has to see everything to sort by staleness, but it only keeps the work
+            seeds = planner.plan(seeds)
+            total = len(seeds)
+            logger.info(reader.summary())
+            logger.info(planner.summary())
+        progress = IngestProgress(total=total)
 
-                time.sleep(0.1)
+        if journal is not None:
+            if run_id is None:
+                if planner is not None:
+                    run_id = journal.start_run(seed.artist_id for seed in seeds)
+                else:
+                    # separate pass over the file so every id is pending before anything is fetched
+                    run_id = journal.start_run(seed.artist_id for seed in ArtistSeedReader(csv_filepath))
             else:
-                print(f"Skipping database entry for {artist_name_from_csv} due to API error.")
+                journal.reopen_run(run_id)
+            logger.info("Journaling to ingest run %d.", run_id)
+
+        work_queue = queue.Queue(maxsize=workers * 2)
+        results_queue = queue.Queue(maxsize=self.queue_size)
+        stop_reporting = threading.Event()
+
+        fetchers = [threading.Thread(target=self._fetch_worker, args=(work_queue, results_queue),
+                                     name=f"fetch-{i}", daemon=True) for i in range(workers)]
+        writer = threading.Thread(target=self._writer, args=(results_queue, progress, journal, run_id),
+                                  name="db-writer", daemon=True)
+        reporter = threading.Thread(target=self._reporter, args=(progress, stop_reporting), name="progress", daemon=True)
+
+        for thread in fetchers + [writer, reporter]:
+            thread.start()
+        logger.info("Fetching with %d worker(s)...", workers)
+
+        interrupted = False
+        try:
+            # fetch in batches so one request covers up to 50 artists
+            seeds = iter(seeds)
+            while True:
+                batch = list(islice(seeds, ARTISTS_BATCH_LIMIT))
+                if not batch:
+                    break
+                work_queue.put(batch)
+        except KeyboardInterrupt:
+            # drop what hasn't started, let the batches in flight finish so the journal is accurate
+            interrupted = True
+            logger.warning("Interrupted. Finishing the batches already in flight (Ctrl-C again to abort)...")
+            while True:
+                try:
+                    work_queue.get_nowait()
+                except queue.Empty:
+                    break
+
+        for _ in fetchers:
+            work_queue.put(_DONE)
+        for thread in fetchers:
+            thread.join()
+
+        results_queue.put(_DONE)
+        writer.join()
+        stop_reporting.set()
+        reporter.join()
+
+        if journal is not None:
+            journal.finish_run(run_id, INTERRUPTED if interrupted else FINISHED)
+            logger.info("Ingest run %d: %s", run_id, journal.counts(run_id))
 
-        print("\n--- Data processing pipeline finished! ---")
\ No newline at end of file
+        if planner is None:
+            logger.info(reader.summary())
+        logger.info(progress.summary())
+        metrics.set_gauge('ingest_artists_per_second', progress.rate())
+        logger.info("API stats: %s", self.api_handler.stats)
+        logger.info("--- Data processing pipeline finished! ---")
+        return progress
@@ -1,7 +1,163 @@
 # src/core/db_manager.py (More Robust Version)
 
+import logging
 import sqlite3
+import time
+from datetime import datetime
 from sqlite3 import Error
+from typing import NamedTuple
+
+from .connection_pool import id_chunks
+from .history_store import create_history, record_changes, to_ts
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# set on every connection. WAL + synchronous=NORMAL only fsyncs at checkpoints instead
+# of on every commit, and is still crash-safe (a power cut can lose the last commits, not corrupt the db)
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",  # negative = KiB, so 64 MB
+    "PRAGMA temp_store=MEMORY",
+)
+
+# the columns that hold spotify's data. a write where none of them differ from the stored row
+# only moves last_checked
+DATA_COLUMNS = ('artist_name', 'country', 'spotify_popularity', 'spotify_followers', 'spotify_genres', 'image_url')
+
+# updates in place (no delete + reinsert, so the rowid and every untouched index entry stay put),
+# and only when the data actually differs. last_checked = when spotify was asked,
+# last_changed = when this database last saw the data change
+UPSERT_ARTIST_SQL = f''' INSERT INTO artists(artist_id, {', '.join(DATA_COLUMNS)}, last_checked, last_changed)
+                  VALUES(:artist_id, {', '.join(':' + column for column in DATA_COLUMNS)}, :last_checked, :last_changed)
+                  ON CONFLICT(artist_id) DO UPDATE SET
+                      {', '.join(f'{column} = excluded.{column}' for column in DATA_COLUMNS)},
+                      last_checked = excluded.last_checked, last_changed = excluded.last_changed
+                  WHERE {' OR '.join(f'{column} IS NOT excluded.{column}' for column in DATA_COLUMNS)} '''
+
+# for the unchanged rows: an unindexed column, so just the row itself is rewritten
+TOUCH_ARTIST_SQL = "UPDATE artists SET last_checked = :last_checked WHERE artist_id = :artist_id AND last_checked IS NOT :last_checked"
+
+SELECT_STORED_SQL = f"SELECT artist_id, {', '.join(DATA_COLUMNS)} FROM artists WHERE artist_id IN ({{}})"
+
+
+# artist_genres rows for one artist. replaced wholesale on every write of the artist
+DELETE_GENRES_SQL = "DELETE FROM artist_genres WHERE artist_id = ?"
+INSERT_GENRE_SQL = "INSERT OR IGNORE INTO artist_genres(artist_id, genre) VALUES (?, ?)"
+
+
+def split_genres(spotify_genres):
+    """
+    the comma-joined spotify_genres string as a list of distinct genres
+    """
+    if not spotify_genres:
+        return []
+    return list(dict.fromkeys(genre.strip() for genre in spotify_genres.split(',') if genre.strip()))
+
+
+def _backfill_artist_genres(conn):
+    rows = conn.execute("SELECT artist_id, spotify_genres FROM artists")
+    conn.executemany(INSERT_GENRE_SQL, ((artist_id, genre)
+                                        for artist_id, spotify_genres in rows
+                                        for genre in split_genres(spotify_genres)))
+
+
+def _migration_3(conn):
+    for sql in (
+        """
+        CREATE TABLE IF NOT EXISTS artist_genres (
+            artist_id TEXT NOT NULL,
+            genre TEXT NOT NULL,
+            PRIMARY KEY (artist_id, genre)
+        ) WITHOUT ROWID;
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_artist_genres_genre ON artist_genres(genre, artist_id)",
+        "CREATE INDEX IF NOT EXISTS idx_artists_country ON artists(country)",
+        "CREATE INDEX IF NOT EXISTS idx_artists_popularity ON artists(spotify_popularity)",
+        "CREATE INDEX IF NOT EXISTS idx_artists_followers ON artists(spotify_followers)",
+    ):
+        conn.execute(sql)
+    conn.execute("DELETE FROM artist_genres")
+    _backfill_artist_genres(conn)
+
+
+def _migration_6(conn):
+    create_history(conn, to_ts(datetime.now()))
+
+
+# (version, list of sql statements or a function taking the connection), in order.
+# never edit one that has shipped, add a new one instead
+MIGRATIONS = [
+    # 1: the original table
+    (1, ["""
+        CREATE TABLE IF NOT EXISTS artists (
+            artist_id TEXT PRIMARY KEY,
+            artist_name TEXT NOT NULL,
+            country TEXT,
+            spotify_popularity INTEGER,
+            spotify_followers INTEGER,
+            spotify_genres TEXT,
+            image_url TEXT,
+            last_updated TEXT NOT NULL
+        );
+        """]),
+    # 2: run journal for populate_db.py (see ingest_journal.py)
+    (2, ["""
+        CREATE TABLE IF NOT EXISTS ingest_runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TEXT NOT NULL,
+            finished_at TEXT,
+            status TEXT NOT NULL
+        );
+        """, """
+        CREATE TABLE IF NOT EXISTS ingest_items (
+            run_id INTEGER NOT NULL REFERENCES ingest_runs(run_id),
+            artist_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            reason TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT,
+            PRIMARY KEY (run_id, artist_id)
+        );
+        """]),
+    # 3: normalized genres and indexes for the country/genre/popularity queries
+    (3, _migration_3),
+    # 4: lets readers spot new data with MAX(last_updated) without a table scan
+    (4, ["CREATE INDEX IF NOT EXISTS idx_artists_last_updated ON artists(last_updated)"]),
+    # 5: change-aware upserts. last_updated becomes last_changed (only moves when the data does,
+    # so readers' MAX() stamp ignores no-op refreshes), last_checked is when spotify was last asked
+    (5, [
+        "ALTER TABLE artists RENAME COLUMN last_updated TO last_changed",
+        "ALTER TABLE artists ADD COLUMN last_checked TEXT",
+        "UPDATE artists SET last_checked = last_changed",
+        "DROP INDEX IF EXISTS idx_artists_last_updated",
+        "CREATE INDEX IF NOT EXISTS idx_artists_last_changed ON artists(last_changed)",
+    ]),
+    # 6: popularity/follower history and its country rollups (see history_store.py)
+    (6, _migration_6),
+]
+
+
+class WriteCounts(NamedTuple):
+    """
+    what add_artists did with the rows it was given. rejected rows aren't in any of the
+    counts, their ids are in `rejected`
+    """
+    inserted: int = 0
+    changed: int = 0
+    unchanged: int = 0
+    rejected: tuple = ()
+
+    @property
+    def stored(self):
+        """rows that are now in the database as given"""
+        return self.inserted + self.changed + self.unchanged
+
+    def __add__(self, other):
+        # the counts add up, the rejected ids get concatenated
+        return WriteCounts(*(mine + theirs for mine, theirs in zip(self, other)))
+
 
 class DatabaseManager:
     """
@@ -16,59 +172,220 @@ class DatabaseManager:
         try:
             # connect
             self.conn = sqlite3.connect(db_file, check_same_thread=False)
-            print(f"Successfully connected to database: {db_file}")
+            self._configure_connection()
+            logger.info("Successfully connected to database: %s", db_file)
             # create table
             self.create_table()
         except Error as e:
-            print(f"Error connecting to database: {e}")
+            logger.error("Error connecting to database: %s", e)
             self.conn = None
 
+    def _configure_connection(self):
+        """
+        applies CONNECTION_PRAGMAS
+        """
+        cursor = self.conn.cursor()
+        for pragma in CONNECTION_PRAGMAS:
+            cursor.execute(pragma)
+
     def is_connected(self):
         """a method to check if the db is connected or not"""
         return self.conn is not None
 
     def create_table(self):
         """
-        cretae table if it doesnt exist
+        brings the schema up to date by running every migration newer than the
+        database's PRAGMA user_version (see MIGRATIONS). each migration runs in its own
+        transaction together with the version bump, so a failed one leaves nothing behind
         """
         if not self.is_connected():
-            print("Cannot create table: No database connection.")
+            logger.error("Cannot create table: No database connection.")
             return
 
-        create_table_sql = """
-        CREATE TABLE IF NOT EXISTS artists (
-            artist_id TEXT PRIMARY KEY,
-            artist_name TEXT NOT NULL,
-            country TEXT,
-            spotify_popularity INTEGER,
-            spotify_followers INTEGER,
-            spotify_genres TEXT,
-            image_url TEXT,
-            last_updated TEXT NOT NULL
-        );
+        try:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            for target_version, migration in MIGRATIONS:
+                if target_version <= version:
+                    continue
+                self.conn.execute("BEGIN")
+                try:
+                    if callable(migration):
+                        migration(self.conn)
+                    else:
+                        for sql in migration:
+                            self.conn.execute(sql)
+                    # pragmas can't take bound parameters
+                    self.conn.execute(f"PRAGMA user_version = {int(target_version)}")
+                    self.conn.commit()
+                except Error:
+                    self.conn.rollback()
+                    raise
+                version = target_version
+                logger.info("Applied database migration %d.", target_version)
+            logger.info("Table 'artists' is ready (schema version %d).", version)
+        except Error as e:
+            logger.error("Error creating table: %s", e)
+
+    def get_last_checked(self):
+        """
+        every stored artist id with the time spotify was last asked about it, in one query
+
+        returns:
+            dict of artist_id -> last_checked (iso string)
         """
+        if not self.is_connected():
+            logger.error("Cannot read timestamps: No database connection.")
+            return {}
 
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(create_table_sql)
-            self.conn.commit()
-            print("Table 'artists' is ready.")
+            return dict(self.conn.execute("SELECT artist_id, last_checked FROM artists"))
         except Error as e:
-            print(f"Error creating table: {e}")
+            logger.error("Error reading artist timestamps: %s", e)
+            return {}
 
     def add_artist(self, artist_details: dict):
         """
         insert artist's data
         """
+        self.add_artists([artist_details])
+
+    def add_artists(self, artists, batch_size=1000, now=None):
+        """
+        insert or update many artists, `batch_size` rows per transaction. rows whose data
+        matches what is stored only get their last_checked moved
+
+        args:
+            artists (iterable of dict): same keys as add_artist, `last_checked` being when
+                the data was fetched
+            batch_size (int)
+            now (datetime): when the write happens (last_changed, the history's timestamp),
+                defaults to datetime.now() per batch. for importing older data in time order
+
+        returns:
+            WriteCounts
+        """
         if not self.is_connected():
-            print("Cannot add artist: No database connection.")
-            return
+            logger.error("Cannot add artists: No database connection.")
+            return WriteCounts(rejected=tuple(artist.get('artist_id') for artist in artists))
+
+        counts = WriteCounts()
+        batch = []
+        for artist_details in artists:
+            batch.append(artist_details)
+            if len(batch) >= batch_size:
+                counts += self._write_batch(batch, now)
+                batch = []
+        if batch:
+            counts += self._write_batch(batch, now)
+        return counts
+
+    def _stored_data(self, artist_ids):
+        """
+        artist_id -> tuple of DATA_COLUMNS for the ids that are already stored
+        """
+        stored = {}
+        for chunk in id_chunks(artist_ids):
+            sql = SELECT_STORED_SQL.format(', '.join('?' * len(chunk)))
+            for artist_id, *data in self.conn.execute(sql, chunk):
+                stored[artist_id] = tuple(data)
+        return stored
 
-        sql = ''' INSERT OR REPLACE INTO artists(artist_id, artist_name, country, spotify_popularity, spotify_followers, spotify_genres, image_url, last_updated)
-                  VALUES(:artist_id, :artist_name, :country, :spotify_popularity, :spotify_followers, :spotify_genres, :image_url, :last_updated) '''
+    def _classify(self, batch, changed_at):
+        """
+        splits a batch into (rows to upsert, rows to touch, WriteCounts, history changes).
+        rows to upsert are copies carrying last_changed, the changes are (artist_id, previous
+        data or None, new data) for history_store. the same id twice in a batch is compared
+        against the earlier row, like the database would see it
+        """
+        stored = self._stored_data(list({artist.get('artist_id') for artist in batch}))
+        upserts, touches, changes = [], [], []
+        inserted = changed = 0
+        for artist in batch:
+            data = tuple(artist.get(column) for column in DATA_COLUMNS)
+            previous = stored.get(artist.get('artist_id'))
+            stored[artist.get('artist_id')] = data
+            if previous == data:
+                touches.append(artist)
+                continue
+            if previous is None:
+                inserted += 1
+            else:
+                changed += 1
+            upserts.append(dict(artist, last_changed=changed_at))
+            changes.append((artist.get('artist_id'), None if previous is None else dict(zip(DATA_COLUMNS, previous)),
+                            dict(zip(DATA_COLUMNS, data))))
+        return upserts, touches, WriteCounts(inserted, changed, len(touches)), changes
+
+    def _write_classified(self, upserts, touches, changes, changed_at):
+        self.conn.executemany(UPSERT_ARTIST_SQL, upserts)
+        self.conn.executemany(TOUCH_ARTIST_SQL, touches)
+        self._write_genres(upserts)
+        record_changes(self.conn, changes, to_ts(changed_at))
+
+    def _write_batch(self, batch, now=None):
+        """
+        one transaction: the new and changed rows through the upsert (and their genres and
+        history), last_checked for the rest. if something in the batch is broken, redo it row by row
+        (still one transaction) so only the bad rows get dropped
+        """
+        # one write time per batch, so last_changed (the readers' stamp) only ever grows
+        # while the writer commits batches in order, whatever order they were fetched in
+        changed_at = (now or datetime.now()).isoformat()
+        started = time.perf_counter()
+        try:
+            with self.conn:
+                upserts, touches, counts, changes = self._classify(batch, changed_at)
+                self._write_classified(upserts, touches, changes, changed_at)
+                # the with block commits on the way out
+                commit_started = time.perf_counter()
+            self._record_write(counts, started, commit_started)
+            return counts
+        except Error:
+            pass
+
+        counts = WriteCounts()
+        started = time.perf_counter()
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(sql, artist_details)
-            self.conn.commit()
+            with self.conn:
+                for artist_details in batch:
+                    try:
+                        upserts, touches, row_counts, changes = self._classify([artist_details], changed_at)
+                        self._write_classified(upserts, touches, changes, changed_at)
+                        counts += row_counts
+                    except Error as e:
+                        logger.error("Error adding artist '%s' to database: %s", artist_details.get('artist_name'), e)
+                        counts += WriteCounts(rejected=(artist_details.get('artist_id'),))
+                commit_started = time.perf_counter()
         except Error as e:
-            print(f"Error adding artist '{artist_details['artist_name']}' to database: {e}")
\ No newline at end of file
+            logger.error("Error committing a batch of %d artists: %s", len(batch), e)
+            metrics.inc('db_rows_rejected_total', len(batch))
+            return WriteCounts(rejected=tuple(artist.get('artist_id') for artist in batch))
+        self._record_write(counts, started, commit_started)
+        metrics.inc('db_rows_rejected_total', len(batch) - counts.stored)
+        return counts
+
+    @staticmethod
+    def _record_write(counts, started, commit_started):
+        """
+        batch/commit timings and row throughput of one committed write, for the metrics
+        """
+        if not metrics.enabled:
+            return
+        finished = time.perf_counter()
+        metrics.observe('db_write_batch_seconds', finished - started)
+        metrics.observe('db_commit_seconds', finished - commit_started)
+        metrics.inc('db_rows_written_total', counts.inserted, outcome='inserted')
+        metrics.inc('db_rows_written_total', counts.changed, outcome='changed')
+        metrics.inc('db_rows_written_total', counts.unchanged, outcome='unchanged')
+        if finished > started:
+            metrics.set_gauge('db_write_rows_per_second', counts.stored / (finished - started))
+
+    def _write_genres(self, batch):
+        """
+        keeps artist_genres in step with spotify_genres for the rows written. runs inside the
+        caller's transaction
+        """
+        self.conn.executemany(DELETE_GENRES_SQL, [(artist['artist_id'],) for artist in batch])
+        self.conn.executemany(INSERT_GENRE_SQL, [(artist['artist_id'], genre)
+                                                 for artist in batch
+                                                 for genre in split_genres(artist.get('spotify_genres'))])
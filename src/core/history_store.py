@@ -0,0 +1,357 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .connection_pool import ReadOnlyConnectionPool, id_chunks
+
+EPOCH = datetime(1970, 1, 1)
+DAY_SECONDS = 24 * 60 * 60
+# 'day' and 'week' (monday to sunday) rollups are kept for the countries
+PERIODS = ('day', 'week')
+ROLLUP_FIELDS = ('artists', 'popularity_sum', 'popularity_count', 'followers_sum', 'followers_count')
+
+# one row per artist per write that changed its popularity or followers. the values are deltas
+# against the artist's previous observation (the first one against 0), NULL meaning "no change",
+# so the value at any time is the running SUM up to it. clustered by (artist_id, ts): an
+# artist's whole series is one contiguous range of the table
+CREATE_ARTIST_HISTORY_SQL = """
+    CREATE TABLE IF NOT EXISTS artist_history (
+        artist_id TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        popularity_delta INTEGER,
+        followers_delta INTEGER,
+        PRIMARY KEY (artist_id, ts)
+    ) WITHOUT ROWID;
+    """
+
+# per country and period, the totals over its artists as they stood at the end of the period
+# (same rules as the current-data analyses: unknown values don't count). a row only exists for
+# periods something changed in, readers carry the last one forward
+CREATE_COUNTRY_HISTORY_SQL = """
+    CREATE TABLE IF NOT EXISTS country_history (
+        period TEXT NOT NULL,
+        country TEXT NOT NULL,
+        start INTEGER NOT NULL,
+        artists INTEGER NOT NULL,
+        popularity_sum INTEGER NOT NULL,
+        popularity_count INTEGER NOT NULL,
+        followers_sum INTEGER NOT NULL,
+        followers_count INTEGER NOT NULL,
+        PRIMARY KEY (period, country, start)
+    ) WITHOUT ROWID;
+    """
+
+# the same artist twice in one second: both changes end up in one row
+INSERT_HISTORY_SQL = """
+    INSERT INTO artist_history(artist_id, ts, popularity_delta, followers_delta) VALUES (?, ?, ?, ?)
+    ON CONFLICT(artist_id, ts) DO UPDATE SET
+        popularity_delta = COALESCE(popularity_delta + excluded.popularity_delta,
+                                    popularity_delta, excluded.popularity_delta),
+        followers_delta = COALESCE(followers_delta + excluded.followers_delta,
+                                   followers_delta, excluded.followers_delta)
+    """
+
+LATEST_ROLLUP_SQL = f"""
+    SELECT {', '.join(ROLLUP_FIELDS)} FROM country_history
+    WHERE period = ? AND country = ? AND start <= ?
+    ORDER BY start DESC LIMIT 1
+    """
+
+UPSERT_ROLLUP_SQL = f"""
+    INSERT INTO country_history(period, country, start, {', '.join(ROLLUP_FIELDS)})
+    VALUES (?, ?, ?, {', '.join('?' * len(ROLLUP_FIELDS))})
+    ON CONFLICT(period, country, start) DO UPDATE SET
+        {', '.join(f'{field} = excluded.{field}' for field in ROLLUP_FIELDS)}
+    """
+
+
+def to_ts(timestamp):
+    """
+    seconds since 1970-01-01 of a datetime or iso string, on the same naive local clock as
+    every other timestamp in the database
+    """
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return int((timestamp - EPOCH).total_seconds())
+
+
+def to_day(value):
+    """
+    days since 1970-01-01 of a date, datetime or iso string. None stays None
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    return to_ts(value) // DAY_SECONDS
+
+
+def period_start(days, period):
+    """
+    first day of the day/week containing `days` (an int or an int array of day numbers)
+    """
+    if period == 'week':
+        # 1970-01-01 was a thursday
+        return days - (days + 3) % 7
+    return days
+
+
+def _check_period(period):
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period '{period}', expected one of {PERIODS}")
+
+
+# --- writing, inside the DatabaseManager's transaction ---
+
+def _delta(new, previous):
+    if new is None or new == previous:
+        return None
+    return new - (previous or 0)
+
+
+def _contribution(data):
+    popularity, followers = data['spotify_popularity'], data['spotify_followers']
+    return (1, popularity or 0, int(popularity is not None), followers or 0, int(followers is not None))
+
+
+def _history_totals(conn, artist_ids):
+    """
+    artist_id -> (popularity, followers) their history adds up to, for ids whose stored
+    value went missing since
+    """
+    totals = {}
+    for chunk in id_chunks(artist_ids):
+        rows = conn.execute(f"""
+            SELECT artist_id, SUM(popularity_delta), SUM(followers_delta) FROM artist_history
+            WHERE artist_id IN ({', '.join('?' * len(chunk))}) GROUP BY artist_id""", chunk)
+        totals.update((artist_id, (popularity, followers)) for artist_id, popularity, followers in rows)
+    return totals
+
+
+def record_changes(conn, changes, ts):
+    """
+    appends the popularity/follower changes of one write to artist_history and moves the
+    country rollups along. runs inside the caller's transaction
+
+    args:
+        conn (sqlite3.Connection)
+        changes (list): (artist_id, previous row or None if the artist is new, new row), the
+            rows being dicts with country, spotify_popularity and spotify_followers
+        ts (int): seconds (see to_ts) of the write, never earlier than the one before
+    """
+    # a stored NULL after a known value: the last known value lives in the history only
+    missing = [artist_id for artist_id, previous, new in changes if previous is not None and (
+        (previous['spotify_popularity'] is None and new['spotify_popularity'] is not None) or
+        (previous['spotify_followers'] is None and new['spotify_followers'] is not None))]
+    totals = _history_totals(conn, missing) if missing else {}
+
+    history = []
+    rollups = {}
+    for artist_id, previous, new in changes:
+        known_popularity = known_followers = None
+        if previous is not None:
+            known_popularity, known_followers = totals.get(artist_id, (None, None))
+            if previous['spotify_popularity'] is not None:
+                known_popularity = previous['spotify_popularity']
+            if previous['spotify_followers'] is not None:
+                known_followers = previous['spotify_followers']
+        popularity_delta = _delta(new['spotify_popularity'], known_popularity)
+        followers_delta = _delta(new['spotify_followers'], known_followers)
+        if popularity_delta is not None or followers_delta is not None:
+            history.append((artist_id, ts, popularity_delta, followers_delta))
+
+        # the artist leaves the totals of the country it was in and joins the one it's in now
+        for data, sign in ((previous, -1), (new, 1)):
+            if data is None or data['country'] is None:
+                continue
+            totals_delta = rollups.setdefault(data['country'], [0] * len(ROLLUP_FIELDS))
+            for i, value in enumerate(_contribution(data)):
+                totals_delta[i] += sign * value
+    conn.executemany(INSERT_HISTORY_SQL, history)
+    _roll_up(conn, rollups, ts)
+
+
+def _roll_up(conn, rollups, ts):
+    day = ts // DAY_SECONDS
+    for period in PERIODS:
+        start = period_start(day, period)
+        rows = []
+        for country, totals_delta in rollups.items():
+            if not any(totals_delta):
+                continue
+            latest = conn.execute(LATEST_ROLLUP_SQL, (period, country, start)).fetchone() or (0,) * len(ROLLUP_FIELDS)
+            rows.append((period, country, start, *(value + delta for value, delta in zip(latest, totals_delta))))
+        conn.executemany(UPSERT_ROLLUP_SQL, rows)
+
+
+def create_history(conn, ts):
+    """
+    the history tables, seeded with what the artists table holds right now: every artist's
+    values as observed at its last_changed, the country totals as of `ts`
+    """
+    conn.execute(CREATE_ARTIST_HISTORY_SQL)
+    conn.execute(CREATE_COUNTRY_HISTORY_SQL)
+
+    def seeds():
+        for artist_id, popularity, followers, last_changed in conn.execute(
+                "SELECT artist_id, spotify_popularity, spotify_followers, last_changed FROM artists"):
+            if popularity is None and followers is None:
+                continue
+            try:
+                observed = to_ts(last_changed)
+            except (TypeError, ValueError):
+                observed = ts
+            yield artist_id, observed, popularity, followers
+
+    conn.executemany(INSERT_HISTORY_SQL, list(seeds()))
+    rows = conn.execute("""
+        SELECT country, COUNT(*), COALESCE(SUM(spotify_popularity), 0), COUNT(spotify_popularity),
+               COALESCE(SUM(spotify_followers), 0), COUNT(spotify_followers)
+        FROM artists WHERE country IS NOT NULL GROUP BY country""").fetchall()
+    day = ts // DAY_SECONDS
+    conn.executemany(UPSERT_ROLLUP_SQL, [(period, country, period_start(day, period), *totals)
+                                         for period in PERIODS for country, *totals in rows])
+
+
+# --- reading ---
+
+def _period_dates(starts):
+    return pd.to_datetime(np.asarray(starts, dtype='int64'), unit='D')
+
+
+class HistoryQueries:
+    """
+    range queries over the history tables, on their own read-only connections
+
+    an artist's series is the running sum of its deltas, one contiguous range scan of the
+    clustered table per artist. country series come straight from the pre-rolled daily /
+    weekly totals, so a year of weekly points is ~52 rows per country however many
+    artists and changes went into them.
+    """
+
+    # first schema version with the history tables
+    MIN_SCHEMA_VERSION = 6
+
+    def __init__(self, db_path, pool_size=2):
+        self.pool = ReadOnlyConnectionPool(db_path, max_size=pool_size)
+
+    def schema_version(self):
+        return self.pool.execute("PRAGMA user_version")[0][0]
+
+    @staticmethod
+    def _grid(keys, key_name, first, last, period):
+        """
+        every (key, period start) from first to last, sorted by start for merge_asof
+        """
+        starts = np.arange(period_start(first, period), last + 1, 7 if period == 'week' else 1, dtype='int64')
+        return pd.DataFrame({key_name: np.repeat(np.asarray(keys, dtype=object), len(starts)),
+                             'start': np.tile(starts, len(keys))}).sort_values('start', kind='stable')
+
+    def artist_series(self, artist_ids, start_day, end_day, period='day'):
+        """
+        args:
+            artist_ids (sequence of str)
+            start_day, end_day (int): day numbers (see to_day), inclusive. start_day None = from
+                each artist's first observation
+            period (str): 'day' or 'week'
+
+        returns:
+            DataFrame of artist_id, date (the period's first day), popularity, followers, the
+            values as they stood at the end of each period. periods before an artist's first
+            observation are left out, a value not observed yet is <NA>
+        """
+        _check_period(period)
+        end_ts = (end_day + 1) * DAY_SECONDS
+        rows = []
+        with self.pool.connection() as conn:
+            for chunk in id_chunks(list(artist_ids)):
+                rows += conn.execute(f"""
+                    SELECT artist_id, ts,
+                           SUM(popularity_delta) OVER running, SUM(followers_delta) OVER running
+                    FROM artist_history
+                    WHERE artist_id IN ({', '.join('?' * len(chunk))}) AND ts < ?
+                    WINDOW running AS (PARTITION BY artist_id ORDER BY ts)""", (*chunk, end_ts)).fetchall()
+        columns = ['artist_id', 'date', 'popularity', 'followers']
+        if not rows:
+            return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in
+                                 zip(columns, (object, 'datetime64[s]', 'Int64', 'Int64'))})
+
+        observed = pd.DataFrame(rows, columns=['artist_id', 'ts', 'popularity', 'followers'])
+        observed['start'] = period_start(observed['ts'].to_numpy() // DAY_SECONDS, period)
+        # the last observation in each period is the value at its end
+        observed = observed.groupby(['artist_id', 'start'], sort=False).last().reset_index()
+        first = observed['start'].min() if start_day is None else start_day
+        grid = self._grid(observed['artist_id'].unique(), 'artist_id', first, end_day, period)
+        observed = observed.sort_values('start', kind='stable')[['artist_id', 'start', 'popularity', 'followers']]
+        series = pd.merge_asof(grid, observed, on='start', by='artist_id')
+        series = series.dropna(subset=['popularity', 'followers'], how='all')
+        series = series.sort_values(['artist_id', 'start'], kind='stable').reset_index(drop=True)
+        return pd.DataFrame({
+            'artist_id': series['artist_id'].astype(object),
+            'date': _period_dates(series['start']),
+            'popularity': series['popularity'].astype('Int64'),
+            'followers': series['followers'].astype('Int64'),
+        })
+
+    def country_series(self, countries, start_day, end_day, period='day'):
+        """
+        args:
+            countries (sequence of str)
+            start_day, end_day (int): day numbers (see to_day), inclusive. start_day None = from
+                the first rollup
+            period (str): 'day' or 'week'
+
+        returns:
+            DataFrame of country, date (the period's first day), artists, avg_popularity,
+            total_followers as they stood at the end of each period. periods before a
+            country's first rollup are left out
+        """
+        _check_period(period)
+        end_start = period_start(end_day, period)
+        rows = []
+        with self.pool.connection() as conn:
+            for country in countries:
+                if start_day is None:
+                    rows += conn.execute(f"""
+                        SELECT country, start, {', '.join(ROLLUP_FIELDS)} FROM country_history
+                        WHERE period = ? AND country = ? AND start <= ?""", (period, country, end_start)).fetchall()
+                    continue
+                first = period_start(start_day, period)
+                # the last rollup before the range is the value it starts with
+                rows += conn.execute(f"""
+                    SELECT country, start, {', '.join(ROLLUP_FIELDS)} FROM country_history
+                    WHERE period = ? AND country = ? AND start < ?
+                    ORDER BY start DESC LIMIT 1""", (period, country, first)).fetchall()
+                rows += conn.execute(f"""
+                    SELECT country, start, {', '.join(ROLLUP_FIELDS)} FROM country_history
+                    WHERE period = ? AND country = ? AND start BETWEEN ? AND ?""",
+                                     (period, country, first, end_start)).fetchall()
+        columns = ['country', 'date', 'artists', 'avg_popularity', 'total_followers']
+        if not rows:
+            return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in
+                                 zip(columns, (object, 'datetime64[s]', 'int64', 'float64', 'int64'))})
+
+        rollups = pd.DataFrame(rows, columns=['country', 'start', *ROLLUP_FIELDS]).sort_values('start', kind='stable')
+        first = rollups['start'].min() if start_day is None else start_day
+        grid = self._grid(rollups['country'].unique(), 'country', first, end_day, period)
+        series = pd.merge_asof(grid, rollups, on='start', by='country').dropna(subset=['artists'])
+        series = series.sort_values(['country', 'start'], kind='stable').reset_index(drop=True)
+        popularity_count = series['popularity_count'].to_numpy(dtype='float64')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg_popularity = np.where(popularity_count > 0,
+                                      series['popularity_sum'].to_numpy(dtype='float64') / popularity_count, np.nan)
+        return pd.DataFrame({
+            'country': series['country'].astype(object),
+            'date': _period_dates(series['start']),
+            'artists': series['artists'].astype('int64'),
+            'avg_popularity': avg_popularity,
+            'total_followers': series['followers_sum'].astype('int64'),
+        })
+
+    def close(self):
+        self.pool.close()
@@ -0,0 +1,202 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (200, 200)
+
+
+def make_session(pool_size=4):
+    """
+    requests session with a connection pool and a couple of retries on server errors
+    """
+    session = requests.Session()
+    retry = Retry(total=2, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504),
+                  allowed_methods=("GET",))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class ImageLoader:
+    """
+    fetches artist images in the background, with two cache levels
+
+    decoded thumbnails live in an in-memory LRU, the downloaded bytes in `cache_dir`
+    (one file per url), so a repeat view never touches the network and a restart only
+    costs a decode. concurrent requests for the same url share one download.
+
+    attributes:
+        memory_hits, disk_hits, downloads, failures (int): counters since the loader was made
+    """
+
+    def __init__(self, cache_dir, memory_items=64, thumbnail_size=THUMBNAIL_SIZE,
+                 timeout=(3.05, 10), workers=2, session=None):
+        """
+        args:
+            cache_dir (str or None): directory for the image bytes, None keeps them in memory only
+            memory_items (int): LRU bound on decoded thumbnails
+            thumbnail_size ((int, int)): thumbnails fit inside this box
+            timeout: requests timeout, (connect, read) seconds
+            workers (int): download threads
+            session: requests.Session, a pooled one from make_session() by default
+        """
+        self.cache_dir = cache_dir
+        self.memory_items = memory_items
+        self.thumbnail_size = thumbnail_size
+        self.timeout = timeout
+        self.session = session or make_session(pool_size=workers)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image")
+
+        # reentrant: a future that is already done runs _forget inside load_async's lock
+        self._lock = threading.RLock()
+        self._thumbnails = OrderedDict()
+        self._pending = {}
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.downloads = 0
+        self.failures = 0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+    def get_cached(self, url):
+        """
+        the thumbnail if it's already decoded in memory, else None. never blocks on i/o
+        """
+        with self._lock:
+            image = self._thumbnails.get(url)
+            if image is not None:
+                self._thumbnails.move_to_end(url)
+                self.memory_hits += 1
+            return image
+
+    def _remember(self, url, image):
+        with self._lock:
+            self._thumbnails[url] = image
+            self._thumbnails.move_to_end(url)
+            while len(self._thumbnails) > self.memory_items:
+                self._thumbnails.popitem(last=False)
+
+    def _thumbnail(self, data):
+        image = Image.open(BytesIO(data))
+        image.thumbnail(self.thumbnail_size)
+        # thumbnail() already loaded it, convert() detaches it from the source bytes
+        return image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    def _read_disk(self, url):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(url), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, url, data):
+        if not self.cache_dir:
+            return
+        path = self._path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            # readers only ever see a complete file
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not cache image %s: %s", url, e)
+
+    def load(self, url):
+        """
+        thumbnail for url: memory, then disk, then network. blocks, so call it off the tk thread
+
+        returns:
+            PIL image, or None if it couldn't be downloaded or decoded
+        """
+        image = self.get_cached(url)
+        if image is not None:
+            return image
+
+        data = self._read_disk(url)
+        if data is not None:
+            try:
+                image = self._thumbnail(data)
+                with self._lock:
+                    self.disk_hits += 1
+            except OSError:
+                # a corrupt file, fetch it again
+                try:
+                    os.remove(self._path(url))
+                except OSError:
+                    pass
+
+        if image is None:
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+                response.raise_for_status()
+                image = self._thumbnail(response.content)
+            except (requests.exceptions.RequestException, OSError) as e:
+                logger.error("Error loading image: %s", e)
+                with self._lock:
+                    self.failures += 1
+                return None
+            with self._lock:
+                self.downloads += 1
+            self._write_disk(url, response.content)
+
+        self._remember(url, image)
+        return image
+
+    def load_async(self, url, callback=None):
+        """
+        loads url on a worker thread. callback(url, image_or_None) runs on that worker
+        thread too, so gui callers must hand it back to their own thread (e.g. with after)
+
+        returns:
+            concurrent.futures.Future of the image, shared with any load of url already running
+        """
+        with self._lock:
+            future = self._pending.get(url)
+            if future is None:
+                future = self.executor.submit(self.load, url)
+                self._pending[url] = future
+                future.add_done_callback(lambda done: self._forget(url, done))
+        if callback is not None:
+            future.add_done_callback(lambda done: callback(url, None if done.cancelled() else done.result()))
+        return future
+
+    def _forget(self, url, future):
+        with self._lock:
+            if self._pending.get(url) is future:
+                del self._pending[url]
+
+    def clear(self):
+        """
+        empties the memory cache (the disk cache stays)
+        """
+        with self._lock:
+            self._thumbnails.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'memory_hits': self.memory_hits, 'disk_hits': self.disk_hits, 'downloads': self.downloads,
+                    'failures': self.failures, 'thumbnails': len(self._thumbnails)}
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
@@ -0,0 +1,122 @@
+from datetime import datetime
+
+# ingest_items.status values
+PENDING = 'pending'
+OK = 'ok'
+FAILED = 'failed'
+
+# ingest_runs.status values
+RUNNING = 'running'
+INTERRUPTED = 'interrupted'
+FINISHED = 'finished'
+
+
+class IngestJournal:
+    """
+    run journal for ingestion, kept in the ingest_runs / ingest_items tables
+
+    every artist picked for a run gets an item row that starts out pending and ends up
+    ok or failed (with the reason and how many attempts it took). item updates are
+    buffered and written with executemany, so the journal costs one commit per
+    `flush_size` artists rather than one per artist.
+
+    uses the DatabaseManager's connection, so it has to be driven from the same thread
+    that writes the artists (the ingestion writer thread).
+    """
+
+    def __init__(self, db_manager, flush_size=500):
+        """
+        args:
+            db_manager (DatabaseManager)
+            flush_size (int): buffered item updates before they are written
+        """
+        self.db_manager = db_manager
+        self.conn = db_manager.conn
+        self.flush_size = flush_size
+        self._buffer = []
+
+    def start_run(self, artist_ids, batch_size=5000):
+        """
+        creates a run with every id as a pending item
+
+        returns:
+            run_id (int)
+        """
+        now = datetime.now().isoformat()
+        with self.conn:
+            cursor = self.conn.execute("INSERT INTO ingest_runs(started_at, status) VALUES (?, ?)", (now, RUNNING))
+            run_id = cursor.lastrowid
+
+        batch = []
+        for artist_id in artist_ids:
+            batch.append((run_id, artist_id, PENDING))
+            if len(batch) >= batch_size:
+                self._insert_items(batch)
+                batch = []
+        if batch:
+            self._insert_items(batch)
+        return run_id
+
+    def _insert_items(self, batch):
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO ingest_items(run_id, artist_id, status) VALUES (?, ?, ?)", batch)
+
+    def reopen_run(self, run_id):
+        """
+        marks an old run as running again (for --resume / --retry-failed)
+        """
+        with self.conn:
+            self.conn.execute("UPDATE ingest_runs SET status = ?, finished_at = NULL WHERE run_id = ?", (RUNNING, run_id))
+
+    def finish_run(self, run_id, status=FINISHED):
+        self.flush()
+        with self.conn:
+            self.conn.execute("UPDATE ingest_runs SET status = ?, finished_at = ? WHERE run_id = ?",
+                              (status, datetime.now().isoformat(), run_id))
+
+    def latest_run(self, unfinished_only=False):
+        """
+        returns:
+            (run_id, status) of the newest run, None if there is none
+        """
+        sql = "SELECT run_id, status FROM ingest_runs"
+        params = ()
+        if unfinished_only:
+            sql += " WHERE status != ?"
+            params = (FINISHED,)
+        return self.conn.execute(sql + " ORDER BY run_id DESC LIMIT 1", params).fetchone()
+
+    def ids_with_status(self, run_id, status):
+        """
+        set of artist ids in a run with the given item status
+        """
+        rows = self.conn.execute("SELECT artist_id FROM ingest_items WHERE run_id = ? AND status = ?", (run_id, status))
+        return {artist_id for (artist_id,) in rows}
+
+    def counts(self, run_id):
+        """
+        dict of item status -> count for a run
+        """
+        rows = self.conn.execute("SELECT status, COUNT(*) FROM ingest_items WHERE run_id = ? GROUP BY status", (run_id,))
+        return dict(rows)
+
+    def record(self, run_id, artist_id, status, reason=None):
+        """
+        buffers the outcome of one attempt at an artist
+        """
+        self._buffer.append((status, reason, datetime.now().isoformat(), run_id, artist_id))
+        if len(self._buffer) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        """
+        writes buffered item updates in one transaction
+        """
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        with self.conn:
+            self.conn.executemany("""
+                UPDATE ingest_items SET status = ?, reason = ?, updated_at = ?, attempts = attempts + 1
+                WHERE run_id = ? AND artist_id = ?
+            """, batch)
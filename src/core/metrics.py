@@ -0,0 +1,235 @@
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+# histogram bucket upper bounds, in seconds for the timing spans (+Inf is implicit)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """
+    counts of observations per bucket, plus count/sum/min/max
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # one slot per bucket and a last one for +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def cumulative(self):
+        """
+        [(upper bound, observations <= it)], the last bound is +Inf
+        """
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class _Span:
+    """
+    times a block and observes the seconds into a histogram. a failing block also
+    counts into `<name>_errors_total`
+    """
+    __slots__ = ('metrics', 'name', 'labels', 'start')
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        if exc_type is not None:
+            self.metrics.inc(f"{self.name}_errors_total", **self.labels)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def _key(name, labels):
+    # values as strings: the same label can be an int on one call and a str on the next
+    # (status=200 / status='timeout'), and export sorts the keys
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def _prometheus_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Metrics:
+    """
+    process-wide counters, gauges and histograms (timing spans are histograms of seconds)
+
+    everything is keyed by (name, labels). while disabled, every call returns right away
+    (span() hands back a shared no-op context manager), so the instrumentation can stay
+    in hot paths. snapshots export as JSON or Prometheus text format.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def span(self, name, **labels):
+        """
+        `with metrics.span('db_commit_seconds'):` observes how long the block took
+        """
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name, labels)
+
+    def timed(self, name, **labels):
+        """
+        decorator version of span()
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Span(self, name, labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    # --- export ---
+
+    def snapshot(self):
+        """
+        returns:
+            dict with 'counters', 'gauges' and 'histograms' lists, JSON serialisable
+        """
+        with self._lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            gauges = [{'name': name, 'labels': dict(labels), 'value': value}
+                      for (name, labels), value in sorted(self._gauges.items())]
+            histograms = [{'name': name, 'labels': dict(labels), 'count': histogram.count,
+                           'sum': histogram.sum, 'min': histogram.min, 'max': histogram.max,
+                           'buckets': [[None if bound == float('inf') else bound, count]
+                                       for bound, count in histogram.cumulative()]}
+                          for (name, labels), histogram in sorted(self._histograms.items())]
+        return {'timestamp': time.time(), 'counters': counters, 'gauges': gauges, 'histograms': histograms}
+
+    def to_json(self, indent=2):
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def to_prometheus(self, prefix='artistnexus_'):
+        """
+        the snapshot in the Prometheus text exposition format
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted((key, (histogram.cumulative(), histogram.sum, histogram.count))
+                                for key, histogram in self._histograms.items())
+        lines = []
+        typed = set()
+
+        def type_line(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            type_line(prefix + name, 'counter')
+            lines.append(f"{prefix}{name}{_prometheus_labels(labels)} {value}")
+        for (name, labels), value in gauges:
+            type_line(prefix + name, 'gauge')
+            lines.append(f"{prefix}{name}{_prometheus_labels(labels)} {value}")
+        for (name, labels), (cumulative, total, count) in histograms:
+            type_line(prefix + name, 'histogram')
+            for bound, bucket_count in cumulative:
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{prefix}{name}_bucket{_prometheus_labels(labels, [('le', le)])} {bucket_count}")
+            lines.append(f"{prefix}{name}_sum{_prometheus_labels(labels)} {total}")
+            lines.append(f"{prefix}{name}_count{_prometheus_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """
+        writes the snapshot to path: Prometheus text for .prom/.txt, JSON otherwise
+        """
+        text = self.to_prometheus() if path.endswith(('.prom', '.txt')) else self.to_json()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+# the process-wide registry. off unless ARTISTNEXUS_METRICS=1 or something calls enable()
+metrics = Metrics(enabled=os.environ.get('ARTISTNEXUS_METRICS') == '1')
@@ -1,15 +1,148 @@
-import matplotlib.pyplot as plt
+import threading
+
+import numpy as np
+from matplotlib import style
+from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
 import pandas as pd
 
+from .metrics import metrics
+
+STYLE = 'fivethirtyeight'
+
+# above this many points a scatter is drawn as a density plot instead (level of detail)
+DENSITY_THRESHOLD = 20_000
+
 
 class Plotter:
-    @staticmethod
-    def create_figure():
-        plt.style.use('fivethirtyeight')
-        fig, ax = plt.subplots(figsize=(10, 6), dpi=100)
-        # prevent label overlap
-        fig.subplots_adjust(bottom=0.2)
-        return fig, ax
+    """
+    one persistent Figure that every chart is drawn into
+
+    the gui embeds `figure` in a single canvas for its whole lifetime and redraws it
+    (canvas.draw_idle) after each chart. when the new chart is the same kind and shape
+    as the one on screen (same analysis, same number of bars, a new country's scatter),
+    the existing artists are updated in place instead of clearing the axes. no pyplot:
+    nothing global holds on to the figure, and the style is applied per chart with
+    style.context instead of style.use.
+
+    `lock` is held while a chart is drawn, anything that renders the figure off the
+    gui thread (the png export) must hold it too.
+
+    big datasets are drawn from precomputed bins (see DataAnalyzer.get_popularity_histogram
+    and get_popularity_vs_followers_density), so their cost doesn't grow with the data.
+    """
+
+    def __init__(self, figsize=(10, 6), dpi=100):
+        with style.context(STYLE):
+            self.figure = Figure(figsize=figsize, dpi=dpi)
+            self.ax = self.figure.add_subplot()
+        # reentrant, so a caller can hold it across a whole chart method
+        self.lock = threading.RLock()
+        # (kind, shape) of the chart on the axes, None if they're blank
+        self._chart = None
+        self._colorbar = None
+
+    def _redraw(self, chart):
+        """
+        clears the axes for a chart that can't reuse the current artists
+        """
+        if self._colorbar is not None:
+            # gives the axes back the room the colorbar took
+            self._colorbar.remove()
+            self._colorbar = None
+        self.ax.clear()
+        # clear() keeps the scales and aspect, a log axis or a pie's equal aspect would leak into this chart
+        self.ax.set_xscale('linear')
+        self.ax.set_yscale('linear')
+        self.ax.set_aspect('auto', adjustable='box')
+        self._chart = chart
+
+    def _finish(self, title, xlabel=None, ylabel=None):
+        self.ax.set_title(title, fontsize=16)
+        if xlabel is not None: self.ax.set_xlabel(xlabel, fontsize=12)
+        if ylabel is not None: self.ax.set_ylabel(ylabel, fontsize=12)
+        self.figure.tight_layout()
+
+    @metrics.timed('plot_draw_seconds', chart='bar')
+    def bar_chart(self, series, title, xlabel, ylabel, log=False):
+        with self.lock, style.context(STYLE):
+            if series is None or series.empty:
+                self._redraw(None)
+            else:
+                chart = ('bar', len(series), log)
+                bars = self.ax.containers[0] if chart == self._chart else None
+                if bars is not None:
+                    for bar, value in zip(bars, series.to_numpy()):
+                        bar.set_height(value)
+                    self.ax.set_xticklabels([str(label) for label in series.index], rotation=45, ha='right')
+                    self.ax.relim()
+                    self.ax.autoscale_view()
+                else:
+                    self._redraw(chart)
+                    Plotter.plot_bar_chart(self.ax, series, title, xlabel, ylabel)
+                    if log: self.ax.set_yscale('log')
+            self._finish(title, xlabel, ylabel)
+
+    @metrics.timed('plot_draw_seconds', chart='pie')
+    def pie_chart(self, series, title):
+        # the wedges, labels and legend all depend on the values, so pies are always redrawn
+        with self.lock, style.context(STYLE):
+            self._redraw(None if series is None or series.empty else ('pie',))
+            Plotter.plot_pie_chart(self.ax, series, title)
+            self._finish(title)
+
+    @metrics.timed('plot_draw_seconds', chart='scatter')
+    def scatter_plot(self, x_data, y_data, title, xlabel, ylabel):
+        with self.lock, style.context(STYLE):
+            if x_data is None or y_data is None:
+                self._redraw(None)
+            elif self._chart == ('scatter',):
+                offsets = np.column_stack((np.asarray(x_data, dtype=float), np.asarray(y_data, dtype=float)))
+                self.ax.collections[0].set_offsets(offsets)
+                # relim() ignores collections, so the data limits are rebuilt by hand
+                self.ax.ignore_existing_data_limits = True
+                self.ax.update_datalim(offsets)
+                self.ax.autoscale_view()
+            else:
+                self._redraw(('scatter',))
+                Plotter.plot_scatter_plot(self.ax, x_data, y_data, title, xlabel, ylabel)
+            self._finish(title, xlabel, ylabel)
+
+    @metrics.timed('plot_draw_seconds', chart='density')
+    def density_plot(self, counts, x_edges, y_edges, title, xlabel, ylabel):
+        """
+        a 2D histogram (counts[x_bin, y_bin]) on a log x axis, standing in for a scatter
+        with more than DENSITY_THRESHOLD points. the bins change with every country, so
+        it's always redrawn, in time that only depends on the number of bins
+        """
+        with self.lock, style.context(STYLE):
+            self._redraw(('density',))
+            # empty bins stay transparent, a log color scale so single artists still show
+            mesh = self.ax.pcolormesh(x_edges, y_edges, np.ma.masked_equal(counts.T, 0), cmap='viridis',
+                                      norm=LogNorm(vmin=1, vmax=max(int(counts.max()), 1)))
+            self.ax.set_xscale('log')
+            self._colorbar = self.figure.colorbar(mesh, ax=self.ax, label='Number of Artists')
+            self._finish(title, xlabel, ylabel)
+
+    @metrics.timed('plot_draw_seconds', chart='histogram')
+    def histogram(self, counts, edges, title, xlabel):
+        """
+        bars from precomputed (counts, edges), as np.histogram returns them
+        """
+        with self.lock, style.context(STYLE):
+            if counts is None:
+                self._redraw(None)
+            elif self._chart == ('hist', len(counts)):
+                for patch, left, width, count in zip(self.ax.patches, edges[:-1], np.diff(edges), counts):
+                    patch.set_x(left)
+                    patch.set_width(width)
+                    patch.set_height(count)
+                self.ax.relim()
+                self.ax.autoscale_view()
+            else:
+                self._redraw(('hist', len(counts)))
+                self.ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', edgecolor='black')
+            self._finish(title, xlabel, 'Number of Artists')
 
     @staticmethod
     def plot_bar_chart(ax, series, title, xlabel, ylabel):
@@ -56,4 +189,4 @@ class Plotter:
         ax.hist(data, bins=bins, edgecolor='black')
         ax.set_title(title, fontsize=16)
         ax.set_xlabel(xlabel, fontsize=12)
-        ax.set_ylabel('Number of Artists', fontsize=12)
\ No newline at end of file
+        ax.set_ylabel('Number of Artists', fontsize=12)
@@ -0,0 +1,122 @@
+import random
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    adaptive token bucket for the spotify api
+
+    every request takes a token. the refill rate creeps up while requests go through
+    and gets cut when spotify answers 429, so we end up running right under whatever
+    limit spotify is enforcing at the moment. a Retry-After pauses everyone sharing the
+    limiter, not just the caller that got throttled.
+
+    clock/sleep/rand can be swapped for fakes so the timing can be checked without waiting.
+    """
+
+    def __init__(self, rate=2.0, burst=5, min_rate=0.2, max_rate=20.0,
+                 increase_step=0.05, decrease_factor=0.5,
+                 backoff_base=1.0, backoff_max=60.0,
+                 clock=time.monotonic, sleep=time.sleep, rand=random.random):
+        """
+        args:
+            rate (float): starting requests per second
+            burst (int): how many tokens can pile up while idle
+            min_rate, max_rate (float): bounds for the adaptive rate
+            increase_step (float): rate added after every successful request
+            decrease_factor (float): rate multiplier after every throttle
+            backoff_base, backoff_max (float): seconds, for the exponential retry backoff
+            clock, sleep, rand: time source, sleep function and 0..1 random source
+        """
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._clock = clock
+        self._sleep = sleep
+        self._rand = rand
+
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        # last refill time. pushed into the future while a Retry-After is in effect
+        self._updated = clock()
+
+        self.requests = 0
+        self.throttles = 0
+        self.retries = 0
+
+    def _refill(self, now):
+        if now > self._updated:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def acquire(self):
+        """
+        blocks until the caller is allowed to send one request
+        """
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            # reserve the token now and sleep off the debt outside the lock
+            self._tokens -= 1
+            wait = max(0.0, self._updated - now) + max(0.0, -self._tokens) / self.rate
+            self.requests += 1
+
+        if wait > 0:
+            self._sleep(wait)
+
+    def on_success(self):
+        """
+        additive increase
+        """
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_throttle(self, retry_after=None):
+        """
+        multiplicative decrease, plus a global pause if spotify said how long to wait
+
+        args:
+            retry_after (float): seconds from the Retry-After header, if any
+        """
+        with self._lock:
+            self.throttles += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            now = self._clock()
+            self._refill(now)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._updated = max(self._updated, now + retry_after)
+
+    def backoff(self, attempt):
+        """
+        sleeps before retry number `attempt` (0-based) of a failed request.
+        exponential with full jitter so parallel callers don't retry in lockstep
+        """
+        with self._lock:
+            self.retries += 1
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt)) * self._rand()
+        if delay > 0:
+            self._sleep(delay)
+        return delay
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def stats(self):
+        """
+        counters and the current rate, as a dict
+        """
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'throttles': self.throttles,
+                'retries': self.retries,
+                'rate': self.rate,
+            }
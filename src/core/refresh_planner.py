@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+
+class RefreshPlanner:
+    """
+    decides which csv artists actually need a trip to the api
+
+    an artist is refreshed if it isn't in the database yet or its last_checked is older
+    than max_age. the work comes back most-stale-first (new artists before everything else),
+    and since the writer commits last_checked batch by batch, a crashed run just picks up
+    the still-stale artists when it's started again.
+    """
+
+    def __init__(self, db_manager, max_age=timedelta(days=7), now=None):
+        """
+        args:
+            db_manager (DatabaseManager)
+            max_age (timedelta): how old a row can get before it is fetched again
+            now (datetime): reference time, defaults to datetime.now() at plan time
+        """
+        self.db_manager = db_manager
+        self.max_age = max_age
+        self.now = now
+        self.new_count = 0
+        self.stale_count = 0
+        self.fresh_count = 0
+
+    @staticmethod
+    def _parse(timestamp):
+        try:
+            parsed = datetime.fromisoformat(timestamp)
+        except (TypeError, ValueError):
+            return None
+        # rows are written with naive local time, make anything else comparable
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone().replace(tzinfo=None)
+        return parsed
+
+    def plan(self, rows):
+        """
+        args:
+            rows (iterable): ArtistSeed rows (anything with an artist_id)
+
+        returns:
+            list of the rows that need fetching, new artists first, then oldest first.
+            duplicate ids keep their first row
+        """
+        last_checked = self.db_manager.get_last_checked()
+        cutoff = (self.now or datetime.now()) - self.max_age
+        self.new_count = self.stale_count = self.fresh_count = 0
+
+        seen = set()
+        new_rows = []
+        stale = []
+        for row in rows:
+            artist_id = row.artist_id
+            if artist_id in seen:
+                continue
+            seen.add(artist_id)
+
+            if artist_id not in last_checked:
+                new_rows.append(row)
+                continue
+            checked_at = self._parse(last_checked[artist_id])
+            if checked_at is None:
+                # unreadable timestamp, treat it as older than everything
+                stale.append((datetime.min, len(stale), row))
+            elif checked_at < cutoff:
+                stale.append((checked_at, len(stale), row))
+            else:
+                self.fresh_count += 1
+
+        stale.sort(key=lambda item: (item[0], item[1]))
+        self.new_count = len(new_rows)
+        self.stale_count = len(stale)
+        return new_rows + [row for _, _, row in stale]
+
+    def summary(self):
+        return (f"Refresh plan: {self.new_count} new, {self.stale_count} stale, "
+                f"{self.fresh_count} fresh (skipped, max age {self.max_age}).")
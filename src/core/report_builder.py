@@ -0,0 +1,245 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from .data_analyzer import DataAnalyzer
+from .metrics import metrics
+from .plotter import Plotter, DENSITY_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# bump when the charts' look changes, so the next run re-renders everything
+RENDER_VERSION = 1
+
+GLOBAL_ANALYSES = ('followers_by_country', 'popularity_by_country', 'popularity_histogram')
+COUNTRY_ANALYSES = ('genre_distribution', 'pop_vs_followers')
+ANALYSES = GLOBAL_ANALYSES + COUNTRY_ANALYSES
+# analyses that take an n
+TOP_N_ANALYSES = ('followers_by_country', 'popularity_by_country', 'genre_distribution')
+
+MANIFEST_NAME = 'manifest.json'
+
+
+class ChartSpec(NamedTuple):
+    analysis: str
+    country: str = None
+    n: int = None
+
+    @property
+    def filename(self):
+        parts = [self.analysis]
+        if self.country is not None:
+            parts.append(re.sub(r'\W+', '_', self.country).strip('_') or 'unknown')
+        if self.n is not None:
+            parts.append(f"n{self.n}")
+        return '_'.join(parts) + '.png'
+
+
+def chart_specs(countries, analyses=ANALYSES, n_values=(10,)):
+    """
+    every (analysis, country, n) combination to render, countries only for the per-country
+    analyses and n only for the top-n ones
+    """
+    specs = []
+    for analysis in analyses:
+        if analysis not in ANALYSES:
+            raise ValueError(f"Unknown analysis '{analysis}', expected one of {ANALYSES}")
+        for country in (countries if analysis in COUNTRY_ANALYSES else [None]):
+            for n in (n_values if analysis in TOP_N_ANALYSES else [None]):
+                specs.append(ChartSpec(analysis, country, n))
+    return specs
+
+
+def chart_data(analyzer, spec):
+    """
+    returns:
+        (plotter method name, positional args) for the chart, or None if there's no data for it
+    """
+    analysis, country, n = spec
+    if analysis == 'followers_by_country':
+        data = analyzer.get_top_n_countries_by_followers(n)
+        if data is None or data.empty: return None
+        return 'bar_chart', (data, f"Top {n} Countries by Total Followers", "Country", "Total Followers (Log Scale)", True)
+    if analysis == 'popularity_by_country':
+        data = analyzer.get_top_n_countries_by_avg_popularity(n)
+        if data is None or data.empty: return None
+        return 'bar_chart', (data, f"Top {n} Countries by Average Popularity", "Country", "Average Popularity Score")
+    if analysis == 'popularity_histogram':
+        data = analyzer.get_popularity_histogram()
+        if data is None: return None
+        return 'histogram', data + ("Overall Popularity Distribution", "Popularity Score")
+    if analysis == 'genre_distribution':
+        data = analyzer.get_genre_distribution_for_country(country, n)
+        if data is None or data.empty: return None
+        return 'pie_chart', (data, f"Top {n} Genres in {country}")
+    if analysis == 'pop_vs_followers':
+        x_data, y_data = analyzer.get_popularity_vs_followers(country)
+        if x_data is None: return None
+        title = f"Popularity vs. Followers in {country}"
+        if len(x_data) > DENSITY_THRESHOLD:
+            return 'density_plot', analyzer.get_popularity_vs_followers_density(country) + (
+                title, "Followers (log scale)", "Popularity Score")
+        return 'scatter_plot', (x_data, y_data, title, "Followers (log scale)", "Popularity Score")
+    raise ValueError(f"Unknown analysis '{analysis}'")
+
+
+def fingerprint(spec, chart):
+    """
+    sha256 of everything that goes into the png: the spec, the plot method and its data
+    """
+    digest = hashlib.sha256(repr((RENDER_VERSION, tuple(spec))).encode('utf-8'))
+    if chart is None:
+        return digest.hexdigest()
+    method, args = chart
+    digest.update(method.encode('utf-8'))
+    for arg in args:
+        if isinstance(arg, pd.Series):
+            digest.update(pd.util.hash_pandas_object(arg, index=True).to_numpy().tobytes())
+            digest.update(repr(arg.name).encode('utf-8'))
+        elif isinstance(arg, np.ndarray):
+            digest.update(np.ascontiguousarray(arg).tobytes())
+        else:
+            digest.update(repr(arg).encode('utf-8'))
+    return digest.hexdigest()
+
+
+# --- worker side ---
+
+_worker = {}
+
+
+def _init_worker(db_path, snapshot):
+    """
+    runs once per worker process. a forked worker inherits the parent's snapshot as is,
+    so the data is loaded once for the whole pool
+    """
+    _worker['analyzer'] = DataAnalyzer(db_path, mode='pandas', change_check_interval=float('inf'),
+                                       snapshot=snapshot)
+    # one figure per worker, reused for every chart it draws
+    _worker['plotter'] = Plotter()
+
+
+def render_chart(spec, output_dir, previous_fingerprint=None, dpi=150):
+    """
+    renders one chart unless its fingerprint matches the last run's and the png is still there
+
+    returns:
+        the chart's manifest entry (dict)
+    """
+    entry = {'analysis': spec.analysis, 'country': spec.country, 'n': spec.n, 'file': None}
+    start = time.perf_counter()
+    try:
+        chart = chart_data(_worker['analyzer'], spec)
+        entry['analysis_seconds'] = round(time.perf_counter() - start, 4)
+        entry['fingerprint'] = fingerprint(spec, chart)
+        if chart is None:
+            entry['status'] = 'empty'
+            return entry
+
+        entry['file'] = spec.filename
+        path = os.path.join(output_dir, spec.filename)
+        if entry['fingerprint'] == previous_fingerprint and os.path.exists(path):
+            entry['status'] = 'unchanged'
+            return entry
+
+        render_start = time.perf_counter()
+        plotter = _worker['plotter']
+        method, args = chart
+        getattr(plotter, method)(*args)
+        with plotter.lock:
+            plotter.figure.savefig(path, dpi=dpi, bbox_inches='tight')
+        entry['render_seconds'] = round(time.perf_counter() - render_start, 4)
+        entry['status'] = 'rendered'
+    except Exception as e:
+        entry['status'] = 'failed'
+        entry['error'] = str(e)
+        # so the next run tries again
+        entry['fingerprint'] = None
+    finally:
+        entry['seconds'] = round(time.perf_counter() - start, 4)
+    return entry
+
+
+# --- driver ---
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build_reports(db_path, output_dir, analyses=ANALYSES, countries=None, n_values=(10,), workers=None,
+                  force=False, dpi=150):
+    """
+    renders every requested chart into output_dir across a process pool and writes the manifest
+
+    args:
+        countries: list of countries for the per-country analyses, all of them by default
+        workers (int): processes, os.cpu_count() by default
+        force (bool): re-render even the charts whose data hasn't changed
+
+    returns:
+        the manifest (dict)
+    """
+    started = time.perf_counter()
+    analyzer = DataAnalyzer(db_path, mode='pandas', change_check_interval=float('inf'))
+    if not analyzer.has_data():
+        raise RuntimeError(f"No artist data in {db_path}")
+    if countries is None:
+        countries = analyzer.get_available_countries()
+    specs = chart_specs(countries, analyses, n_values)
+
+    os.makedirs(output_dir, exist_ok=True)
+    previous = {} if force else {
+        (entry['analysis'], entry['country'], entry['n']): entry.get('fingerprint')
+        for entry in (load_manifest(output_dir) or {}).get('charts', [])
+    }
+
+    workers = workers or os.cpu_count() or 1
+    # fork shares the loaded snapshot with the workers for free, spawn pickles it once per worker
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+    logger.info("Rendering %d charts with %d worker(s)...", len(specs), workers)
+    entries = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(db_path, analyzer.snapshot())) as executor:
+        futures = [executor.submit(render_chart, spec, output_dir, previous.get(tuple(spec)), dpi) for spec in specs]
+        for done, future in enumerate(futures, start=1):
+            entry = future.result()
+            entries.append(entry)
+            # the workers' own metrics stay in their processes, so record their timings here
+            metrics.inc('report_charts_total', status=entry['status'])
+            if 'render_seconds' in entry:
+                metrics.observe('plot_render_seconds', entry['render_seconds'], analysis=entry['analysis'])
+            if done % 100 == 0 or done == len(futures):
+                logger.info("%d/%d charts", done, len(futures))
+
+    counts = {}
+    for entry in entries:
+        counts[entry['status']] = counts.get(entry['status'], 0) + 1
+    manifest = {
+        'generated_at': datetime.now().isoformat(),
+        'database': os.path.abspath(db_path),
+        'records': analyzer.record_count,
+        'render_version': RENDER_VERSION,
+        'workers': workers,
+        'seconds': round(time.perf_counter() - started, 3),
+        'counts': counts,
+        'charts': entries,
+    }
+    tmp_path = os.path.join(output_dir, MANIFEST_NAME + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(output_dir, MANIFEST_NAME))
+    return manifest
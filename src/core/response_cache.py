@@ -0,0 +1,166 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from sqlite3 import Error
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    persistent cache of raw spotify responses, in its own sqlite file
+
+    entries expire `ttl` seconds after they were fetched. once there are more than
+    `max_entries`, the least recently used ones are evicted. safe to share between the
+    fetch worker threads (one connection behind a lock).
+
+    attributes:
+        hits, misses, expired, evictions (int): counters since the cache was opened
+    """
+
+    def __init__(self, path, ttl=24 * 3600, max_entries=200_000, clock=time.time):
+        """
+        args:
+            path (str): sqlite file for the cache (':memory:' works too)
+            ttl (float): seconds an entry stays valid
+            max_entries (int): LRU bound on the number of entries
+            clock: time source, time.time by default
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses(accessed_at)")
+        self._size = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get_many(self, keys):
+        """
+        returns:
+            dict of key -> decoded payload for every key with a live entry
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+        now = self._clock()
+        found = {}
+        with self._lock:
+            try:
+                # sqlite's default limit on bound parameters is 999
+                for start in range(0, len(keys), 900):
+                    chunk = keys[start:start + 900]
+                    placeholders = ', '.join('?' * len(chunk))
+                    rows = self.conn.execute(
+                        f"SELECT key, payload, fetched_at FROM responses WHERE key IN ({placeholders})", chunk)
+                    for key, payload, fetched_at in rows:
+                        if now - fetched_at > self.ttl:
+                            self.expired += 1
+                            continue
+                        found[key] = json.loads(payload)
+                if found:
+                    # one write for all the LRU bumps
+                    with self.conn:
+                        self.conn.executemany("UPDATE responses SET accessed_at = ? WHERE key = ?",
+                                              [(now, key) for key in found])
+            except Error as e:
+                logger.error("Error reading response cache: %s", e)
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items):
+        """
+        args:
+            items (dict): key -> json-serialisable payload
+        """
+        if not items:
+            return
+        now = self._clock()
+        rows = [(key, json.dumps(payload), now, now) for key, payload in items.items()]
+        with self._lock:
+            try:
+                with self.conn:
+                    before = self.conn.total_changes
+                    self.conn.executemany("INSERT OR REPLACE INTO responses(key, payload, fetched_at, accessed_at) "
+                                          "VALUES (?, ?, ?, ?)", rows)
+                # replaced keys get counted as growth too, so recount before evicting anything
+                self._size += self.conn.total_changes - before
+                if self._size > self.max_entries:
+                    self._size = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                    self._evict()
+            except Error as e:
+                logger.error("Error writing response cache: %s", e)
+
+    def put(self, key, payload):
+        self.put_many({key: payload})
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return
+        with self._lock:
+            try:
+                with self.conn:
+                    before = self.conn.total_changes
+                    self.conn.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key in keys])
+                self._size -= self.conn.total_changes - before
+            except Error as e:
+                logger.error("Error writing response cache: %s", e)
+
+    def _evict(self):
+        """drops the least recently used entries, and expired ones, down to max_entries"""
+        overflow = self._size - self.max_entries
+        if overflow <= 0:
+            return
+        with self.conn:
+            self.conn.execute("""
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY accessed_at LIMIT ?
+                )""", (overflow,))
+            self.conn.execute("DELETE FROM responses WHERE fetched_at < ?", (self._clock() - self.ttl,))
+        evicted = self._size - self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        self.evictions += evicted
+        self._size -= evicted
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM responses")
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': self._size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
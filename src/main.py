@@ -1,5 +1,6 @@
 # src/main.py (Final Version: GUI Launcher)
 
+import logging
 import os
 import sys
 
@@ -7,10 +8,19 @@ import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import config
 
+from core.metrics import metrics
 from ui.main_window import AppGUI
 
 if __name__ == "__main__":
+    logging.basicConfig(level=config.LOG_LEVEL, format=config.LOG_FORMAT)
+    if config.METRICS_EXPORT_PATH:
+        metrics.enable()
+
     # ui
-    app = AppGUI(db_path=config.DATABASE_NAME)
+    app = AppGUI(db_path=config.DATABASE_NAME, analyzer_mode=config.ANALYZER_MODE,
+                 image_cache_dir=config.IMAGE_CACHE_DIR, image_memory_items=config.IMAGE_MEMORY_CACHE_ITEMS)
+
+    app.mainloop()
 
-    app.mainloop()
\ No newline at end of file
+    if metrics.enabled and config.METRICS_EXPORT_PATH:
+        metrics.write(config.METRICS_EXPORT_PATH)
\ No newline at end of file
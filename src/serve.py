@@ -0,0 +1,46 @@
+# src/serve.py (read-only HTTP service over the artists database)
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+
+# another weird path stuff
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import config
+
+from core.metrics import metrics
+from service.http_service import QueryService
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the artist analyses as JSON and PNG charts over HTTP.")
+    parser.add_argument('--db', default=config.DATABASE_NAME, help="artists database to serve")
+    parser.add_argument('--host', default=config.SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=config.SERVICE_PORT)
+    parser.add_argument('--mode', choices=('pandas', 'sql'), default=config.SERVICE_ANALYZER_MODE,
+                        help="analyzer mode (default: %(default)s)")
+    parser.add_argument('--render-workers', type=int, default=config.SERVICE_RENDER_WORKERS,
+                        help="processes rendering png charts")
+    parser.add_argument('--cache-items', type=int, default=config.SERVICE_CACHE_ITEMS,
+                        help="responses kept in the in-memory LRU")
+    parser.add_argument('--metrics', metavar='PATH', help="write a metrics snapshot here on exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=config.LOG_LEVEL, format=config.LOG_FORMAT)
+    if args.metrics:
+        metrics.enable()
+
+    # stop like Ctrl-C, so the render processes get shut down with us
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    service = QueryService(args.db, mode=args.mode, render_workers=args.render_workers,
+                           cache_items=args.cache_items)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        if args.metrics:
+            metrics.write(args.metrics)
@@ -0,0 +1,420 @@
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qsl, unquote
+
+from core.data_analyzer import DataAnalyzer
+from core.metrics import metrics
+from core.report_builder import ANALYSES, COUNTRY_ANALYSES, TOP_N_ANALYSES, RENDER_VERSION, ChartSpec, chart_data
+
+logger = logging.getLogger(__name__)
+
+MAX_N = 1000
+MAX_HEADER_BYTES = 16 * 1024
+JSON_TYPE = 'application/json'
+PNG_TYPE = 'image/png'
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 431: 'Request Header Fields Too Large', 500: 'Internal Server Error'}
+
+
+class ResponseCache:
+    """
+    LRU of finished responses, keyed by (data version, canonical request), bounded by
+    entry count and total body bytes. keys of an older data version just age out
+    """
+
+    def __init__(self, max_items=512, max_bytes=64 * 2**20):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        size = len(entry[1])
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old[1])
+        self._entries[key] = entry
+        self._bytes += size
+        while len(self._entries) > self.max_items or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted[1])
+
+    def stats(self):
+        return {'items': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+# --- json shapes ---
+
+def _series_records(series, key, value):
+    if series is None:
+        return None
+    return [{key: str(index), value: item} for index, item in zip(series.index, series.tolist())]
+
+
+def _popularity_vs_followers(pair):
+    followers, popularity = pair
+    if followers is None:
+        return None
+    return {'followers': followers.tolist(), 'popularity': popularity.tolist()}
+
+
+def _histogram(result):
+    if result is None:
+        return None
+    counts, edges = result
+    return {'counts': counts.tolist(), 'edges': edges.tolist()}
+
+
+def _density(result):
+    if result is None:
+        return None
+    counts, follower_edges, popularity_edges = result
+    return {'counts': counts.tolist(), 'follower_edges': follower_edges.tolist(),
+            'popularity_edges': popularity_edges.tolist()}
+
+
+# --- render workers ---
+
+_render = {}
+
+
+def _init_render_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+    from core.plotter import Plotter
+    _render['plotter'] = Plotter()
+
+
+def render_png(method, args, dpi):
+    """
+    runs in a render process: draws one chart into the worker's Plotter and returns the png bytes
+    """
+    plotter = _render['plotter']
+    getattr(plotter, method)(*args)
+    buffer = io.BytesIO()
+    with plotter.lock:
+        plotter.figure.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+class QueryService:
+    """
+    read-only HTTP/1.1 service over one shared DataAnalyzer, on plain asyncio streams
+
+    JSON endpoints under /api/ mirror the analyzer methods, /charts/<analysis>.png renders the
+    report charts. analyses run on a small thread pool (the event loop never blocks on
+    pandas or sqlite), png rendering on a process pool.
+
+    every response's ETag is derived from the analyzer's data_version and the canonical
+    request, so If-None-Match is answered with a 304 before any work is done. finished
+    responses go into an LRU keyed the same way, and identical requests that arrive while
+    one is being computed wait for it instead of computing it again.
+    """
+
+    def __init__(self, db_path, mode='pandas', analysis_workers=4, render_workers=2, cache_items=512,
+                 cache_bytes=64 * 2**20, dpi=100, change_check_interval=1.0, analyzer=None):
+        """
+        args:
+            db_path (str)
+            mode (str): analyzer mode, 'pandas' or 'sql'
+            analysis_workers (int): threads running analyzer calls
+            render_workers (int): processes rendering pngs
+            cache_items, cache_bytes (int): bounds of the response LRU
+            dpi (int): png resolution
+            analyzer (DataAnalyzer): use this one instead of loading db_path
+        """
+        self.analyzer = analyzer or DataAnalyzer(db_path, mode=mode, change_check_interval=change_check_interval)
+        self.dpi = dpi
+        self.cache = ResponseCache(cache_items, cache_bytes)
+        self._threads = ThreadPoolExecutor(max_workers=analysis_workers, thread_name_prefix="query")
+        # spawn: forking a process that already runs threads can deadlock the child
+        self._renderers = ProcessPoolExecutor(max_workers=render_workers, initializer=_init_render_worker,
+                                              mp_context=multiprocessing.get_context('spawn'))
+        self._in_flight = {}
+        self._version = None
+        self._server = None
+        self.requests = 0
+        self.not_modified = 0
+        self.routes = [
+            (re.compile(r'/api/health'), self.health),
+            (re.compile(r'/api/countries'), self.countries),
+            (re.compile(r'/api/top-countries/followers'), self.top_followers),
+            (re.compile(r'/api/top-countries/popularity'), self.top_popularity),
+            (re.compile(r'/api/popularity-histogram'), self.popularity_histogram),
+            (re.compile(r'/api/countries/(?P<country>[^/]+)/genres'), self.genres),
+            (re.compile(r'/api/countries/(?P<country>[^/]+)/popularity-vs-followers'),
+             self.popularity_vs_followers),
+            (re.compile(r'/api/countries/(?P<country>[^/]+)/density'), self.density),
+            (re.compile(r'/api/countries/(?P<country>[^/]+)/spotlight'), self.spotlight),
+            (re.compile(r'/charts/(?P<analysis>\w+)\.png'), self.chart),
+        ]
+
+    # --- endpoints. each returns (content type, body) and raises HTTPError ---
+
+    async def _analysis(self, method, *args):
+        """runs an analyzer method on the thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._threads, method, *args)
+
+    @staticmethod
+    def _json(value, missing="No data"):
+        if value is None:
+            raise HTTPError(404, missing)
+        return JSON_TYPE, json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+    @staticmethod
+    def _n(query, default):
+        try:
+            n = int(query.get('n', default))
+        except ValueError:
+            raise HTTPError(400, "n must be an integer")
+        if not 1 <= n <= MAX_N:
+            raise HTTPError(400, f"n must be between 1 and {MAX_N}")
+        return n
+
+    async def _known_country(self, country):
+        """404s a country with no artists before it reaches the analyzer (and its memo)"""
+        if country not in await self._analysis(self.analyzer.get_available_countries):
+            raise HTTPError(404, f"Unknown country '{country}'")
+
+    async def health(self, query):
+        return self._json({'records': self.analyzer.record_count, 'mode': self.analyzer.mode,
+                           'data_version': self.analyzer.data_version, 'cache': self.cache.stats(),
+                           'requests': self.requests, 'not_modified': self.not_modified})
+
+    async def countries(self, query):
+        return self._json(await self._analysis(self.analyzer.get_available_countries))
+
+    async def top_followers(self, query):
+        series = await self._analysis(self.analyzer.get_top_n_countries_by_followers, self._n(query, 15))
+        return self._json(_series_records(series, 'country', 'followers'))
+
+    async def top_popularity(self, query):
+        series = await self._analysis(self.analyzer.get_top_n_countries_by_avg_popularity, self._n(query, 15))
+        return self._json(_series_records(series, 'country', 'popularity'))
+
+    async def popularity_histogram(self, query):
+        try:
+            bins = int(query.get('bins', 30))
+        except ValueError:
+            raise HTTPError(400, "bins must be an integer")
+        if not 1 <= bins <= 101:
+            raise HTTPError(400, "bins must be between 1 and 101")
+        return self._json(_histogram(await self._analysis(self.analyzer.get_popularity_histogram, bins)))
+
+    async def genres(self, query, country):
+        await self._known_country(country)
+        series = await self._analysis(self.analyzer.get_genre_distribution_for_country, country, self._n(query, 10))
+        return self._json(_series_records(series, 'genre', 'count'), f"No genre data for '{country}'")
+
+    async def popularity_vs_followers(self, query, country):
+        await self._known_country(country)
+        pair = await self._analysis(self.analyzer.get_popularity_vs_followers, country)
+        return self._json(_popularity_vs_followers(pair), f"No popularity/follower data for '{country}'")
+
+    async def density(self, query, country):
+        await self._known_country(country)
+        result = await self._analysis(self.analyzer.get_popularity_vs_followers_density, country)
+        return self._json(_density(result), f"No popularity/follower data for '{country}'")
+
+    async def spotlight(self, query, country):
+        await self._known_country(country)
+        artist = await self._analysis(self.analyzer.get_most_popular_artist_in_country, country)
+        return self._json(artist, f"No artist with a popularity in '{country}'")
+
+    async def chart(self, query, analysis):
+        if analysis not in ANALYSES:
+            raise HTTPError(404, f"Unknown chart '{analysis}', expected one of {', '.join(ANALYSES)}")
+        country = query.get('country')
+        if analysis in COUNTRY_ANALYSES:
+            if not country:
+                raise HTTPError(400, f"'{analysis}' needs a country")
+            await self._known_country(country)
+        spec = ChartSpec(analysis, country if analysis in COUNTRY_ANALYSES else None,
+                         self._n(query, 10) if analysis in TOP_N_ANALYSES else None)
+        chart = await self._analysis(chart_data, self.analyzer, spec)
+        if chart is None:
+            raise HTTPError(404, "No data for this chart")
+        method, args = chart
+        loop = asyncio.get_running_loop()
+        with metrics.span('service_render_seconds', chart=method):
+            body = await loop.run_in_executor(self._renderers, render_png, method, args, self.dpi)
+        return PNG_TYPE, body
+
+    # --- request handling ---
+
+    def _route(self, path):
+        for pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if match:
+                return handler, {name: unquote(value) for name, value in match.groupdict().items()}
+        raise HTTPError(404, f"No such endpoint: {path}")
+
+    async def respond(self, target, if_none_match=None):
+        """
+        the response to one GET: (status, content type, body, etag)
+        """
+        url = urlsplit(target)
+        path = url.path.rstrip('/') or '/'
+        query = dict(parse_qsl(url.query))
+        handler, params = self._route(path)
+        if handler == self.health:
+            content_type, body = await handler(query)
+            return 200, content_type, body, None
+
+        # off the loop: noticing new data can mean reloading it
+        version = self._version = await self._analysis(self._data_version)
+        canonical = path + '?' + '&'.join(f"{key}={value}" for key, value in sorted(query.items()))
+        key = (version, canonical)
+        # same data + same request = same bytes, so the etag is known before doing any work
+        digest = hashlib.sha1(f"{version}|{RENDER_VERSION}|{self.dpi}|{canonical}".encode('utf-8'))
+        etag = f'"{digest.hexdigest()[:24]}"'
+        # no '*': that only matches a resource that exists, which isn't known before the handler runs
+        if if_none_match:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            if etag in tags:
+                self.not_modified += 1
+                return 304, None, b'', etag
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            return 200, cached[0], cached[1], etag
+
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(handler(query, **params))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done: self._finished(key, done))
+        content_type, body = await asyncio.shield(future)
+        return 200, content_type, body, etag
+
+    def _data_version(self):
+        return self.analyzer.data_version
+
+    def _finished(self, key, future):
+        self._in_flight.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        # the data may have moved on while this was computed, then it isn't worth keeping
+        if key[0] == self._version:
+            self.cache.put(key, future.result())
+
+    async def _read_request(self, reader):
+        """
+        (method, target, http version, headers) of the next request on the connection, None at EOF
+        """
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431, "Request headers too large")
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ')
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        # read-only service, but a body still has to be drained to keep the connection usable
+        length = int(headers.get('content-length') or 0)
+        if length:
+            await reader.readexactly(length)
+        return method, target, version, headers
+
+    @staticmethod
+    def _write_response(writer, status, content_type, body, etag=None, keep_alive=True, head_only=False):
+        headers = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                   f"Content-Length: {len(body)}",
+                   "Cache-Control: no-cache",
+                   f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if content_type:
+            headers.append(f"Content-Type: {content_type}")
+        if etag:
+            headers.append(f"ETag: {etag}")
+        writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1'))
+        if not head_only:
+            writer.write(body)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                method, keep_alive = 'GET', False
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    method, target, version, headers = request
+                    connection = headers.get('connection', '').lower()
+                    keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+                    if method not in ('GET', 'HEAD'):
+                        raise HTTPError(405, "Read-only service, only GET and HEAD")
+                    self.requests += 1
+                    start = time.perf_counter()
+                    status, content_type, body, etag = await self.respond(target, headers.get('if-none-match'))
+                    metrics.observe('service_request_seconds', time.perf_counter() - start, status=status)
+                except HTTPError as e:
+                    status, content_type, etag = e.status, JSON_TYPE, None
+                    body = json.dumps({'error': e.message}).encode('utf-8')
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    break
+                except Exception as e:
+                    logger.exception("Error handling request: %s", e)
+                    status, content_type, etag = 500, JSON_TYPE, None
+                    body = json.dumps({'error': "Internal server error"}).encode('utf-8')
+                self._write_response(writer, status, content_type, body, etag, keep_alive,
+                                     head_only=method == 'HEAD')
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8080):
+        """
+        runs until cancelled
+        """
+        self._server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        addresses = ', '.join("http://%s:%d" % sock.getsockname()[:2] for sock in self._server.sockets)
+        logger.info("Serving %d records (%s mode) on %s", self.analyzer.record_count, self.analyzer.mode, addresses)
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self):
+        self._threads.shutdown(wait=False)
+        self._renderers.shutdown(wait=True, cancel_futures=True)
@@ -2,31 +2,83 @@
 
 import tkinter as tk
 from tkinter import ttk
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
-import requests
-from PIL import Image, ImageTk
-from io import BytesIO
 import webbrowser
-import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import logging
 import os
 import time  # Needed for unique filenames
 
-from core.data_analyzer import DataAnalyzer
-from core.plotter import Plotter
+logger = logging.getLogger(__name__)
+
+# matplotlib, pandas, PIL and requests are only imported once the window is up (see
+# _load_in_background), so the shell appears before any of them has loaded
 
 
 class AppGUI(tk.Tk):
-    def __init__(self, db_path):
+    def __init__(self, db_path, analyzer_mode='pandas', image_cache_dir=None, image_memory_items=64):
         super().__init__()
-        self.analyzer = DataAnalyzer(db_path)
         self.title("ArtistNexus: Global Music Analyzer")
         self.geometry("1200x800")
 
-        self.current_figure = None
+        # set by _load_in_background
+        self.analyzer = None
+        self.images = None
+        # one figure and one canvas for the window's lifetime, every chart is drawn into them
+        self.plotter = None
+        self.canvas = None
+        self._has_plot = False
+        # analyses run here, never on the tk thread. results come back through self.after
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="analysis")
+        self._analysis_future = None
+        # bumped on every click, a worker whose request isn't the latest drops its result
+        self._analysis_request = 0
+
+        self._show_loading()
+        self._load_future = self.executor.submit(self._load_in_background, db_path, analyzer_mode,
+                                                 image_cache_dir, image_memory_items)
+        self.after(50, self._check_loaded)
+
+    def _show_loading(self):
+        self.loading_frame = ttk.Frame(self, padding=20)
+        self.loading_frame.pack(expand=True)
+        ttk.Label(self.loading_frame, text="Loading artist data...", font=("-size", 14)).pack(pady=10)
+        loading_bar = ttk.Progressbar(self.loading_frame, mode="indeterminate", length=300)
+        loading_bar.pack()
+        loading_bar.start(10)
+
+    def _load_in_background(self, db_path, analyzer_mode, image_cache_dir, image_memory_items):
+        """
+        worker thread: the slow part of startup, the heavy imports and the data load
+        """
+        from core.data_analyzer import DataAnalyzer
+        from core.image_loader import ImageLoader
+        from core.plotter import Plotter
+
+        analyzer = DataAnalyzer(db_path, mode=analyzer_mode)
+        if analyzer.has_data():
+            # memoized, so building the country dropdown doesn't query on the tk thread
+            analyzer.get_available_countries()
+        images = ImageLoader(image_cache_dir, memory_items=image_memory_items)
+        plotter = Plotter()
+        # only imported here to have it ready for the first plot, it's used on the tk thread
+        import matplotlib.backends.backend_tkagg  # noqa: F401
+        from PIL import ImageTk  # noqa: F401
+        return analyzer, images, plotter
+
+    def _check_loaded(self):
+        # polled from the tk thread, so the worker never has to call into tk
+        if not self._load_future.done():
+            self.after(50, self._check_loaded)
+            return
+        self.loading_frame.destroy()
+        try:
+            self.analyzer, self.images, self.plotter = self._load_future.result()
+        except Exception as e:
+            logger.error("Error loading data: %s", e)
 
-        if self.analyzer.df is None or self.analyzer.df.empty:
+        if self.analyzer is None or not self.analyzer.has_data():
             error_label = ttk.Label(self, text="FATAL ERROR: Could not load data from database.\n"
                                                "Please ensure artist_data.db exists and is not corrupted.",
                                     font=("-size", 14), foreground="red", justify="center")
@@ -47,6 +99,7 @@ class AppGUI(tk.Tk):
         status_bar_frame.pack(side="bottom", fill="x")
         self.status_label = ttk.Label(status_bar_frame, text="Welcome to ArtistNexus! Select an analysis to begin.")
         self.status_label.pack(side="left")
+        self.progress_bar = ttk.Progressbar(status_bar_frame, mode="indeterminate", length=150)
 
         # main content
         self.info_label = ttk.Label(main_content_frame,
@@ -88,7 +141,12 @@ class AppGUI(tk.Tk):
         ttk.Separator(controls_frame, orient='horizontal').pack(fill='x', pady=10)
         self.artist_info_frame = ttk.LabelFrame(controls_frame, text="Artist Spotlight", padding=10)
         self.artist_info_frame.pack(fill='x', pady=10)
-        self.artist_image_label = ttk.Label(self.artist_info_frame)
+        self.artist_image_label = ttk.Label(self.artist_info_frame, compound="center")
+        from PIL import Image, ImageTk
+        from core.image_loader import THUMBNAIL_SIZE
+        # shown while the spotlight image loads
+        self.placeholder_image = ImageTk.PhotoImage(Image.new("RGB", THUMBNAIL_SIZE, "#d9d9d9"))
+        self._spotlight_url = None
         self.artist_name_label = ttk.Label(self.artist_info_frame, text="", font="-weight bold")
         self.artist_link_label = ttk.Label(self.artist_info_frame, text="", foreground="blue", cursor="hand2")
 
@@ -102,7 +160,6 @@ class AppGUI(tk.Tk):
                                         command=self._on_export_button_click, state="disabled")
         self.export_button.pack(anchor="w", fill="x", ipady=5, pady=5)
 
-        self.canvas = None
         self._on_analysis_type_change()
 
     def _on_analysis_type_change(self):
@@ -122,8 +179,8 @@ class AppGUI(tk.Tk):
                 self.n_label.pack(anchor="w", pady=(10, 0))
                 self.n_spinbox.pack(anchor="w", fill="x")
 
-    def _update_artist_spotlight(self, country):
-        artist_info = self.analyzer.get_most_popular_artist_in_country(country)
+    def _update_artist_spotlight(self, country, artist_info):
+        self._spotlight_url = None
         if not artist_info:
             self.artist_name_label.config(text=f"No artist data for {country}.")
             self.artist_link_label.pack_forget()
@@ -146,78 +203,180 @@ class AppGUI(tk.Tk):
 
         # image url might be null
         self.artist_image_label.pack_forget()
-        if artist_info.get('image_url'):
-            try:
-                response = requests.get(artist_info['image_url'])
-                response.raise_for_status()
-                img_data = response.content
-                img = Image.open(BytesIO(img_data))
-                img.thumbnail((200, 200))
-                self.photo_image = ImageTk.PhotoImage(img)
-                self.artist_image_label.config(image=self.photo_image)
-                self.artist_image_label.pack()
-            except requests.exceptions.RequestException as e:
-                print(f"Error loading image: {e}")
+        image_url = artist_info.get('image_url')
+        if not image_url:
+            return
+        self._spotlight_url = image_url
+        image = self.images.get_cached(image_url)
+        if image is not None:
+            self._show_spotlight_image(image_url, image)
+            return
+        self.artist_image_label.config(image=self.placeholder_image, text="Loading image...")
+        self.artist_image_label.pack()
+        self.images.load_async(image_url, callback=lambda url, image: self.after(0, self._show_spotlight_image, url, image))
+
+    def _show_spotlight_image(self, url, image):
+        # the spotlight may have moved on to another artist while this one loaded
+        if url != self._spotlight_url:
+            return
+        if image is None:
+            self.artist_image_label.pack_forget()
+            return
+        from PIL import ImageTk
+        # PhotoImage has to be made on the tk thread
+        self.photo_image = ImageTk.PhotoImage(image)
+        self.artist_image_label.config(image=self.photo_image, text="")
+        self.artist_image_label.pack()
 
     def _on_analyze_button_click(self):
+        # tk variables are only read here, on the tk thread
         analysis_type = self.analysis_var.get()
         n = self.n_var.get()
         country = self.country_var.get()
 
-        if self.canvas: self.canvas.get_tk_widget().destroy()
+        self._analysis_request += 1
+        request = self._analysis_request
+        if self._analysis_future is not None:
+            # only stops it if it hasn't started, a running one finds out it's stale itself
+            self._analysis_future.cancel()
+        self._analysis_future = self.executor.submit(self._run_analysis, request, analysis_type, n, country)
 
-        fig, ax = Plotter.create_figure()
-        self.current_figure = fig
+        self.status_label.config(text="Running analysis...")
+        self.progress_bar.pack(side="right")
+        self.progress_bar.start(10)
 
+    def _is_stale(self, request):
+        return request != self._analysis_request
+
+    def _run_analysis(self, request, analysis_type, n, country):
+        """
+        worker thread: queries the analyzer, hands the chart to the tk thread
+        """
+        try:
+            result = self._prepare_analysis(request, analysis_type, n, country)
+        except Exception as e:
+            self.after(0, self._on_analysis_failed, request, e)
+            return
+        if result is not None:
+            self.after(0, self._show_analysis, request, result)
+
+    def _prepare_analysis(self, request, analysis_type, n, country):
+        """
+        returns (draw, description, spotlight) or None if the request went stale.
+        draw() puts the chart on the plotter's figure, it runs on the tk thread since the
+        figure is shared. spotlight is (country, artist_info) for the per-country analyses, else None
+        """
+        from core.plotter import DENSITY_THRESHOLD
+
+        draw = None
         description = ""
-        self.artist_info_frame.pack_forget()
+        spotlight = None
 
         if analysis_type == "followers_by_country":
             data = self.analyzer.get_top_n_countries_by_followers(n)
-            Plotter.plot_bar_chart(ax, data, "", "Country", "Total Followers (Log Scale)")
-            ax.set_yscale('log')
+            if self._is_stale(request): return None
+            draw = functools.partial(self.plotter.bar_chart, data, "", "Country", "Total Followers (Log Scale)", log=True)
             description = f"This bar chart displays the top {n} countries ranked by the total combined Spotify followers... (etc.)"
         elif analysis_type == "popularity_by_country":
             data = self.analyzer.get_top_n_countries_by_avg_popularity(n)
-            Plotter.plot_bar_chart(ax, data, "", "Country", "Average Popularity Score")
+            if self._is_stale(request): return None
+            draw = functools.partial(self.plotter.bar_chart, data, "", "Country", "Average Popularity Score")
             description = f"This chart shows the top {n} countries ranked by the average Spotify Popularity Score... (etc.)"
         elif analysis_type == "genre_distribution":
             data = self.analyzer.get_genre_distribution_for_country(country, n)
-            Plotter.plot_pie_chart(ax, data, "")
+            if self._is_stale(request): return None
+            draw = functools.partial(self.plotter.pie_chart, data, "")
             description = f"This pie chart shows the breakdown of the top {n} most common music genres for artists from {country}."
-            self.artist_info_frame.pack(fill='x', pady=10)
-            self._update_artist_spotlight(country)
+            spotlight = country
         elif analysis_type == "pop_vs_followers":
             x_data, y_data = self.analyzer.get_popularity_vs_followers(country)
-            Plotter.plot_scatter_plot(ax, x_data, y_data, "", "Followers (log scale)", "Popularity Score")
-            description = f"This scatter plot explores the relationship between an artist's long-term fanbase (followers) and their current relevance (popularity) in {country}."
-            self.artist_info_frame.pack(fill='x', pady=10)
-            self._update_artist_spotlight(country)
+            if self._is_stale(request): return None
+            if x_data is not None and len(x_data) > DENSITY_THRESHOLD:
+                # too many points to draw one by one, plot how many artists fall in each cell instead
+                density = self.analyzer.get_popularity_vs_followers_density(country)
+                if self._is_stale(request): return None
+                draw = functools.partial(self.plotter.density_plot, *density, "", "Followers (log scale)", "Popularity Score")
+                description = f"This density plot explores the relationship between an artist's long-term fanbase (followers) and their current relevance (popularity) in {country}. Brighter cells hold more artists."
+            else:
+                draw = functools.partial(self.plotter.scatter_plot, x_data, y_data, "", "Followers (log scale)", "Popularity Score")
+                description = f"This scatter plot explores the relationship between an artist's long-term fanbase (followers) and their current relevance (popularity) in {country}."
+            spotlight = country
         elif analysis_type == "popularity_histogram":
-            data = self.analyzer.get_popularity_distribution()
-            Plotter.plot_histogram(ax, data, "", "Popularity Score")
+            # None without data, which the plotter draws as an empty chart like the others
+            counts, edges = self.analyzer.get_popularity_histogram() or (None, None)
+            if self._is_stale(request): return None
+            draw = functools.partial(self.plotter.histogram, counts, edges, "", "Popularity Score")
             description = "This histogram shows the overall distribution of artist popularity scores across the entire dataset."
 
+        if draw is None:
+            raise ValueError(f"Unknown analysis type '{analysis_type}'")
+
+        if spotlight is not None:
+            if self._is_stale(request): return None
+            artist_info = self.analyzer.get_most_popular_artist_in_country(country)
+            if artist_info and artist_info.get('image_url'):
+                # start the download now, the spotlight picks up the same future
+                self.images.load_async(artist_info['image_url'])
+            spotlight = (country, artist_info)
+        return draw, description, spotlight
+
+    def _finish_analysis(self):
+        self.progress_bar.stop()
+        self.progress_bar.pack_forget()
+        self._analysis_future = None
+
+    def _on_analysis_failed(self, request, error):
+        if self._is_stale(request):
+            return
+        self._finish_analysis()
+        logger.error("Error running analysis: %s", error)
+        self.status_label.config(text=f"Error running analysis: {error}")
+
+    def _show_analysis(self, request, result):
+        """
+        tk thread: draws the chart into the persistent figure and updates the panels
+        """
+        if self._is_stale(request):
+            return
+        draw, description, spotlight = result
+        try:
+            draw()
+        except Exception as e:
+            self._on_analysis_failed(request, e)
+            return
+        self._finish_analysis()
+        self._has_plot = True
+
+        self.artist_info_frame.pack_forget()
+        if spotlight is not None:
+            self.artist_info_frame.pack(fill='x', pady=10)
+            self._update_artist_spotlight(*spotlight)
+
         self.info_label.config(text=description)
-        fig.tight_layout()
-        self.canvas = FigureCanvasTkAgg(fig, master=self.plot_frame)
-        self.canvas.draw()
-        self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        if self.canvas is None:
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+            self.canvas = FigureCanvasTkAgg(self.plotter.figure, master=self.plot_frame)
+            self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.canvas.draw_idle()
 
         self.export_button.config(state="normal")
         self.status_label.config(text="Plot generated successfully. Ready for next analysis.")
 
     def _on_export_button_click(self):
-        if self.current_figure is None:
+        if not self._has_plot:
             return
 
         self.export_button.config(state="disabled")
         self.status_label.config(text="Exporting plot to PNG...")
-
-        export_thread = threading.Thread(target=self._export_current_plot)
-        export_thread.start()
+        # let the status show before the export holds up the tk thread
+        self.after_idle(self._export_current_plot)
 
     def _export_current_plot(self):
+        """
+        tk thread: savefig(bbox_inches='tight') switches the figure's dpi and canvas while it
+        renders, so it must never overlap a canvas redraw (matplotlib isn't thread-safe).
+        at this size it only takes a moment
+        """
         try:
             if not os.path.exists('reports'):
                 os.makedirs('reports')
@@ -225,12 +384,21 @@ class AppGUI(tk.Tk):
             filename = f"chart_export_{int(time.time())}.png"
             filepath = os.path.join('reports', filename)
 
-            self.current_figure.savefig(filepath, dpi=150, bbox_inches='tight')
+            with self.plotter.lock:
+                self.plotter.figure.savefig(filepath, dpi=150, bbox_inches='tight')
 
-            self.after(0, self.status_label.config, {'text': f"Successfully exported to {filepath}"})
+            self.status_label.config(text=f"Successfully exported to {filepath}")
 
         except Exception as e:
-            self.after(0, self.status_label.config, {'text': f"Error exporting plot: {e}"})
+            self.status_label.config(text=f"Error exporting plot: {e}")
 
         finally:
-            self.after(0, self.export_button.config, {'state': "normal"})
\ No newline at end of file
+            self.export_button.config(state="normal")
+
+    def destroy(self):
+        # don't keep the interpreter alive for analyses nobody will see
+        self._analysis_request += 1
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.images is not None:
+            self.images.close()
+        super().destroy()